@@ -0,0 +1,1027 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+用法(在项目根目录下执行):
+    python backend/benchmark.py initG [边数]
+    python backend/benchmark.py moneyCollection [行数]
+    python backend/benchmark.py scc [节点数] [链长] [对照组节点数]
+    python backend/benchmark.py circle [环长] [弦数]
+    python backend/benchmark.py mutualChain [链长] [对照组链长上限]
+    python backend/benchmark.py parallel [边数] [进程数]
+    python backend/benchmark.py risk [边数]
+    python backend/benchmark.py netIncome [行数]
+    python backend/benchmark.py shell [枢纽数] [每个枢纽的贷款数] [每个枢纽的转账数]
+    python backend/benchmark.py pairs [双节点子图数]
+    python backend/benchmark.py views [边数]
+    python backend/benchmark.py components [边数]
+    python backend/benchmark.py ownership [边数] [进程数] [对照组子图节点数上限]
+    python backend/benchmark.py suite [最大边数] [是否统计内存] [随机种子]
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+import networkx as nx
+
+import control
+import graphCore
+import guarantee
+import layout
+import moneyCollection
+import synthetic
+
+# 基准套件的规模档位和合成数据的子图形态
+SUITE_SIZES = [10**4, 10**5, 10**6, 10**7]
+SUITE_SHAPE = {"compAlpha": 2.0, "cycleRatio": 0.02, "hubRatio": 0.01, "hubDegree": 50}
+REPORT_PATH = "./benchmark_report.json"
+
+
+def legacyControlG(path):
+    """
+    原逐行iterrows构图实现, 仅作基准对照
+    """
+    control = pd.read_csv(path, encoding="gb2312")
+    control.columns = ["relTag", "src", "destn", "relType", "rate"]
+    control.loc[control["rate"] >= 100, "rate"] = 100
+    control["rate"] = [str(x) + "%" for x in control["rate"]]
+    G = nx.DiGraph()
+    for _, row in control.iterrows():
+        if row["src"] not in G.nodes():
+            if row["relType"] == "Control":
+                G.add_node(row["src"], isRoot=0, isCross=0, isControl=1)
+            else:
+                G.add_node(row["src"], isRoot=0, isCross=0, isControl=0)
+        elif row["relType"] == "Control":
+            G.nodes[row["src"]]["isControl"] = 1
+        if row["destn"] not in G.nodes():
+            G.add_node(row["destn"], isRoot=0, isCross=0, isControl=0)
+        G.add_edge(row["src"], row["destn"], rate=row["rate"])
+    return G
+
+
+def legacyGuaranteeG(path):
+    """
+    原逐行iterrows构图实现, 仅作基准对照
+    """
+    guarantee = pd.read_csv(path, encoding="gb2312")
+    guarantee.columns = ["src", "destn", "time", "guarType", "amount"]
+    guarantee = guarantee[~guarantee["amount"].isin([0])]
+    G = nx.DiGraph()
+    for _, row in guarantee.iterrows():
+        G.add_node(row["src"], guarType=[], m=0.0, std=0.0)
+        G.add_node(row["destn"], guarType=[], m=0.0, std=0.0)
+        G.add_edge(row["src"], row["destn"], guarType=[], amount=row["amount"], mij=0)
+    return G
+
+
+def legacyMoneyCollectionG(path):
+    """
+    原csv.reader逐行筛选构图实现, 仅作基准对照
+    """
+    txn, loan = moneyCollection.txn, moneyCollection.loan
+    G = nx.MultiDiGraph()
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        tag = {"myId": 0, "recipId": 29, "txnDateTime": 1, "txnCode": 4,
+               "txnAmount": 7, "isLoan": 6, "status": 33, "abstract": 21}
+        i = 0
+        for line in csv.reader(f):
+            canIn = False
+            if line[tag["myId"]] == '' or line[tag["recipId"]] == '' or i == 0:
+                i += 1
+                continue
+            if (
+                int(line[tag["isLoan"]]) == txn["isLoan"]
+                and line[tag["txnCode"]] in txn["code"]
+                and float(line[tag["txnAmount"]]) >= txn["txnAmountLimit"]
+            ):
+                canIn = True
+            elif (
+                not line[tag["status"]] == "R"
+                and float(line[tag["txnAmount"]]) >= loan["txnAmountLimit"]
+                and line[tag["txnCode"]] in loan["code"]
+                and int(line[tag["isLoan"]]) == loan["isLoan"]
+                and int(line[tag["status"]]) == loan["status"]
+            ):
+                if any(re.search(item, line[tag["abstract"]]) for item in loan["abstract"]):
+                    continue
+                canIn = True
+            if canIn:
+                for t in ["myId", "recipId"]:
+                    if not G.has_node(line[tag[t]]):
+                        if len(line[tag[t]]) >= 15:
+                            line[tag[t]] = line[tag[t]][:-2] + '00'
+                        G.add_node(line[tag[t]], netIncome=0, std=0)
+                G.add_edge(
+                    line[tag["myId"]],
+                    line[tag["recipId"]],
+                    txnAmount=float(line[tag["txnAmount"]]),
+                    txnDateTime=int(line[tag["txnDateTime"]]),
+                    isLoan=int(line[tag["isLoan"]]),
+                    txnCode=line[tag["txnCode"]],
+                    width=float(line[tag["txnAmount"]])**0.5 / 1800
+                )
+            i += 1
+    return G
+
+
+def legacySplit(G):
+    """
+    原先借助nx.to_undirected切分子图的实现, 仅作基准对照
+    """
+    return [G.subgraph(c) for c in nx.connected_components(nx.to_undirected(G))]
+
+
+def makeChainHeavyG(nNodes, chainLen=1000, cycleLen=3):
+    """
+    生成链状结构为主的图: 每个连通分量由一个长度为cycleLen的环和挂在其下游的长链组成
+    节点同时带有控制人表和担保关系表所需的属性
+    Params:
+        nNodes: 节点总数
+        chainLen: 每个连通分量的节点数
+        cycleLen: 环的长度
+    Returns:
+        subG: 各连通分量的子图列表
+    """
+    G = nx.DiGraph()
+    G.add_nodes_from(
+        (n, {"isRoot": 0, "isCross": 0, "isControl": 0, "guarType": [], "m": 0.0, "std": 0.0})
+        for n in range(nNodes)
+    )
+    subG = list()
+    for start in range(0, nNodes - chainLen + 1, chainLen):
+        nodes = range(start, start + chainLen)
+        G.add_edges_from(
+            (u, u + 1, {"rate": "50%", "guarType": [], "amount": 1, "mij": 0})
+            for u in nodes[:-1]
+        )
+        G.add_edge(start + cycleLen - 1, start, rate="50%", guarType=[], amount=1, mij=0)
+        subG.append(G.subgraph(nodes))
+    return subG
+
+
+def legacyPeel(G):
+    """
+    原逐层剥离入度为0节点的拓扑排序实现, 仅作基准对照
+    Returns:
+        剥离后剩余的节点集合
+    """
+    tmpG = nx.DiGraph(G)
+    flag = True
+    while flag:
+        flag = False
+        s = list()
+        for n in tmpG.nodes:
+            if tmpG.in_degree(n) == 0:
+                s.append(n)
+                flag = True
+        tmpG.remove_nodes_from(s)
+    return set(tmpG.nodes)
+
+
+def makeCycleG(cycleLen, nChords=0, seed=0):
+    """
+    生成一个长度为cycleLen的大环, 并随机加入nChords条弦
+    Params:
+        cycleLen: 环的节点数
+        nChords: 弦的数量
+        seed: 随机种子
+    Returns:
+        G: 有向图
+    """
+    rng = np.random.default_rng(seed)
+    G = nx.DiGraph()
+    G.add_edges_from((u, (u + 1) % cycleLen) for u in range(cycleLen))
+    G.add_edges_from(zip(
+        rng.integers(0, cycleLen, nChords).tolist(),
+        rng.integers(0, cycleLen, nChords).tolist(),
+    ))
+    return G
+
+
+def makeMutualChainG(chainLen, closed=False):
+    """
+    生成一条相邻节点互保的长链, 整条链为一个强连通分量, 其中没有长度不小于3的环
+    Params:
+        chainLen: 链的节点数
+        closed: 是否再加一条从链尾指向链头的单向边, 此时全部节点都处于同一个担保圈上
+    Returns:
+        G: 有向图
+    """
+    G = nx.DiGraph()
+    G.add_edges_from((u, u + 1) for u in range(chainLen - 1))
+    G.add_edges_from((u + 1, u) for u in range(chainLen - 1))
+    if closed:
+        G.add_edge(chainLen - 1, 0)
+    return G
+
+
+def pairwiseCircleNodes(G, nodes):
+    """
+    逐个节点检查后继、每次做一遍反向BFS的找担保圈实现, 每个强连通分量耗时O(V(V+E)), 仅作基准对照
+    """
+    H = G.induced(nodes)
+    adj = H.adjacency()
+    circle = set()
+    for scc in H.strongComponents(range(H.n), adj):
+        if len(scc) < 3:
+            continue
+        members = set(scc)
+        succ = {v: sorted({w for w in adj[v] if w in members and w != v}) for v in scc}
+        pred = {v: list() for v in scc}
+        for v in scc:
+            for w in succ[v]:
+                pred[w].append(v)
+        for v in scc:
+            for w in succ[v]:
+                if v not in succ[w]:
+                    circle.update((v, w))
+        for v in sorted(members - circle):
+            if v in circle:
+                continue
+            for w in succ[v]:
+                nextHop = {v: None}
+                queue = [v]
+                for u in queue:
+                    for p in pred[u]:
+                        if p != w and p not in nextHop:
+                            nextHop[p] = u
+                            queue.append(p)
+                x = next((x for x in succ[w] if x != v and x in nextHop), None)
+                if x is None:
+                    continue
+                circle.update((v, w))
+                while x is not None:
+                    circle.add(x)
+                    x = nextHop[x]
+                break
+    return set(H.globalNodes[sorted(circle)].tolist())
+
+
+def legacyCircleNodes(tmpG):
+    """
+    原递归回溯找环实现, 仅作基准对照
+    """
+    circle = set()
+    visited = list()
+    trace = list()
+
+    def dfs2FindCircle(node):
+        if node in visited:
+            if node in trace:
+                trace_index = trace.index(node)
+                if len(trace) - trace_index > 2:
+                    for i in range(trace_index, len(trace)):
+                        circle.add(trace[i])
+            return
+        visited.append(node)
+        trace.append(node)
+        for child in list(tmpG.neighbors(node)):
+            dfs2FindCircle(child)
+        trace.pop()
+
+    dfs2FindCircle(list(tmpG.nodes())[0])
+    return circle
+
+
+def makeHubG(nHubs, nLoans, nTxns, seed=0):
+    """
+    生成以枢纽账户为中心的资金归集图: 每个枢纽有nLoans条贷款入边和nTxns条转账出边,
+    交易日期分布在一个月内, 部分转账金额为某笔贷款的0.9-1.0倍
+    Params:
+        nHubs: 枢纽数量
+        nLoans: 每个枢纽的贷款入边数
+        nTxns: 每个枢纽的转账出边数
+        seed: 随机种子
+    Returns:
+        GList: 每个枢纽为一个子图
+    """
+    rng = np.random.default_rng(seed)
+    GList = list()
+    for h in range(nHubs):
+        G = nx.MultiDiGraph()
+        hub = "hub%d" % h
+        loanAmount = rng.integers(100000, 1000000, nLoans).astype(float)
+        loanDate = 20200901 + rng.integers(0, 30, nLoans)
+        for i in range(nLoans):
+            G.add_edge(
+                "f%d_%d" % (h, i % 50), hub, txnAmount=loanAmount[i], txnDateTime=int(loanDate[i]),
+                isLoan=1, txnCode="6101", width=1.0,
+            )
+        pick = rng.integers(0, nLoans, nTxns)
+        txnAmount = np.where(
+            rng.random(nTxns) < 0.3,
+            np.round(loanAmount[pick] * rng.uniform(0.85, 1.02, nTxns), 2),
+            rng.integers(90000, 1000000, nTxns),
+        )
+        txnDate = 20200901 + rng.integers(0, 30, nTxns)
+        for i in range(nTxns):
+            G.add_edge(
+                hub, "c%d_%d" % (h, i % 200), txnAmount=float(txnAmount[i]), txnDateTime=int(txnDate[i]),
+                isLoan=0, txnCode="8002", width=1.0,
+            )
+        GList.append(G)
+    return GList
+
+
+def legacyShellOfSubG(subG):
+    """
+    原逐对比较贷款入边和转账出边的实现, 仅作基准对照
+    """
+    txn, loan = moneyCollection.txn, moneyCollection.loan
+    matches = list()
+    for n in subG.nodes():
+        children = list(subG.neighbors(n))
+        father = list(subG.predecessors(n))
+        if not father or not children:
+            continue
+        for f in father:
+            for k1 in subG[f][n]:
+                loanEdge = subG[f][n][k1]
+                if loanEdge["isLoan"] == txn["isLoan"]:
+                    continue
+                bestMatchC, bestMatchRate, bestMatchTxn = "", 0.9, None
+                for c in children:
+                    for k2 in subG[n][c]:
+                        txnEdge = subG[n][c][k2]
+                        if txnEdge["isLoan"] == loan["isLoan"]:
+                            continue
+                        rate = txnEdge["txnAmount"] / loanEdge["txnAmount"]
+                        if (
+                            txnEdge["txnDateTime"] - loanEdge["txnDateTime"] <= 5
+                            and txnEdge["txnDateTime"] >= loanEdge["txnDateTime"]
+                            and rate >= bestMatchRate
+                            and rate <= 1
+                        ):
+                            bestMatchC, bestMatchRate, bestMatchTxn = c, rate, txnEdge
+                if bestMatchC:
+                    matches.append((f, n, bestMatchC, dict(loanEdge), dict(bestMatchTxn)))
+    return matches
+
+
+def timeIt(func, *args, **kwargs):
+    """
+    计时执行func
+    Returns:
+        (耗时秒数, func的返回值)
+    """
+    start = time.perf_counter()
+    ret = func(*args, **kwargs)
+    return time.perf_counter() - start, ret
+
+
+def toCompact(G, nodeAttr, edgeKeys):
+    """
+    将合成的nx图转换为CompactGraph, 以便在同一份数据上运行新旧实现
+    Params:
+        G: nx图
+        nodeAttr: 节点属性名到dtype的映射, 属性值均初始化为0
+        edgeKeys: 需要保留的边属性名
+    Returns:
+        CompactGraph
+    """
+    index = graphCore.NodeIndex()
+    index.encode(list(G.nodes))
+    edges = list(G.edges(data=True))
+    return graphCore.CompactGraph(
+        index,
+        index.encode([u for u, _, _ in edges]),
+        index.encode([v for _, v, _ in edges]),
+        nodeAttr={k: np.zeros(len(index), dtype=t) for k, t in nodeAttr.items()},
+        edgeAttr={k: pd.Series([d[k] for _, _, d in edges]).to_numpy() for k in edgeKeys},
+    )
+
+
+def sameGraph(G1, G2, edgeKeys, fmt=None):
+    """
+    判断nx图G1与CompactGraph G2的节点、边及给定的边属性是否完全一致
+    Params:
+        fmt: 边属性名到格式化函数的映射, 用于将G2的属性值转换为G1中的形式
+    """
+    fmt = fmt or dict()
+    ids = G2.index.ids
+    cols = [[fmt.get(k, lambda x: x)(x) for x in G2.edgeAttr[k].tolist()] for k in edgeKeys]
+    edges1 = sorted((u, v, *(d[k] for k in edgeKeys)) for u, v, d in G1.edges(data=True))
+    edges2 = sorted(
+        (ids[u], ids[v], *vals) for u, v, *vals in zip(G2.src.tolist(), G2.dst.tolist(), *cols)
+    )
+    return sorted(G1.nodes) == sorted(ids) and edges1 == edges2
+
+
+def benchInitG(nEdges=100000):
+    """
+    对比逐行构图与按列批量构图的耗时
+    Params:
+        nEdges: 合成数据的边数
+    """
+    with tempfile.TemporaryDirectory() as d:
+        for name, make, legacy, bulk, edgeKeys, fmt in [
+            ("控制人表", synthetic.makeControlCsv, legacyControlG, control.getInitControlG,
+                ["rate"], {"rate": lambda r: str(r) + "%"}),
+            ("担保关系表", synthetic.makeGuaranteeCsv, legacyGuaranteeG, guarantee.getInitGuaranteeG,
+                ["amount"], None),
+        ]:
+            path = os.path.join(d, "bench.csv")
+            make(path, nEdges)
+            tLegacy, G = timeIt(legacy, path)
+            tLegacy += timeIt(legacySplit, G)[0]
+            tBulk, G2 = timeIt(bulk, path)
+            print(
+                name, "边数：", nEdges,
+                "逐行构图(含切分子图)：%.2fs" % tLegacy,
+                "批量构图(含切分子图)：%.2fs" % tBulk,
+                "结果一致：", sameGraph(G, G2, edgeKeys, fmt),
+            )
+
+
+def benchMoneyCollection(nRows=1000000):
+    """
+    对比csv.reader逐行筛选与分块按列筛选的耗时
+    Params:
+        nRows: 合成交易流水的行数
+    """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "moneyCollection.csv")
+        synthetic.makeMoneyCollectionCsv(path, nRows)
+        tLegacy, G = timeIt(legacyMoneyCollectionG, path)
+        tLegacy += timeIt(legacySplit, G)[0]
+        tChunk, G2 = timeIt(moneyCollection.getInitmoneyCollectionG, path)
+        print(
+            "资金归集表 行数：", nRows,
+            "逐行筛选(含切分子图)：%.2fs" % tLegacy,
+            "分块筛选(含切分子图)：%.2fs" % tChunk,
+            "结果一致：", sameGraph(G, G2, ["txnAmount", "txnDateTime", "isLoan", "txnCode"]),
+        )
+
+
+def benchSCC(nNodes=1000000, chainLen=1000, legacyNodes=20000):
+    """
+    对比逐层剥离与强连通分量划分识别交叉持股/担保圈的耗时
+    逐层剥离在长链上为平方复杂度, 故只在前legacyNodes个节点上运行对照组
+    Params:
+        nNodes: 合成图的节点数
+        chainLen: 每个连通分量的节点数
+        legacyNodes: 对照组使用的节点数
+    """
+    subG = makeChainHeavyG(nNodes, chainLen)
+    part = subG[:max(legacyNodes // chainLen, 1)]
+    attrs = {"isRoot": np.int8, "isCross": np.int8, "isControl": np.int8,
+             "guarType": np.uint8, "m": float, "std": float}
+    G = toCompact(nx.compose_all(part), attrs, ["rate", "amount"])
+    # 控制人表: 将图逆置后剥离, 剩余节点为交叉持股
+    tLegacy, legacyCross = timeIt(lambda: set().union(*(legacyPeel(nx.reverse(G)) for G in part)))
+    tScc, cross = timeIt(
+        lambda: set(G.index.decode(sum((control.crossOfSubG(G, c) for c in range(G.nComp)), [])))
+    )
+    print(
+        "交叉持股 节点数：", len(part) * chainLen,
+        "逐层剥离：%.2fs" % tLegacy,
+        "强连通分量：%.2fs" % tScc,
+        "结果一致：", legacyCross == cross,
+    )
+    # 担保关系表: 正向剥离后再逆向剥离, 剩余节点为担保圈或互保
+    tLegacy, legacyCyclic = timeIt(
+        lambda: set().union(*(legacyPeel(nx.reverse(G.subgraph(legacyPeel(G)))) for G in part))
+    )
+    tScc, cyclic = timeIt(
+        lambda: set(G.index.decode(sum((guarantee.circleOfSubG(G, c)[0] for c in range(G.nComp)), [])))
+    )
+    print(
+        "担保圈 节点数：", len(part) * chainLen,
+        "逐层剥离：%.2fs" % tLegacy,
+        "强连通分量：%.2fs" % tScc,
+        "结果一致：", legacyCyclic == cyclic,
+    )
+    # 完整阶段在全部节点上的耗时
+    G = toCompact(nx.compose_all(subG), attrs, ["rate", "amount"])
+    tRoot = timeIt(control.getRootOfControlG, G)[0]
+    tRisk = timeIt(guarantee.markRiskOfGuaranteeG, G)[0]
+    print(
+        "全部节点数：", len(subG) * chainLen,
+        "getRootOfControlG：%.2fs" % tRoot,
+        "markRiskOfGuaranteeG：%.2fs" % tRisk,
+    )
+
+
+def benchCircle(cycleLen=100000, nChords=1000):
+    """
+    对比递归找环与非递归找环的耗时
+    递归实现受Python递归深度限制, 超出时记为失败
+    Params:
+        cycleLen: 最大环长
+        nChords: 每个环上随机加入的弦数
+    """
+    for n in sorted({1000, 5000, cycleLen}):
+        G = makeCycleG(n, nChords * n // cycleLen)
+        H = toCompact(G, {}, [])
+        tNew, circle = timeIt(guarantee.findCircleNodes, H, list(range(H.n)))
+        circle = set(H.index.decode(sorted(circle)))
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(10000)
+        try:
+            tLegacy, legacyCircle = timeIt(legacyCircleNodes, G)
+            legacy = "%.2fs" % tLegacy
+            same = legacyCircle == circle
+        except RecursionError:
+            legacy, same = "超出递归深度", "-"
+        finally:
+            sys.setrecursionlimit(limit)
+        print(
+            "环长：", n,
+            "递归找环：", legacy,
+            "非递归找环：%.2fs" % tNew,
+            "结果一致：", same,
+        )
+
+
+def benchMutualChain(chainLen=100000, pairwiseLen=8000):
+    """
+    互保长链上找担保圈的耗时: 整条链是一个强连通分量, 逐节点搜索的实现耗时与链长的平方成正比
+    分别测试不含担保圈的链和首尾以单向边闭合、全部节点都在担保圈上的链
+    Params:
+        chainLen: 最大链长
+        pairwiseLen: 对照组只在不超过该长度的链上运行
+    """
+    for n in sorted({1000, 2000, 4000, 8000, chainLen}):
+        for closed in (False, True):
+            H = toCompact(makeMutualChainG(n, closed), {}, [])
+            tNew, circle = timeIt(guarantee.findCircleNodes, H, list(range(H.n)))
+            assert len(circle) == (n if closed else 0)
+            if n <= pairwiseLen:
+                tOld, old = timeIt(pairwiseCircleNodes, H, list(range(H.n)))
+                pairwise, same = "%.2fs" % tOld, old == circle
+            else:
+                pairwise, same = "-", "-"
+            print(
+                "链长：", n,
+                "首尾闭合：", closed,
+                "逐节点搜索：", pairwise,
+                "按桥判定：%.2fs" % tNew,
+                "结果一致：", same,
+            )
+
+
+def benchParallel(nEdges=1000000, workers=None):
+    """
+    对比串行与进程池并行处理各连通分量的耗时, 并检查结果是否一致
+    Params:
+        nEdges: 合成担保关系表的边数
+        workers: 进程数, 默认为全部CPU核心
+    """
+    workers = workers or os.cpu_count()
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "guarantee.csv")
+        synthetic.makeGuaranteeCsv(path, nEdges)
+        results = list()
+        for w in [1, workers]:
+            G = guarantee.getInitGuaranteeG(path)
+            tRisk = timeIt(guarantee.markRiskOfGuaranteeG, G, w)[0]
+            results.append(G.nodeAttr["guarType"].tolist())
+            print(
+                "进程数：", w,
+                "markRiskOfGuaranteeG：%.2fs" % tRisk,
+            )
+        print("结果一致：", results[0] == results[1])
+
+
+def legacyRiskOfSubG(G):
+    """
+    原复制为无向图后逐个邻居累加金额的实现, 仅作基准对照
+    """
+    de = dict()
+    tmpG = nx.Graph(G)
+    txnAllSum = sum(nx.get_edge_attributes(tmpG, "amount").values())
+    for n in tmpG.nodes():
+        de[n] = sum(tmpG[n][neighbor]["amount"] / txnAllSum for neighbor in tmpG.adj[n])
+    return de
+
+
+def benchRisk(nEdges=1000000):
+    """
+    对比逐子图复制无向图与按边表一次bincount求m的耗时
+    互保边对的金额取舍在原实现中依赖集合遍历顺序, 故只报告m的最大偏差
+    Params:
+        nEdges: 合成担保关系表的边数
+    """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "guarantee.csv")
+        synthetic.makeGuaranteeCsv(path, nEdges)
+        subG = legacySplit(legacyGuaranteeG(path))
+        G = guarantee.getInitGuaranteeG(path)
+    tLegacy, legacy = timeIt(lambda: [legacyRiskOfSubG(H) for H in subG])
+    tNew = timeIt(guarantee.riskQuantification, G)[0]
+    m = dict(zip(G.index.ids, G.nodeAttr["m"].tolist()))
+    print(
+        "担保关系表 边数：", nEdges,
+        "逐子图复制：%.2fs" % tLegacy,
+        "bincount：%.2fs" % tNew,
+        "m最大偏差：", max(abs(m[n] - x) for de in legacy for n, x in de.items()),
+    )
+
+
+def legacyNetIncome(GList):
+    """
+    原逐节点遍历前驱、后继及平行边累加金额的实现, 仅作基准对照
+    """
+    netIncome = dict()
+    for subG in GList:
+        for n in subG.nodes():
+            netIncome[n] = 0
+            for f in subG.predecessors(n):
+                for k1 in subG[f][n]:
+                    netIncome[n] += subG[f][n][k1]["txnAmount"]
+            for c in subG.neighbors(n):
+                for k2 in subG[n][c]:
+                    netIncome[n] -= subG[n][c][k2]["txnAmount"]
+    return netIncome
+
+
+def benchNetIncome(nRows=1000000):
+    """
+    对比逐节点遍历与按边表bincount计算净资金流入的耗时
+    Params:
+        nRows: 合成交易流水的行数
+    """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "moneyCollection.csv")
+        synthetic.makeMoneyCollectionCsv(path, nRows)
+        GList = legacySplit(legacyMoneyCollectionG(path))
+        G = moneyCollection.getInitmoneyCollectionG(path)
+    tLegacy, legacy = timeIt(legacyNetIncome, GList)
+    tBincount = timeIt(moneyCollection.getNetIncome, G)[0]
+    netIncome = dict(zip(G.index.ids, G.nodeAttr["netIncome"].tolist()))
+    print(
+        "资金归集表 行数：", nRows,
+        "逐节点遍历：%.2fs" % tLegacy,
+        "bincount：%.2fs" % tBincount,
+        "净流入最大偏差：", max(abs(netIncome[n] - x) for n, x in legacy.items()),
+    )
+
+
+def benchShell(nHubs=10, nLoans=2000, nTxns=5000):
+    """
+    对比逐对比较与按时间窗口二分查找匹配资金归集三元组的耗时
+    Params:
+        nHubs: 枢纽数量
+        nLoans: 每个枢纽的贷款入边数
+        nTxns: 每个枢纽的转账出边数
+    """
+    GList = makeHubG(nHubs, nLoans, nTxns)
+    edgeKeys = ["txnAmount", "txnDateTime", "isLoan", "txnCode"]
+    HList = [toCompact(G, {"netIncome": float, "std": float}, edgeKeys) for G in GList]
+    tLegacy, legacy = timeIt(lambda: [legacyShellOfSubG(G) for G in GList])
+    tWindow, window = timeIt(lambda: [moneyCollection.findShellOfSubG(H, 0) for H in HList])
+
+    def key(f, n, c, loanEdge, txnEdge):
+        return (f, n, c, loanEdge["txnAmount"], loanEdge["txnDateTime"],
+                txnEdge["txnAmount"], txnEdge["txnDateTime"])
+    legacy = sorted(key(*m) for matches in legacy for m in matches)
+    window = sorted(
+        key(
+            H.index.ids[H.src[e1]], H.index.ids[H.dst[e1]], H.index.ids[H.dst[e2]],
+            {k: H.edgeAttr[k][e1] for k in edgeKeys}, {k: H.edgeAttr[k][e2] for k in edgeKeys},
+        )
+        for H, matches in zip(HList, window) for e1, e2 in matches
+    )
+    print(
+        "枢纽数：", nHubs, "贷款入边：", nLoans, "转账出边：", nTxns,
+        "逐对比较：%.2fs" % tLegacy,
+        "时间窗口：%.2fs" % tWindow,
+        "匹配数：", len(window),
+        "结果一致：", legacy == window,
+    )
+
+
+def benchPairs(nPairs=300000):
+    """
+    对比逐子图生成与双节点子图批量快速路径生成导出记录的耗时
+    Params:
+        nPairs: 合成担保关系表中双节点子图的数量
+    """
+    rng = np.random.default_rng(0)
+    ids = synthetic.randomIds(2 * nPairs, rng).reshape(-1, 2)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "guarantee.csv")
+        with open(path, "w", newline="", encoding="gb2312") as f:
+            w = csv.writer(f)
+            w.writerow(["源节点", "目标节点", "担保时间", "担保类型", "担保金额"])
+            w.writerows(
+                (a, b, "20200101", "Normal", int(m))
+                for (a, b), m in zip(ids.tolist(), rng.integers(1, 10**6, nPairs))
+            )
+        G = guarantee.getInitGuaranteeG(path)
+    guarantee.markRiskOfGuaranteeG(G)
+    guarantee.riskQuantification(G)
+    comps = G.pairComponents()[0].tolist()
+    tSingle, single = timeIt(lambda: [guarantee.recordsOfSubG(G, c) for c in comps])
+    tBatch, batch = timeIt(lambda: [tmp for _, tmp in guarantee.recordsOfPairs(G)])
+    print(
+        "双节点子图数：", len(comps),
+        "逐子图生成：%.2fs" % tSingle,
+        "批量快速路径：%.2fs" % tBatch,
+        "结果一致：", single == batch,
+    )
+
+
+def viewCircleOfSubG(subG):
+    """
+    在NetworkX子图视图上找环路节点和担保圈节点, 仅作基准对照
+    """
+    cyclic = [n for scc in nx.strongly_connected_components(subG) if len(scc) > 1 for n in scc]
+    view = subG.subgraph(cyclic)
+    circle, visited = set(), set()
+    for start in cyclic:
+        if start in visited:
+            continue
+        visited.add(start)
+        trace, traceIndex = [start], {start: 0}
+        stack = [iter(list(view.successors(start)))]
+        while stack:
+            for child in stack[-1]:
+                if child in visited:
+                    i = traceIndex.get(child)
+                    if i is not None and len(trace) - i > 2:
+                        circle.update(trace[i:])
+                    continue
+                visited.add(child)
+                traceIndex[child] = len(trace)
+                trace.append(child)
+                stack.append(iter(list(view.successors(child))))
+                break
+            else:
+                stack.pop()
+                del traceIndex[trace.pop()]
+    return cyclic, circle
+
+
+def sliceCircleOfSubG(G, c):
+    """
+    不物化子图, 直接在全图的CSR数组上逐个节点切片找环, 仅作基准对照
+    """
+    cyclic = sorted(G.cyclicNodes(G.componentNodes(c)))
+    allowed = set(cyclic)
+    circle, visited = set(), set()
+    for start in cyclic:
+        if start in visited:
+            continue
+        visited.add(start)
+        trace, traceIndex = [start], {start: 0}
+        stack = [iter([w for w in G.successors(start).tolist() if w in allowed])]
+        while stack:
+            for child in stack[-1]:
+                if child in visited:
+                    i = traceIndex.get(child)
+                    if i is not None and len(trace) - i > 2:
+                        circle.update(trace[i:])
+                    continue
+                visited.add(child)
+                traceIndex[child] = len(trace)
+                trace.append(child)
+                stack.append(iter([w for w in G.successors(child).tolist() if w in allowed]))
+                break
+            else:
+                stack.pop()
+                del traceIndex[trace.pop()]
+    return cyclic, circle
+
+
+def benchViews(nEdges=1000000):
+    """
+    对比markRiskOfGuaranteeG中找环一步的三种子图表示:
+    NetworkX子图视图、在全图CSR数组上逐个节点切片、物化为局部的CompactGraph
+    Params:
+        nEdges: 合成担保关系表的边数
+    """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "guarantee.csv")
+        synthetic.makeGuaranteeCsv(path, nEdges)
+        G = guarantee.getInitGuaranteeG(path)
+    comps = np.nonzero((G.componentSize() > 2) & (np.diff(G.compEdgePtr) >= G.componentSize()))[0].tolist()
+    nxG = nx.DiGraph()
+    nxG.add_edges_from(zip(G.src.tolist(), G.dst.tolist()))
+    views = [nxG.subgraph(G.componentNodes(c).tolist()) for c in comps]
+    tView, view = timeIt(lambda: [viewCircleOfSubG(subG) for subG in views])
+    # 释放NetworkX图, 避免其大量对象拖慢后续计时中的垃圾回收
+    del nxG, views
+    tSlice, sliced = timeIt(lambda: [sliceCircleOfSubG(G, c) for c in comps])
+    tLocal, local = timeIt(lambda: [guarantee.circleOfSubG(G, c) for c in comps])
+    tRisk = timeIt(guarantee.markRiskOfGuaranteeG, G)[0]
+    print(
+        "担保关系表 边数：", nEdges, "找环子图数：", len(comps),
+        "子图视图：%.2fs" % tView,
+        "全图切片：%.2fs" % tSlice,
+        "物化局部图：%.2fs" % tLocal,
+        "markRiskOfGuaranteeG：%.2fs" % tRisk,
+        "环路节点一致：", [sorted(c) for c, _ in view] == [c for c, _ in local],
+        "担保圈一致：", sliced == local,
+    )
+
+
+def legacyLabelComponents(G):
+    """
+    原先借助nx无向图副本切分子图的实现, 仅作基准对照
+    """
+    H = nx.Graph()
+    H.add_nodes_from(range(G.n))
+    H.add_edges_from(zip(G.src.tolist(), G.dst.tolist()))
+    comp = np.empty(G.n, dtype=np.int32)
+    for i, c in enumerate(nx.connected_components(H)):
+        comp[list(c)] = i
+    return comp
+
+
+def peakOf(func, *args):
+    """
+    执行func, 返回耗时秒数、tracemalloc记录的峰值内存MB数和返回值
+    """
+    tracemalloc.start()
+    t, ret = timeIt(func, *args)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return t, peak, ret
+
+
+def benchComponents(nEdges=1000000):
+    """
+    对比nx无向图副本与scipy.sparse.csgraph两种切分子图方式的耗时和峰值内存
+    Params:
+        nEdges: 合成担保关系表的边数
+    """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "guarantee.csv")
+        synthetic.makeGuaranteeCsv(path, nEdges)
+        G = guarantee.getInitGuaranteeG(path)
+    tLegacy, mLegacy, comp = peakOf(legacyLabelComponents, G)
+    tCs, mCs, (compCs, _, _) = peakOf(graphCore.connectedComponents, G.src, G.dst, G.n)
+    print(
+        "担保关系表 边数：", G.numberOfEdges(), "节点数：", G.n,
+        "nx无向图：%.2fs 峰值%.0fMB" % (tLegacy, mLegacy),
+        "csgraph：%.2fs 峰值%.0fMB" % (tCs, mCs),
+        "结果一致：", np.array_equal(comp, compCs),
+    )
+
+
+def denseOwnership(G, maxNodes):
+    """
+    对照组: 逐个子图用稠密矩阵求逆计算综合持股, 只处理节点数不超过maxNodes的子图
+    Returns:
+        stake: 各公司最大股东的综合持股比例, 未处理的节点为nan
+    """
+    stake = np.full(G.n, np.nan)
+    sizes = G.componentSize()
+    for c in np.nonzero((sizes > 1) & (sizes <= maxNodes))[0].tolist():
+        H = G.induced(G.componentNodes(c))
+        M = np.eye(H.n) - control.ownershipMatrix(H).toarray()
+        if np.linalg.cond(M) > 1e8:
+            continue
+        L = np.linalg.inv(M)
+        F = L / np.diag(L)[:, None]
+        np.fill_diagonal(F, 0)
+        stake[H.globalNodes] = np.minimum(F.max(axis=0), 1)
+    return stake
+
+
+def benchOwnership(nEdges=1000000, workers=4, maxNodes=300):
+    """
+    对比逐子图稠密求逆与分批稀疏幂级数两种综合持股计算方式, 并检查单进程与多进程结果一致
+    Params:
+        nEdges: 合成控制人关系表的边数
+        workers: 并行计算的进程数
+        maxNodes: 对照组只处理不超过该节点数的子图, 大子图的稠密矩阵放不进内存
+    """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "control.csv")
+        synthetic.makeControlCsv(path, nEdges, **SUITE_SHAPE)
+        G = control.getInitControlG(path)
+    tDense, stake = timeIt(denseOwnership, G, maxNodes)
+    tSerial, _ = timeIt(control.integratedOwnership, G)
+    serial = {k: G.nodeAttr[k].copy() for k in ("controller", "ultimate", "stake")}
+    tParallel, _ = timeIt(control.integratedOwnership, G, workers=workers)
+    checked = ~np.isnan(stake)
+    print(
+        "控制人表 边数：", G.numberOfEdges(), "节点数：", G.n,
+        "逐子图稠密求逆(不超过%d个节点的子图)：%.2fs" % (maxNodes, tDense),
+        "分批稀疏幂级数：%.2fs" % tSerial,
+        "%d进程：%.2fs" % (workers, tParallel),
+        "最大误差：%.2e" % np.abs(stake[checked] - serial["stake"][checked]).max(),
+        "多进程结果一致：", all(np.array_equal(serial[k], G.nodeAttr[k]) for k in serial),
+    )
+
+
+def suiteControl(run, path):
+    G = run("load", control.getInitControlG, path)
+    run("getRootOfControlG", control.getRootOfControlG, G)
+    run("integratedOwnership", control.integratedOwnership, G)
+    run("computeLayout", layout.computeLayout, G)
+    run("ansJson", control.ansJson, G)
+    return G
+
+
+def suiteGuarantee(run, path):
+    G = run("load", guarantee.getInitGuaranteeG, path)
+    run("markRiskOfGuaranteeG", guarantee.markRiskOfGuaranteeG, G)
+    run("riskQuantification", guarantee.riskQuantification, G)
+    run("computeLayout", layout.computeLayout, G)
+    run("ansJson", guarantee.ansJson, G)
+    return G
+
+
+def suiteMoneyCollection(run, path):
+    G = run("load", moneyCollection.getInitmoneyCollectionG, path)
+    _, seNodes = run("findShellEnterprise", moneyCollection.findShellEnterprise, G)
+    run("getNetIncome", moneyCollection.getNetIncome, G)
+    run("computeLayout", layout.computeLayout, G)
+    run("ansJson", moneyCollection.ansJson, seNodes)
+    return G
+
+
+def benchSuite(maxEdges=10**7, memory=1, seed=0):
+    """
+    在各个规模档位上生成三张合成表格, 依次执行三条流水线的各个阶段, 记录耗时和峰值内存并写出JSON报告
+    峰值内存由tracemalloc统计, 开启时Python层的耗时会偏高, 同一份报告内的数据可互相比较
+    Params:
+        maxEdges: 最大的规模档位
+        memory: 是否统计峰值内存
+        seed: 随机种子
+    Outputs:
+        REPORT_PATH: 各阶段的耗时和峰值内存, 以及各张图的规模
+    """
+    reportPath = os.path.abspath(REPORT_PATH)
+    cwd = os.getcwd()
+    report = {
+        "seed": seed,
+        "shape": SUITE_SHAPE,
+        "memory": bool(memory),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "stages": list(),
+        "graphs": list(),
+    }
+    pipelines = [
+        ("control", synthetic.makeControlCsv, suiteControl),
+        ("guarantee", synthetic.makeGuaranteeCsv, suiteGuarantee),
+        ("moneyCollection", synthetic.makeMoneyCollectionCsv, suiteMoneyCollection),
+    ]
+    for nEdges in [n for n in SUITE_SIZES if n <= maxEdges]:
+        for name, make, pipeline in pipelines:
+            def run(stage, func, *args, **kwargs):
+                if memory:
+                    tracemalloc.start()
+                t, ret = timeIt(func, *args, **kwargs)
+                record = {"pipeline": name, "edges": nEdges, "stage": stage, "seconds": round(t, 4)}
+                if memory:
+                    record["peakMB"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+                    tracemalloc.stop()
+                report["stages"].append(record)
+                print(record)
+                return ret
+
+            with tempfile.TemporaryDirectory() as d:
+                # 答案文件写到临时目录中
+                os.makedirs(os.path.join(d, "answers", name))
+                os.chdir(d)
+                try:
+                    path = os.path.join(d, name + ".csv")
+                    run("generate", make, path, nEdges, seed, **SUITE_SHAPE)
+                    G = pipeline(run, path)
+                finally:
+                    os.chdir(cwd)
+            report["graphs"].append({
+                "pipeline": name,
+                "edges": nEdges,
+                "nodes": G.n,
+                "graphEdges": G.numberOfEdges(),
+                "components": G.nComp,
+            })
+            with open(reportPath, "w") as f:
+                json.dump(report, f, indent=2)
+    print("----------基准报告已写出：", reportPath, "----------")
+
+
+if __name__ == "__main__":
+    benches = {
+        "initG": benchInitG,
+        "moneyCollection": benchMoneyCollection,
+        "scc": benchSCC,
+        "circle": benchCircle,
+        "mutualChain": benchMutualChain,
+        "parallel": benchParallel,
+        "risk": benchRisk,
+        "netIncome": benchNetIncome,
+        "shell": benchShell,
+        "pairs": benchPairs,
+        "views": benchViews,
+        "components": benchComponents,
+        "ownership": benchOwnership,
+        "suite": benchSuite,
+    }
+    name = sys.argv[1] if len(sys.argv) > 1 else "initG"
+    benches[name](*[int(x) for x in sys.argv[2:]])
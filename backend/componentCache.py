@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import pickle
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+import graphCore
+import parallel
+
+# 缓存条目数和字节数的默认上限, 超出时按最近最少使用的顺序淘汰
+MAX_ENTRIES = 1000000
+MAX_BYTES = 256 * 1024 * 1024
+# 缓存格式版本, 键或序列化方式变化时递增, 使旧缓存全部失效
+CACHE_VERSION = 2
+
+
+def funcSalt(func):
+    """
+    分析函数的哈希前缀, 由缓存格式版本、函数名以及定义函数的模块和graphCore的源码决定
+    分析规则、模块级常量或图算法一旦修改, 旧的缓存条目不再命中
+    Params:
+        func: 处理单个子图的函数
+    Returns:
+        salt: 十六进制字符串
+    """
+    h = hashlib.sha1(("%d:%s" % (CACHE_VERSION, func.__name__)).encode("utf-8"))
+    for path in (sys.modules[func.__module__].__file__, graphCore.__file__):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def componentHash(G, c, edgeKeys=(), nodeKeys=(), salt=""):
+    """
+    子图内容的哈希值, 由节点数、按子图内序号表示的边列表和给定的属性列决定, 与节点Id无关
+    Params:
+        G: CompactGraph
+        c: 子图编号
+        edgeKeys: 参与哈希的边属性
+        nodeKeys: 参与哈希的节点属性
+        salt: 区分不同分析函数及其代码版本的前缀, 见funcSalt
+    Returns:
+        key: 十六进制哈希字符串
+    """
+    nodes = G.componentNodes(c)
+    edges = G.componentEdges(c)
+    local = np.stack([
+        np.searchsorted(nodes, G.src[edges]),
+        np.searchsorted(nodes, G.dst[edges]),
+    ]).astype(np.int64)
+    h = hashlib.sha1(salt.encode("utf-8"))
+    h.update(np.int64(len(nodes)).tobytes())
+    h.update(local.tobytes())
+    for k in edgeKeys:
+        h.update(np.ascontiguousarray(G.edgeAttr[k][edges]).tobytes())
+    for k in nodeKeys:
+        h.update(np.ascontiguousarray(G.nodeAttr[k][nodes]).tobytes())
+    return h.hexdigest()
+
+
+def nodesToLocal(G, c, nodes):
+    """
+    将节点编号转为子图内序号
+    """
+    return np.searchsorted(G.componentNodes(c), np.asarray(nodes, dtype=np.int64)).astype(np.int32)
+
+
+def nodesToGlobal(G, c, local):
+    """
+    将子图内序号转为节点编号
+    """
+    return G.componentNodes(c)[np.asarray(local, dtype=np.int64)]
+
+
+def edgesToLocal(G, c, edges):
+    """
+    将边编号转为其在子图边列表中的序号
+    """
+    compEdges = G.componentEdges(c)
+    order = np.argsort(compEdges)
+    return order[np.searchsorted(compEdges, np.asarray(edges, dtype=np.int64), sorter=order)].astype(np.int32)
+
+
+def edgesToGlobal(G, c, local):
+    """
+    将子图边列表中的序号转为边编号
+    """
+    return G.componentEdges(c)[np.asarray(local, dtype=np.int64)]
+
+
+class ComponentCache:
+    """
+    按子图内容哈希保存单个子图分析结果的磁盘缓存
+    结果以子图内序号表示并序列化为字节串, 内容相同的子图在下一次运行时只需一次哈希查找
+    条目按最近最少使用的顺序维护, 超出条目数或字节数上限时从最久未用的一端淘汰
+    """
+
+    def __init__(self, path=None, maxEntries=MAX_ENTRIES, maxBytes=MAX_BYTES):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                for key, data in pickle.load(f):
+                    self.entries[key] = data
+                    self.nbytes += len(data)
+            self.evict()
+
+    def get(self, key):
+        """
+        读取缓存的结果, 未命中时返回None
+        """
+        data = self.entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def put(self, key, value):
+        """
+        写入结果, 必要时淘汰最久未用的条目
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= len(old)
+        self.entries[key] = data
+        self.nbytes += len(data)
+        self.evict()
+
+    def evict(self):
+        while len(self.entries) > self.maxEntries or self.nbytes > self.maxBytes:
+            _, data = self.entries.popitem(last=False)
+            self.nbytes -= len(data)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        命中、未命中和淘汰计数
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+        }
+
+    def save(self):
+        """
+        按最近最少使用的顺序写出缓存文件, 先写临时文件再替换, 避免写出一半的缓存
+        """
+        if self.path is None:
+            return
+        tmpPath = self.path + ".tmp"
+        with open(tmpPath, "wb") as f:
+            pickle.dump(list(self.entries.items()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, self.path)
+        print("子图结果缓存：", self.stats())
+
+
+def mapComponents(cache, func, G, comps=None, workers=1, edgeKeys=(), nodeKeys=(), encode=None, decode=None):
+    """
+    带缓存的parallel.mapComponents, 只对缓存中没有的子图执行func
+    Params:
+        cache: ComponentCache, 为None时不使用缓存
+        func: 处理单个子图的函数
+        G: CompactGraph
+        comps: 待处理的子图编号, 默认为全部子图
+        workers: 进程数
+        edgeKeys, nodeKeys: 影响func结果的边属性和节点属性
+        encode: encode(G, c, result), 将结果转为以子图内序号表示的形式
+        decode: decode(G, c, value), 将缓存的值还原为结果
+    Returns:
+        results: 各个子图的处理结果, 顺序与comps一致
+    """
+    if cache is None:
+        return parallel.mapComponents(func, G, comps, workers)
+    comps = list(range(G.nComp)) if comps is None else np.asarray(comps).tolist()
+    salt = funcSalt(func)
+    keys = [componentHash(G, c, edgeKeys, nodeKeys, salt) for c in comps]
+    results = [None] * len(comps)
+    missing = list()
+    hits = cache.hits
+    for i, (c, key) in enumerate(zip(comps, keys)):
+        value = cache.get(key)
+        if value is None:
+            missing.append(i)
+        else:
+            results[i] = decode(G, c, value)
+    for i, result in zip(missing, parallel.mapComponents(func, G, [comps[i] for i in missing], workers)):
+        results[i] = result
+        cache.put(keys[i], encode(G, comps[i], result))
+    print(func.__name__, "缓存命中子图数：", cache.hits - hits, "重新计算的子图数：", len(missing))
+    return results
@@ -1,309 +1,727 @@
 # -*- coding: utf-8 -*-
-import os
 import json
 import pandas as pd
 import numpy as np
-import networkx as nx
+from scipy import sparse
+from collections import Counter
 
+import componentCache
+import graphCore
+import incremental
+import layout
+import metrics
+import parallel
+import shardPacker
+import snapshot
+import streamJson
+import subgraphIndex
 
-def getInitControlG(path):
+# 综合持股比例不低于该值的股东视为控股股东
+CONTROL_THRESHOLD = 0.5
+# 综合持股的幂级数截断: 最长的持股路径, 以及忽略的最小间接持股比例
+MAX_DEPTH = 1000
+MIN_STAKE = 1e-6
+# 综合持股按批整体计算, 每批的节点数下限, 批越大稀疏矩阵运算的向量化程度越高
+OWNERSHIP_BATCH_NODES = 200000
+# 每批内按公司分块展开幂级数, 每块的公司数决定填充后矩阵的大小
+OWNERSHIP_BLOCK_COMPANIES = 20000
+
+
+@metrics.stage
+def getInitControlG(path, snapshotDir=None):
     """
     读取控制人关系的excel表格到DataFrame, 并切分子图
     Params:
         path: 含有控制人数据的excel表格
+        snapshotDir: 二进制快照目录, 快照由同一份表格和同一版代码构建时直接内存映射快照, 否则解析表格后写出快照
     Returns: 
-        subG: 根据表格数据切分得到的子图集合, 每个元素都是一副子图
+        G: 根据表格数据构建的CompactGraph, 已按连通性切分子图
     """
+    if snapshot.isFresh(snapshotDir, path, __file__):
+        return snapshot.load(snapshotDir)
     control = pd.read_csv(path, encoding="gb2312")
     # 将列名索引修改为英文
     control.columns = ["relTag", "src", "destn", "relType", "rate"]
-    # 将比例大于100的异常值修正为100，并将数字变为带百分号的字符串
-    control.rate[control.rate >= 100] = 100
-    control["rate"] = [str(x) + "%" for x in control["rate"]]
+    # 将比例大于100的异常值修正为100, 比例保留为数值, 导出时再加百分号
+    control.loc[control["rate"] >= 100, "rate"] = 100
 
     # Control关系中，relTag和src一一对应
-    G = nx.DiGraph()
-    # 构建初始图G
-    for _, row in control.iterrows():
-        # 默认每个节点非根且不存在交叉持股, 具体情况后续判定
-        if row["src"] not in G.nodes():
-            if row["relType"] == "Control":
-                G.add_node(row["src"], isRoot=0, isCross=0, isControl=1)
-            else:
-                G.add_node(row["src"], isRoot=0, isCross=0, isControl=0)
-        elif row["relType"] == "Control":
-            G.nodes[row["src"]]["isControl"] = 1
-        if row["destn"] not in G.nodes():
-            G.add_node(row["destn"], isRoot=0, isCross=0, isControl=0)
-        G.add_edge(
-            row["src"],
-            row["destn"],
-            rate=row["rate"],
-        )
+    # 构建初始图G, 节点Id按在表中首次出现的顺序编号
+    # 默认每个节点非根且不存在交叉持股, 具体情况后续判定
+    index = graphCore.NodeIndex()
+    codes = index.encode(control[["src", "destn"]].to_numpy().ravel()).reshape(-1, 2)
+    # 重复的边以表中最后一条记录为准, 只要有一条记录为Control即视为Control边
+    first, last, edgeOfRow = graphCore.uniqueEdges(codes[:, 0], codes[:, 1], len(index), returnInverse=True)
+    isControlEdge = np.zeros(len(first), dtype=np.int8)
+    np.maximum.at(isControlEdge, edgeOfRow, (control["relType"] == "Control").to_numpy().astype(np.int8))
+    G = graphCore.CompactGraph(
+        index,
+        codes[first, 0],
+        codes[first, 1],
+        nodeAttr={
+            "isRoot": np.zeros(len(index), dtype=np.int8),
+            "isCross": np.zeros(len(index), dtype=np.int8),
+            "isControl": np.zeros(len(index), dtype=np.int8),
+        },
+        edgeAttr={"rate": control["rate"].to_numpy()[last], "isControl": isControlEdge},
+    )
     print("----------控制人表数据读取完成----------")
-    # 切分子图
-    tmp = nx.to_undirected(G)
-    subG = list()
-    doubleCount = 0
-    for c in nx.connected_components(tmp):
-        subG.append(G.subgraph(c))
-        if nx.number_of_nodes(subG[-1]) == 2:
-            doubleCount += 1
-    print("节点总数：", nx.number_of_nodes(G))
-    print("控制关系边总数：", nx.number_of_edges(G))
-    print("切分子图数量：", len(subG))
+    doubleCount = int(np.sum(G.componentSize() == 2))
+    print("节点总数：", G.n)
+    print("控制关系边总数：", G.numberOfEdges())
+    print("切分子图数量：", G.nComp)
     print("双节点子图数量：", doubleCount)
     print("----------控制人子图切分完成----------")
-    return subG
+    if snapshotDir is not None:
+        snapshot.save(G, snapshotDir, path, __file__)
+    return G
+
+
+def crossOfSubG(G, c):
+    """
+    找到单个子图中交叉持股的公司, 即处于非平凡强连通分量中的节点
+    单个节点仅当自己持有自己时才视为交叉持股
+    Params:
+        G: CompactGraph
+        c: 子图编号
+    Returns:
+        cross: 交叉持股节点列表
+    """
+    # 相互持股形成环路的公司均为交叉持股, 交叉持股的公司风险绑定
+    # 一张子图内可能存在多个交叉持股的公司集群
+    # 子图物化为局部图, 强连通分量划分直接在局部的后继表上进行
+    H = G.induced(G.componentNodes(c))
+    return H.globalNodes[H.cyclicNodes(range(H.n), selfLoop=True, adj=H.adjacency())].tolist()
 
 
-def getRootOfControlG(subG):
+def encodeCross(G, c, cross):
+    """
+    将crossOfSubG的结果转为子图内序号, 用于缓存
+    """
+    return componentCache.nodesToLocal(G, c, cross)
+
+
+def decodeCross(G, c, value):
+    """
+    将缓存的子图内序号还原为crossOfSubG的结果
+    """
+    return componentCache.nodesToGlobal(G, c, value)
+
+
+@metrics.stage
+def getRootOfControlG(G, workers=1, comps=None, cache=None):
     """
     找到各个节点的实际控制人
     经检验, 每个子图要么无根, 要么有且仅有一个根, 因此可以简化计算
-    经检验, 有根的子图均不存在交叉持股现象
+    交叉持股通过一次强连通分量划分识别, 复杂度与子图规模成线性关系
     Params:
-        subG: 原子图的列表
+        G: 控制人关系图
+        workers: 并行处理子图的进程数
+        comps: 只重新识别这些子图, 为None时识别全部子图, 用于增量更新
+        cache: componentCache.ComponentCache, 结构未变的子图直接复用交叉持股结果
     Returns:
-        rootG: 含有交叉持股关系的子图
-    """
-    rootG = list()
-    # 标记各个子图的根节点
-    for G in subG:
-        flag = False  # 是否有根标记
-        for n in G.nodes:
-            if G.in_degree(n) == 0:
-                G.nodes[n]["isRoot"] = 1
-                flag = True
-                break  # 仅有一个根, 找到即可退出
-        # 若图无根, 则将图逆置后仍无法拓扑排序的公司均为交叉持股, 交叉持股的公司风险绑定
-        if not flag:
-            tmpG = nx.reverse(G)
-            flag = True
-            while flag:
-                flag = False
-                s = list()
-                for n in tmpG.nodes:
-                    if tmpG.in_degree(n) == 0:
-                        s.append(n)
-                        flag = True
-                tmpG.remove_nodes_from(s)
-            # 拓扑排序后仍有节点, 则这些节点构成交叉持股
-            for n in tmpG.nodes:
-                G.nodes[n]["isCross"] = 1
-            rootG.append(G)
-            continue
-        # 仅有一个根, 则该节点必为所有公司的实际控制人
-        # 用拓扑排序判断是否存在局部的交叉持股
-        tmpG = nx.DiGraph(G)
-        flag = True
-        while flag:
-            flag = False
-            s = list()
-            for n in tmpG.nodes:
-                if tmpG.in_degree(n) == 0:
-                    s.append(n)
-                    flag = True
-            tmpG.remove_nodes_from(s)
-        # 拓扑排序后仍有节点则这些节点构成交叉持股
-        if nx.number_of_nodes(tmpG):
-            # 一张子图内可能存在多个交叉持股的公司集群
-            rootG.append(G)
-        else:
-            # 无交叉持股的子图拓扑排序后为空
-            rootG.append(G)
+        G: 标记isControl, isRoot和isCross后的图
+    """
+    inComps = G.componentMask(comps)
+    inScope = inComps[G.comp]
+    for k in ("isControl", "isRoot", "isCross"):
+        G.nodeAttr[k][inScope] = 0
+    # 作为Control边起点的公司标记为Control
+    controlEdge = (G.edgeAttr["isControl"] == 1) & inScope[G.src]
+    G.nodeAttr["isControl"][G.src[controlEdge]] = 1
+    # 仅有一个根, 取每个子图中第一个入度为0的节点
+    zeroIn = np.nonzero((G.inDegree() == 0) & inScope)[0]
+    _, first = np.unique(G.comp[zeroIn], return_index=True)
+    G.nodeAttr["isRoot"][zeroIn[first]] = 1
+    # 双节点子图的交叉持股直接由边表判定: 自己持有自己的公司, 以及相互持股的两个公司
+    isPair = inComps & (G.componentSize() == 2)
+    loop = (G.src == G.dst) & isPair[G.comp[G.src]]
+    G.nodeAttr["isCross"][G.src[loop]] = 1
+    nonLoop = (G.src != G.dst) & isPair[G.comp[G.src]]
+    mutual = np.bincount(G.comp[G.src[nonLoop]], minlength=G.nComp) == 2
+    G.nodeAttr["isCross"][mutual[G.comp]] = 1
+    # 其余子图中, 边数不少于节点数的子图才可能含有环
+    comps = np.nonzero(inComps & ~isPair & (np.diff(G.compEdgePtr) >= G.componentSize()))[0]
+    for cross in componentCache.mapComponents(
+        cache, crossOfSubG, G, comps, workers, encode=encodeCross, decode=decodeCross
+    ):
+        G.nodeAttr["isCross"][cross] = 1
+    if metrics.enabled():
+        metrics.count(
+            searched=len(comps),
+            roots=G.nodeAttr["isRoot"].sum(),
+            cross=G.nodeAttr["isCross"].sum(),
+            controllers=G.nodeAttr["isControl"].sum(),
+        )
     print("----------控制人关系识别完成----------")
-    return rootG
+    return G
 
 
-def graphs2json(GList):
+def ownershipMatrix(H):
     """
-    将图数据输出为前端可视化用的json文件
+    直接持股矩阵A, A[i, j]为i直接持有j的比例
+    忽略自己持有自己的边; 一家公司被持股的比例之和超过100%时, 各股东的比例按同一系数缩小到合计100%
+    Params:
+        H: CompactGraph
+    Returns:
+        A: csr稀疏矩阵
+    """
+    keep = H.src != H.dst
+    A = sparse.csr_matrix(
+        (H.edgeAttr["rate"][keep] / 100, (H.src[keep], H.dst[keep])), shape=(H.n, H.n)
+    )
+    total = np.asarray(A.sum(axis=0)).ravel()
+    return (A @ sparse.diags(1 / np.maximum(total, 1))).tocsr()
+
+
+def integratedStakes(B, companies):
+    """
+    幂级数T = A + A^2 + ... = (I - A)^-1 - I中若干公司所在的列, T[i, j]为i到j全部持股路径的比例之和
+    以转置B = A^T按行计算X = X·B并逐项累加, 每步的开销只与这些公司的行数和非零元有关;
+    每一项中低于MIN_STAKE的间接持股直接舍去, 项为空或路径长度达到MAX_DEPTH时停止,
+    只取一部分公司使填充后的矩阵不超过内存, 交叉持股的环路也因舍去小比例而在有限步内结束
     Params:
-        GList: 图数据
+        B: 直接持股矩阵的转置, B[j, i]为i直接持有j的比例
+        companies: 公司编号数组
+    Returns:
+        S: csr稀疏矩阵, S[k, i] = T[i, companies[k]]
+    """
+    X = prune(B[companies])
+    S, pending, pendingNnz = X, list(), 0
+    for _ in range(MAX_DEPTH - 1):
+        X = prune(X @ B)
+        if X.nnz == 0:
+            break
+        pending.append(X.tocoo())
+        pendingNnz += X.nnz
+        # 各项累计的非零元超过S时再一次合并, 环路上残留的少量项不必每步都与整个S相加
+        if pendingNnz >= S.nnz:
+            S, pending, pendingNnz = mergeTerms(S, pending), list(), 0
+    return mergeTerms(S, pending)
+
+
+def mergeTerms(S, terms):
+    """
+    将若干项一次加到S上, 重复位置的元素在转为csr时求和
+    """
+    parts = [S.tocoo()] + terms
+    return sparse.coo_matrix((
+        np.concatenate([P.data for P in parts]),
+        (np.concatenate([P.row for P in parts]), np.concatenate([P.col for P in parts])),
+    ), shape=S.shape).tocsr()
+
+
+def prune(M):
+    """
+    舍去稀疏矩阵中低于MIN_STAKE的元素
+    """
+    M = M.tocsr()
+    M.data[M.data < MIN_STAKE] = 0
+    M.eliminate_zeros()
+    return M
+
+
+def localOwnership(G, comps):
+    """
+    将一批子图物化为局部图, 各子图在局部图中互不相连, 持股矩阵为分块对角矩阵, 一次稀疏矩阵乘法即处理全部子图
+    Params:
+        G: CompactGraph
+        comps: 子图编号数组
+    Returns:
+        H: 局部图
+        B: 局部图直接持股矩阵的转置
+    """
+    H = G.induced(graphCore.gatherRanges(G.compPtr, G.compNodes, comps)[1])
+    return H, ownershipMatrix(H).T.tocsr()
+
+
+def loopsOfBatch(G, comps):
+    """
+    一批子图中各公司经由环路持有自己的比例加一, 即(I - A)^-1的对角元
+    对角元只在环路节点上非零, 只为这些公司展开幂级数
+    Params:
+        G: CompactGraph
+        comps: 子图编号数组
+    Returns:
+        loops: 按局部图编号排列的对角元
+    """
+    H, B = localOwnership(G, comps)
+    loops = np.ones(H.n)
+    cyclic = np.array(H.cyclicNodes(np.arange(H.n), adj=H.adjacency()), dtype=np.int64)
+    for lo in range(0, len(cyclic), OWNERSHIP_BLOCK_COMPANIES):
+        block = cyclic[lo:lo + OWNERSHIP_BLOCK_COMPANIES]
+        loops[block] += integratedStakes(B, block)[np.arange(len(block)), block].A1
+    return loops
+
+
+def ownershipOfBlock(G, task):
+    """
+    找到一批子图中部分公司综合持股比例最高的股东
+    股东经由环路持有自己的部分会重复计入其后的路径, 因此除以(I - A)^-1的对角元, 只保留不再回到股东本身的路径
+    Params:
+        G: CompactGraph
+        task: (comps, lo, hi, loops), 处理子图comps组成的局部图中编号lo至hi-1的公司, loops为loopsOfBatch的结果
+    Returns:
+        companies: 有股东的公司编号数组
+        holders: 各公司综合持股比例最高的股东编号, 比例相同(相差不超过1e-9)时取公司Id最小者
+        stakes: 对应的综合持股比例
+    """
+    comps, lo, hi, loops = task
+    H, B = localOwnership(G, comps)
+    S = integratedStakes(B, np.arange(lo, hi)).tocoo()
+    company, holder = S.row + lo, S.col
+    off = company != holder
+    company, holder = company[off], holder[off]
+    val = np.minimum(S.data[off] / loops[holder], 1)
+    # 按舍入后的比例排序, 使求和顺序带来的浮点误差不影响比例相同的股东之间的取舍
+    order = np.lexsort((idRank(G, H.globalNodes)[holder], -np.round(val, 9), company))
+    _, first = np.unique(company[order], return_index=True)
+    top = order[first]
+    return H.globalNodes[company[top]], H.globalNodes[holder[top]], val[top]
+
+
+def idRank(G, nodes=None):
+    """
+    节点按公司Id排序后的名次, 用于与节点编号无关的取舍, 使增量更新与全量重建的结果一致
+    Params:
+        G: CompactGraph
+        nodes: 节点编号数组, 为None时为全部节点
+    Returns:
+        rank: 与nodes一一对应的名次数组
+    """
+    ids = np.array(G.index.ids if nodes is None else G.index.decode(nodes))
+    rank = np.empty(len(ids), dtype=np.int64)
+    rank[np.argsort(ids, kind="stable")] = np.arange(len(ids))
+    return rank
+
+
+def ultimateControllers(controller, rank=None):
+    """
+    沿控股股东向上追溯到最终控制人, 即自身不再被控股的股东
+    用倍增法一次求出全部节点的追溯终点; 控股关系形成环路时, 以环上名次最小的公司作为最终控制人
+    Params:
+        controller: 每个节点的控股股东编号, 没有控股股东时为-1
+        rank: 各节点的名次, 见idRank, 为None时按编号
+    Returns:
+        ultimate: 每个节点的最终控制人编号, 没有控股股东时为-1
+    """
+    n = len(controller)
+    hasController = controller >= 0
+    f = np.where(hasController, controller, np.arange(n))
+    g = f.copy()
+    for _ in range(max(int(np.ceil(np.log2(max(n, 2)))) + 1, 1)):
+        g = g[g]
+    ultimate = np.where(hasController, g, -1)
+    # 追溯终点仍有控股股东的节点指向控股环路, 找出环上的全部节点并以名次最小的公司代表整个环路
+    inLoop = hasController & hasController[g]
+    if inLoop.any():
+        members = np.unique(g[inLoop])
+        cur = f[members]
+        while not np.isin(cur, members).all():
+            members = np.union1d(members, cur)
+            cur = f[cur]
+        # 在名次上合并, 并查集的根即为名次最小的公司
+        rank = np.arange(n) if rank is None else rank
+        node = np.empty(n, dtype=np.int64)
+        node[rank] = np.arange(n)
+        uf = graphCore.UnionFind(n)
+        uf.union(rank[members], rank[f[members]])
+        ultimate[inLoop] = node[uf.find(rank[g[inLoop]])]
+        # 代表环路的公司以其控股股东作为最终控制人
+        selfLoop = ultimate == np.arange(n)
+        ultimate[selfLoop] = controller[selfLoop]
+    return ultimate
+
+
+@metrics.stage
+def integratedOwnership(G, threshold=CONTROL_THRESHOLD, workers=1, comps=None):
+    """
+    用综合持股矩阵(I - A)^-1识别控股股东和最终控制人, 适用于多根和交叉持股的子图
+    Params:
+        G: 控制人关系图
+        threshold: 综合持股比例不低于该值的股东视为控股股东
+        workers: 并行计算的进程数
+        comps: 只重新计算这些子图, 为None时计算全部子图, 用于增量更新
     Outputs:
-        输出转化后的json文件
+        G: 标记controller(控股股东), ultimate(最终控制人)和stake(最大股东的综合持股比例)后的图,
+            没有控股股东的节点controller和ultimate为-1
+    """
+    inComps = G.componentMask(comps)
+    inScope = inComps[G.comp]
+    for k, dtype, empty in (("controller", np.int32, -1), ("ultimate", np.int32, -1), ("stake", np.float64, 0)):
+        if k not in G.nodeAttr:
+            G.nodeAttr[k] = np.full(G.n, empty, dtype=dtype)
+        G.nodeAttr[k][inScope] = empty
+    controller, stake = G.nodeAttr["controller"], G.nodeAttr["stake"]
+    sizes = G.componentSize()
+    targets = np.nonzero(inComps & (sizes > 1))[0]
+    batches = [targets[b] for b in parallel.packBatches(sizes[targets].tolist(), OWNERSHIP_BATCH_NODES)]
+    # 先求各批的对角元, 再将每批的公司分块, 大子图也能分给多个进程
+    tasks = [
+        (comps, lo, min(lo + OWNERSHIP_BLOCK_COMPANIES, len(loops)), loops)
+        for comps, loops in zip(batches, parallel.mapTasks(loopsOfBatch, G, batches, workers))
+        for lo in range(0, len(loops), OWNERSHIP_BLOCK_COMPANIES)
+    ]
+    for companies, holders, stakes in parallel.mapTasks(ownershipOfBlock, G, tasks, workers):
+        stake[companies] = stakes
+        held = stakes >= threshold
+        controller[companies[held]] = holders[held]
+    # 控股链不会跨越子图, 追溯是整张图上的向量化运算, 只写回范围内的节点
+    ultimate = ultimateControllers(controller.astype(np.int64), idRank(G))
+    G.nodeAttr["ultimate"][inScope] = ultimate[inScope]
+    controlled = int((controller >= 0).sum())
+    metrics.count(controlled=controlled)
+    print("存在控股股东的公司数量：", controlled, "个")
+    print("----------综合持股计算完成----------")
+    return G
+
+
+def nodeRecord(Gid, id, isControl, isCross, isRoot):
     """
-    controlList = {"nodes": [], "links": []}
-    crossList = {"nodes": [], "links": []}
-    doubleCurList = {"nodes": [], "links": []}
-    multiCurList = {"nodes": [], "links": []}
+    单个节点导出到前端的记录
+    """
+    if isControl:
+        group, c, size = 0, "control", 5
+    elif isCross:
+        group, c, size = 1, "cross", 3
+    elif isRoot:
+        group, c, size = 2, "root", 3
+    else:
+        group, c, size = 3, "normal", 1
+    return {
+        "group": group, 
+        "class": c, 
+        "size": size, 
+        "Gid": Gid, 
+        "id": id
+    }
+
+
+def recordsOfSubG(G, Gid):
+    """
+    单个子图导出到前端的节点和边记录
+    Params:
+        G: 控制人关系图
+        Gid: 子图编号
+    Returns:
+        tmp: 子图的{"nodes": [...], "links": [...]}
+    """
+    ids = G.index.ids
+    rate = G.edgeAttr["rate"]
+    # 初始化子图数据, 先后加点和边
     tmp = {"nodes": [], "links": []}
-    i, j = 0, 0
-    Gid = 0  # 子图编号
-    doubleCount, multiCount = 0, 0
-    for item in GList:
-        tmp["nodes"], tmp["links"] = [], []
-        # 初始化子图数据, 先后加点和边
-        inControl, inCross, isIn = False, False, False
-        for n in item.nodes:
-            if item.nodes[n]["isControl"]:
-                group, c, size = 0, "control", 5
-                inControl, isIn = True, True
-            elif item.nodes[n]["isCross"]:
-                group, c, size = 1, "cross", 3
-                inCross, isIn = True, True
-            elif item.nodes[n]["isRoot"]:
-                group, c, size = 2, "root", 3
-            else:
-                group, c, size = 3, "normal", 1
-            tmp["nodes"].append({
-                "group": group, 
-                "class": c, 
-                "size": size, 
-                "Gid": Gid, 
-                "id": n
-            })
-        for u, v in item.edges:
+    nodes = G.componentNodes(Gid)
+    for n, control, cross, root in zip(
+        nodes.tolist(), *(G.nodeAttr[k][nodes].tolist() for k in ("isControl", "isCross", "isRoot"))
+    ):
+        tmp["nodes"].append(nodeRecord(Gid, ids[n], control, cross, root))
+    layout.attachPositions(G, nodes, tmp["nodes"])
+    edges = G.componentEdges(Gid)
+    for u, v, r in zip(G.src[edges].tolist(), G.dst[edges].tolist(), rate[edges].tolist()):
+        tmp["links"].append({
+            "source": ids[u], 
+            "target": ids[v], 
+            "rate": str(r) + "%"
+        })
+    return tmp
+
+
+def recordsOfPairs(G):
+    """
+    双节点子图的批量快速路径, 一次取出全部双节点子图的节点和边属性, 生成与recordsOfSubG相同的记录
+    避免对大量双节点子图逐个切片
+    Params:
+        G: 控制人关系图
+    Yields:
+        Gid, tmp: 子图编号及其{"nodes": [...], "links": [...]}, 按子图编号升序
+    """
+    comps, pairs = G.pairComponents()
+    ptr, edges = G.componentsEdges(comps)
+    nodes = pairs.ravel()
+    ids = G.index.decode(nodes)
+    control, cross, root = (G.nodeAttr[k][nodes].tolist() for k in ("isControl", "isCross", "isRoot"))
+    hasPos = "x" in G.nodeAttr
+    if hasPos:
+        x = [round(v, 2) for v in G.nodeAttr["x"][nodes].tolist()]
+        y = [round(v, 2) for v in G.nodeAttr["y"][nodes].tolist()]
+    src = G.index.decode(G.src[edges])
+    dst = G.index.decode(G.dst[edges])
+    rate = G.edgeAttr["rate"][edges].tolist()
+    ptr = ptr.tolist()
+    for i, Gid in enumerate(comps.tolist()):
+        tmp = {"nodes": [], "links": []}
+        for j in (2 * i, 2 * i + 1):
+            rec = nodeRecord(Gid, ids[j], control[j], cross[j], root[j])
+            if hasPos:
+                rec["x"], rec["y"] = x[j], y[j]
+            tmp["nodes"].append(rec)
+        for e in range(ptr[i], ptr[i + 1]):
             tmp["links"].append({
-                "source": u, 
-                "target": v, 
-                "rate": item[u][v]["rate"]
+                "source": src[e], 
+                "target": dst[e], 
+                "rate": str(rate[e]) + "%"
             })
+        yield Gid, tmp
+
+
+@metrics.stage
+def graphs2json(G):
+    """
+    将图数据输出为前端可视化用的json文件
+    Params:
+        G: 控制人关系图
+    Outputs:
+        输出转化后的json文件
+    """
+    # 各个json以流的方式写出, 内存中只保留当前子图tmp
+    path = "./frontend/public/res/json/control/"
+    controlList = streamJson.JsonStreamWriter(path + "control.json")
+    crossList = streamJson.JsonStreamWriter(path + "cross.json")
+    # 其他双节点子图每个json存储的点不超过3000个, 多节点子图以2950个为上限
+    doubleCurList = shardPacker.ShardPacker(path, "double", 3000)
+    multiCurList = shardPacker.ShardPacker(path, "multi", 2950)
+    # 每张子图单独打包并建立索引, 供前端按Gid或公司Id按需读取
+    subgraphs = subgraphIndex.SubgraphIndexWriter(path)
+    # 双节点子图走批量快速路径, 其余子图逐个生成记录
+    pairs = recordsOfPairs(G)
+    nextPair = next(pairs, (None, None))
+    for Gid in range(G.nComp):  # 子图编号
+        if Gid == nextPair[0]:
+            tmp = nextPair[1]
+            nextPair = next(pairs, (None, None))
+        else:
+            tmp = recordsOfSubG(G, Gid)
+        subgraphs.add(Gid, tmp)
+        classes = {rec["class"] for rec in tmp["nodes"]}
+        inControl, inCross = "control" in classes, "cross" in classes
         # Control关系json
         if inControl:
-            controlList["nodes"] += tmp["nodes"]
-            controlList["links"] += tmp["links"]
+            controlList.write(tmp)
         # 交叉持股关系json
         if inCross:
-            crossList["nodes"] += tmp["nodes"]
-            crossList["links"] += tmp["links"]
-        if not isIn:
+            crossList.write(tmp)
+        # 增量更新后废弃的空子图不导出
+        if not (inControl or inCross) and tmp["nodes"]:
             # 其他双节点json
             if len(tmp["nodes"]) == 2:
-                doubleCount += 2
-                # 每个json存储的点不超过3000个
-                if doubleCount >= 3000:
-                    path = "./frontend/public/res/json/control/" + "double_" + str(i) + ".json"
-                    with open(path, "w") as f:
-                        json.dump(doubleCurList, f)
-                    i += 1
-                    doubleCount = 0
-                    doubleCurList["nodes"], doubleCurList["links"] = [], []
-                else:
-                    doubleCurList["nodes"] += tmp["nodes"]
-                    doubleCurList["links"] += tmp["links"]
+                doubleCurList.add(Gid, tmp)
             # 其他多节点json
             else:
-                multiCount += len(tmp["nodes"])
-                # 每个json存储的点以2950个为阈值
-                if multiCount >= 2950:
-                    path = "./frontend/public/res/json/control/" + "multi_" + str(j) + ".json"
-                    with open(path, "w") as f:
-                        json.dump(multiCurList, f)
-                    j += 1
-                    multiCount = 0
-                    multiCurList["nodes"], multiCurList["links"] = [], []
-                else:
-                    multiCurList["nodes"] += tmp["nodes"]
-                    multiCurList["links"] += tmp["links"]
-        Gid += 1
-    # 剩余子图信息存到下一个json中
-    if len(tmp["nodes"]) == 2:
-        doubleCurList["nodes"] += tmp["nodes"]
-        doubleCurList["links"] += tmp["links"]
-    else:
-        multiCurList["nodes"] += tmp["nodes"]
-        multiCurList["links"] += tmp["links"]
-    if doubleCurList:
-        path = "./frontend/public/res/json/control/" + "double_" + str(i) + ".json"
-        with open(path, "w") as f:
-            json.dump(doubleCurList, f)
-    if multiCurList:
-        path = "./frontend/public/res/json/control/" + "multi_" + str(j) + ".json"
-        with open(path, "w") as f:
-            json.dump(multiCurList, f)
+                multiCurList.add(Gid, tmp)
     # 将上述数据写入文件
-    with open(r"./frontend/public/res/json/control/control.json", "w") as f:
-        json.dump(controlList, f)
-    with open(r"./frontend/public/res/json/control/cross.json", "w") as f:
-        json.dump(crossList, f)
+    for writer in [doubleCurList, multiCurList, controlList, crossList]:
+        writer.close()
+    subgraphs.close(G.index.ids, G.comp)
     print("----------控制人json导出完成----------")
 
 
-def ansJson(GList):
+def answersOfSubG(G, Gid):
     """
-    将图数据输出为答案的json文件
+    单个子图的答案记录
     Params:
-        GList: 图数据
-    Outputs:
-        输出转化后的json文件
+        G: 控制人关系图
+        Gid: 子图编号
+    Returns:
+        name: 记录所属的答案json, 为cross, control或normal, 空子图为None
+        links: 子图的from/to记录列表
+        counts: 子图中root, cross, control和普通节点的数量
     """
-    controlList = {"links": []}
-    crossList = {"links": []}
-    normalList = {"links": []}
+    ids = G.index.ids
+    isControl, isCross, isRoot = (G.nodeAttr[k] for k in ("isControl", "isCross", "isRoot"))
+    root = ""
+    controlNodes = list()
+    codes = G.componentNodes(Gid).tolist()
+    nodes = [ids[n] for n in codes]
     rootCount, crossCount, controlCount, normalCount = 0, 0, 0, 0
-    figureCount = [0, 0, 0]
-    for item in GList:
-        root = ""
-        controlNodes = list()
-        # 找根、交叉持股和control关系
-        inControl, inCross = False, False
-        for n in item.nodes:
-            if item.nodes[n]["isCross"]:
-                inCross = True
-                crossCount += 1
-                # break
-            elif item.nodes[n]["isControl"]:
-                inControl = True
-                controlNodes.append(n)
-                controlCount += 1
-            elif item.nodes[n]["isRoot"]:
-                root = n
-                rootCount += 1
-            else:
-                normalCount += 1
-                continue
-        # 存交叉持股关系
-        if inCross:
-            figureCount[0] += 1
-            for n in item.nodes():
-                crossList["links"].append({
-                    "from": "null",
-                    "to": n
-                })
-            continue
-        # 存Control关系
-        if inControl:
-            figureCount[1] += 1
-            for n in item.nodes():
-                if not n in controlNodes:
-                    controlList["links"].append({
-                        "from": controlNodes,
-                        "to": n
-                    })
-                else:
-                    controlList["links"].append({
-                        "from": "null",
-                        "to": n
-                    })
+    # 找根、交叉持股和control关系
+    inControl, inCross = False, False
+    for code, n in zip(codes, nodes):
+        if isCross[code]:
+            inCross = True
+            crossCount += 1
+            # break
+        elif isControl[code]:
+            inControl = True
+            controlNodes.append(n)
+            controlCount += 1
+        elif isRoot[code]:
+            root = n
+            rootCount += 1
+        else:
+            normalCount += 1
             continue
-        # 存实际控制人root关系
-        figureCount[2] += 1
-        for n in item.nodes():
-           
-            if not n == root:
-                normalList["links"].append({
-                    "from": root,
+    counts = (rootCount, crossCount, controlCount, normalCount)
+    if not nodes:
+        return None, [], counts
+    # 存交叉持股关系
+    if inCross:
+        return "cross", [{"from": "null", "to": n} for n in nodes], counts
+    # 存Control关系
+    if inControl:
+        links = list()
+        for n in nodes:
+            if not n in controlNodes:
+                links.append({
+                    "from": controlNodes,
                     "to": n
                 })
             else:
-                normalList["links"].append({
+                links.append({
                     "from": "null",
                     "to": n
                 })
-    print("存在实际控制人的子图数量：", figureCount[2], "个")
-    print("包含Control关系的子图数量：", figureCount[1], "个")
-    print("存在交叉持股的子图数量：", figureCount[0], "个")
+        return "control", links, counts
+    # 存实际控制人root关系
+    links = list()
+    for n in nodes:
+        if not n == root:
+            links.append({
+                "from": root,
+                "to": n
+            })
+        else:
+            links.append({
+                "from": "null",
+                "to": n
+            })
+    return "normal", links, counts
+
+
+@metrics.stage
+def ansJson(G):
+    """
+    将图数据输出为答案的json文件
+    Params:
+        G: 控制人关系图
+    Outputs:
+        输出转化后的json文件
+    """
+    lists = {"control": {"links": []}, "cross": {"links": []}, "normal": {"links": []}}
+    rootCount, crossCount, controlCount, normalCount = 0, 0, 0, 0
+    figureCount = Counter()
+    for Gid in range(G.nComp):
+        name, links, counts = answersOfSubG(G, Gid)
+        if name is None:
+            continue
+        figureCount[name] += 1
+        lists[name]["links"] += links
+        rootCount, crossCount, controlCount, normalCount = (
+            a + b for a, b in zip((rootCount, crossCount, controlCount, normalCount), counts)
+        )
+    print("存在实际控制人的子图数量：", figureCount["normal"], "个")
+    print("包含Control关系的子图数量：", figureCount["control"], "个")
+    print("存在交叉持股的子图数量：", figureCount["cross"], "个")
     print("被标记为实际控制人root的节点数量：", rootCount, "个")
     print("被标记为Control的节点数量：", controlCount, "个")
     print("被标记为交叉持股的节点数量：", crossCount, "个")
     print("被标记为非上述控制人或交叉持股的普通节点数量：", normalCount, "个")
     # 将上述数据写入文件
-    with open(r"./answers/control/control.json", "w") as f:
-        json.dump(controlList, f)
-    with open(r"./answers/control/cross.json", "w") as f:
-        json.dump(crossList, f)
-    with open(r"./answers/control/normal.json", "w") as f:
-        json.dump(normalList, f)
-    print("----------控制人表的答案json导出完成----------")
\ No newline at end of file
+    for name, data in lists.items():
+        with open(r"./answers/control/" + name + ".json", "w") as f:
+            json.dump(data, f)
+    print("----------控制人表的答案json导出完成----------")
+
+
+@metrics.stage
+def ownershipJson(G):
+    """
+    将综合持股识别出的控股股东和最终控制人输出为答案的json文件
+    Params:
+        G: 已执行integratedOwnership的控制人关系图
+    Outputs:
+        输出转化后的json文件
+    """
+    ids = G.index.ids
+    companies = np.nonzero(G.nodeAttr["controller"] >= 0)[0]
+    links = [
+        {"from": ids[u], "to": ids[n], "controller": ids[c], "stake": round(s, 4)}
+        for n, c, u, s in zip(
+            companies.tolist(),
+            G.nodeAttr["controller"][companies].tolist(),
+            G.nodeAttr["ultimate"][companies].tolist(),
+            G.nodeAttr["stake"][companies].tolist(),
+        )
+    ]
+    with open(r"./answers/control/ownership.json", "w") as f:
+        json.dump({"links": links}, f)
+    print("----------控制人表的综合持股json导出完成----------")
+
+
+def readDelta(path):
+    """
+    读取控制人关系的增量表格
+    表格在控制人表的列之前多一列操作, 取值为add(新增或修改持股)或del(解除持股)
+    Params:
+        path: 增量表格
+    Returns:
+        delta: 增量记录的DataFrame
+    """
+    delta = pd.read_csv(path, encoding="gb2312")
+    delta.columns = ["op", "relTag", "src", "destn", "relType", "rate"]
+    delta.loc[delta["rate"] >= 100, "rate"] = 100
+    return delta
+
+
+@metrics.stage
+def updateControlG(statePath, deltaPath, workers=1, threshold=CONTROL_THRESHOLD):
+    """
+    将当日的增量应用到持久化的控制人关系图上, 只重新识别受影响的子图
+    Params:
+        statePath: 上一次运行保存的图状态, 见incremental.saveState
+        deltaPath: 增量表格
+        workers: 并行处理子图的进程数
+        threshold: 综合持股比例不低于该值的股东视为控股股东
+    Returns:
+        G: 更新前的图
+        H: 更新后已标记isControl, isRoot, isCross以及controller, ultimate和stake的图
+        changed: 受影响的子图编号数组
+    """
+    G = incremental.loadState(statePath)
+    delta = readDelta(deltaPath)
+    H, changed = incremental.applyDelta(
+        G,
+        delta["src"].to_numpy(),
+        delta["destn"].to_numpy(),
+        (delta["op"] == "del").to_numpy(),
+        {
+            "rate": delta["rate"].to_numpy(),
+            "isControl": (delta["relType"] == "Control").to_numpy().astype(np.int8),
+        },
+        codeAttrs=("controller", "ultimate"),
+    )
+    metrics.count(changed=len(changed))
+    getRootOfControlG(H, workers, changed)
+    # 状态中尚无综合持股的结果时对整张图计算一次
+    integratedOwnership(H, threshold, workers, changed if "controller" in G.nodeAttr else None)
+    return G, H, changed
+
+
+@metrics.stage
+def updateAnsJson(G, H, changed):
+    """
+    增量导出答案: 比较受影响的子图在更新前后的答案记录, 只输出删去和新增的from/to记录
+    Params:
+        G: 更新前的图
+        H: 更新后的图
+        changed: 受影响的子图编号数组
+    Outputs:
+        ./answers/control/delta.json, 形如{"removed": {"control": [...], ...}, "added": {...}}
+    """
+    removed = {"control": [], "cross": [], "normal": []}
+    added = {"control": [], "cross": [], "normal": []}
+    for Gid in np.asarray(changed).tolist():
+        old = Counter()
+        if Gid < G.nComp:
+            name, links, _ = answersOfSubG(G, Gid)
+            old.update((name, json.dumps(rec)) for rec in links)
+        name, links, _ = answersOfSubG(H, Gid)
+        new = Counter((name, json.dumps(rec)) for rec in links)
+        for (name, rec), count in (old - new).items():
+            removed[name] += [json.loads(rec)] * count
+        for (name, rec), count in (new - old).items():
+            added[name] += [json.loads(rec)] * count
+    print("删去的答案记录数：", sum(len(v) for v in removed.values()))
+    print("新增的答案记录数：", sum(len(v) for v in added.values()))
+    with open(r"./answers/control/delta.json", "w") as f:
+        json.dump({"removed": removed, "added": added}, f)
+    print("----------控制人表的增量答案json导出完成----------")
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+
+
+class NodeIndex:
+    """
+    节点Id驻留表, 将形如T00015c94...的字符串Id映射为连续的int32编号
+    编号按Id首次出现的顺序分配, 每个Id只保存一份, 仅在导出时还原为字符串
+    """
+
+    def __init__(self):
+        self.ids = list()
+        self.codes = dict()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def encode(self, values):
+        """
+        将一列Id编码为int32编号, 未出现过的Id依次分配新编号
+        Params:
+            values: Id序列
+        Returns:
+            codes: int32编号数组
+        """
+        inverse, uniques = pd.factorize(np.asarray(values, dtype=object))
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, x in enumerate(uniques):
+            code = self.codes.get(x)
+            if code is None:
+                code = self.codes[x] = len(self.ids)
+                self.ids.append(x)
+            mapping[i] = code
+        return mapping[inverse]
+
+    def decode(self, codes):
+        """
+        将int32编号还原为字符串Id
+        Params:
+            codes: 编号序列
+        Returns:
+            ids: Id列表
+        """
+        return [self.ids[c] for c in np.asarray(codes).tolist()]
+
+
+def buildCSR(keys, n):
+    """
+    按keys对边分组, 得到CSR索引
+    Params:
+        keys: 每条边的分组节点编号
+        n: 节点数
+    Returns:
+        ptr: 长度为n+1的偏移数组, 节点u的边为edges[ptr[u]:ptr[u+1]]
+        edges: 按分组节点稳定排序后的边编号
+    """
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=ptr[1:])
+    edges = np.argsort(keys, kind="stable").astype(np.int32)
+    return ptr, edges
+
+
+def segmentReduce(ufunc, values, ptr, empty=0):
+    """
+    按CSR偏移分段归约, 允许存在空段
+    Params:
+        ufunc: 归约用的ufunc, 如np.maximum
+        values: 待归约的数组
+        ptr: 长度为段数+1的偏移数组
+        empty: 空段的取值
+    Returns:
+        out: 每段的归约结果
+    """
+    out = np.full(len(ptr) - 1, empty, dtype=values.dtype)
+    nonEmpty = ptr[:-1] < ptr[1:]
+    if nonEmpty.any():
+        out[nonEmpty] = ufunc.reduceat(values, ptr[:-1][nonEmpty])
+    return out
+
+
+def gatherRanges(ptr, values, keys):
+    """
+    按CSR偏移取出多个分组的元素, 依次拼接
+    Params:
+        ptr: 偏移数组, 分组k的元素为values[ptr[k]:ptr[k+1]]
+        values: 元素数组
+        keys: 分组编号数组
+    Returns:
+        outPtr: 长度为len(keys)+1的偏移数组, 第i个分组的元素为out[outPtr[i]:outPtr[i+1]]
+        out: 拼接后的元素
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    start, end = ptr[keys], ptr[keys + 1]
+    outPtr = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(end - start, out=outPtr[1:])
+    offset = np.arange(outPtr[-1]) - np.repeat(outPtr[:-1] - start, end - start)
+    return outPtr, values[offset]
+
+
+class UnionFind:
+    """
+    并查集, 以父节点数组存储, 每个集合以其中最小的编号为根
+    批量合并时以向量化的方式将较大的根挂接到较小的根上, 再整体做路径压缩, 直至边的两端同根
+    """
+
+    def __init__(self, n):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def compress(self):
+        """
+        路径压缩, 使每个节点直接指向根
+        """
+        while True:
+            grand = self.parent[self.parent]
+            if np.array_equal(grand, self.parent):
+                return
+            self.parent = grand
+
+    def union(self, a, b):
+        """
+        批量合并a[i]和b[i]所在的集合
+        """
+        a, b = np.asarray(a), np.asarray(b)
+        while True:
+            self.compress()
+            ra, rb = self.parent[a], self.parent[b]
+            diff = ra != rb
+            if not diff.any():
+                return
+            # 已经同根的边不再参与后续轮次
+            a, b, ra, rb = a[diff], b[diff], ra[diff], rb[diff]
+            np.minimum.at(self.parent, np.maximum(ra, rb), np.minimum(ra, rb))
+
+    def find(self, x):
+        """
+        节点所在集合的根
+        """
+        self.compress()
+        return self.parent[x]
+
+
+def connectedComponents(src, dst, n):
+    """
+    用scipy.sparse.csgraph在边数组构成的稀疏邻接矩阵上求弱连通分量, 不构造networkx的无向图副本
+    子图按其最小节点编号排序, 子图内的节点按编号排序
+    Params:
+        src: 起点编号数组
+        dst: 终点编号数组
+        n: 节点数
+    Returns:
+        comp: 每个节点所属的子图编号
+        ptr: 长度为子图数+1的偏移数组
+        nodes: 按子图分组的节点编号, 子图c的节点为nodes[ptr[c]:ptr[c+1]]
+    """
+    adj = sparse.csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+    nComp, labels = csgraph.connected_components(adj, directed=True, connection="weak")
+    # 各分量首次出现的位置即其最小节点编号, 据此重新编号
+    _, first = np.unique(labels, return_index=True)
+    rank = np.empty(nComp, dtype=np.int32)
+    rank[np.argsort(first)] = np.arange(nComp, dtype=np.int32)
+    comp = rank[labels]
+    ptr, nodes = buildCSR(comp, nComp)
+    return comp, ptr, nodes
+
+
+def uniqueEdges(src, dst, n, returnInverse=False):
+    """
+    简单有向图的去重边, 与DiGraph重复加边的行为一致: 边的位置取首次出现, 属性取最后一次出现
+    Params:
+        src: 起点编号数组
+        dst: 终点编号数组
+        n: 节点数
+        returnInverse: 是否同时返回每一行对应的去重边序号
+    Returns:
+        first: 去重后每条边首次出现的行号, 按出现顺序排列
+        last: 对应的最后一次出现的行号
+        inverse: 每一行对应的去重边在first中的序号, 仅returnInverse为True时返回
+    """
+    keys = src.astype(np.int64) * n + dst
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    last = np.zeros(len(first), dtype=np.int64)
+    np.maximum.at(last, inverse, np.arange(len(keys)))
+    order = np.argsort(first, kind="stable")
+    if not returnInverse:
+        return first[order], last[order]
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], last[order], rank[inverse.ravel()]
+
+
+class CompactGraph:
+    """
+    以CSR数组存储的有向图, 可含重复边
+    节点为0..n-1的int32编号, 节点属性和边属性均为NumPy列
+    边按加入顺序存储在src/dst中, outPtr/outEdges按起点索引边, inPtr/inEdges按终点索引边
+    comp为每个节点所属的子图编号, 子图按无向连通性切分
+    增量更新时可直接给出comp和nComp, 使未受影响的子图保持原编号, 此时允许存在已废弃的空子图
+    """
+
+    def __init__(self, index, src, dst, nodeAttr=None, edgeAttr=None, comp=None, nComp=None):
+        self.index = index
+        self.n = len(index)
+        self.src = np.asarray(src, dtype=np.int32)
+        self.dst = np.asarray(dst, dtype=np.int32)
+        self.nodeAttr = nodeAttr or dict()
+        self.edgeAttr = edgeAttr or dict()
+        self.outPtr, self.outEdges = buildCSR(self.src, self.n)
+        self.inPtr, self.inEdges = buildCSR(self.dst, self.n)
+        if comp is None:
+            self.labelComponents()
+        else:
+            self.setComponents(comp, nComp)
+
+    def numberOfEdges(self):
+        return len(self.src)
+
+    def outDegree(self):
+        return np.diff(self.outPtr)
+
+    def inDegree(self):
+        return np.diff(self.inPtr)
+
+    def outEdgesOf(self, u):
+        return self.outEdges[self.outPtr[u]:self.outPtr[u + 1]]
+
+    def inEdgesOf(self, v):
+        return self.inEdges[self.inPtr[v]:self.inPtr[v + 1]]
+
+    def successors(self, u):
+        return self.dst[self.outEdgesOf(u)]
+
+    def predecessors(self, v):
+        return self.src[self.inEdgesOf(v)]
+
+    def labelComponents(self):
+        """
+        按无向连通性切分子图, 子图按其最小节点编号排序, 子图内的节点按编号排序
+        """
+        comp, ptr, nodes = connectedComponents(self.src, self.dst, self.n)
+        self.setComponents(comp, len(ptr) - 1, (ptr, nodes))
+
+    def setComponents(self, comp, nComp=None, groups=None):
+        """
+        按给定的子图编号建立子图内的节点和边索引
+        Params:
+            comp: 每个节点所属的子图编号
+            nComp: 子图编号总数, 默认为最大编号+1
+            groups: 已按子图分组的(ptr, nodes), 给出时不再重新分组
+        """
+        self.comp = np.asarray(comp, dtype=np.int32)
+        self.nComp = int(self.comp.max()) + 1 if nComp is None else nComp
+        self.compPtr, self.compNodes = buildCSR(self.comp, self.nComp) if groups is None else groups
+        # 子图内的边保持outEdges中的顺序
+        order = np.argsort(self.comp[self.src[self.outEdges]], kind="stable")
+        self.compEdgePtr = np.zeros(self.nComp + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.comp[self.src], minlength=self.nComp),
+            out=self.compEdgePtr[1:],
+        )
+        self.compEdges = self.outEdges[order]
+
+    def componentSize(self):
+        return np.diff(self.compPtr)
+
+    def componentMask(self, comps=None):
+        """
+        将子图编号数组转为按子图编号索引的布尔数组, 用于只处理部分子图
+        Params:
+            comps: 子图编号数组, 为None时表示全部子图
+        Returns:
+            inComps: 长度为子图数的布尔数组
+        """
+        if comps is None:
+            return np.ones(self.nComp, dtype=bool)
+        inComps = np.zeros(self.nComp, dtype=bool)
+        inComps[np.asarray(comps, dtype=np.int64)] = True
+        return inComps
+
+    def componentNodes(self, c):
+        return self.compNodes[self.compPtr[c]:self.compPtr[c + 1]]
+
+    def pairComponents(self):
+        """
+        一次取出全部双节点子图, 供批量处理
+        Returns:
+            comps: 双节点子图编号, 升序
+            pairs: k×2的节点编号数组, 每行为一个子图的两个节点
+        """
+        comps = np.nonzero(self.componentSize() == 2)[0]
+        return comps, self.compNodes[self.compPtr[comps][:, None] + np.arange(2)]
+
+    def componentsEdges(self, comps):
+        """
+        一次取出多个子图的边
+        Params:
+            comps: 子图编号数组
+        Returns:
+            ptr: 长度为len(comps)+1的偏移数组, 第i个子图的边为edges[ptr[i]:ptr[i+1]]
+            edges: 各子图的边依次拼接
+        """
+        return gatherRanges(self.compEdgePtr, self.compEdges, comps)
+
+    def componentEdges(self, c):
+        return self.compEdges[self.compEdgePtr[c]:self.compEdgePtr[c + 1]]
+
+    def strongComponents(self, nodes, adj=None):
+        """
+        用非递归的Tarjan算法求强连通分量
+        Params:
+            nodes: 搜索起点, 须为若干完整的子图的节点
+            adj: adjacency()得到的后继列表, 给出时不再逐个节点切片
+        Returns:
+            sccs: 强连通分量列表, 每个元素为节点编号列表
+        """
+        if adj is None:
+            successors = lambda v: self.successors(v).tolist()
+            index, low = dict(), dict()
+            visited = index.__contains__
+        else:
+            # 局部编号连续时用列表代替字典保存访问序号
+            successors = adj.__getitem__
+            index, low = [-1] * len(adj), [-1] * len(adj)
+            visited = lambda v: index[v] >= 0
+        count = 0
+        stack, onStack = list(), set()
+        sccs = list()
+        for root in np.asarray(nodes).tolist():
+            if visited(root):
+                continue
+            index[root] = low[root] = count
+            count += 1
+            stack.append(root)
+            onStack.add(root)
+            work = [(root, iter(successors(root)))]
+            while work:
+                v, it = work[-1]
+                for w in it:
+                    if not visited(w):
+                        index[w] = low[w] = count
+                        count += 1
+                        stack.append(w)
+                        onStack.add(w)
+                        work.append((w, iter(successors(w))))
+                        break
+                    elif w in onStack:
+                        low[v] = min(low[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        u = work[-1][0]
+                        low[u] = min(low[u], low[v])
+                    if low[v] == index[v]:
+                        scc = list()
+                        while True:
+                            w = stack.pop()
+                            onStack.discard(w)
+                            scc.append(w)
+                            if w == v:
+                                break
+                        sccs.append(scc)
+        return sccs
+
+    def cyclicNodes(self, nodes, selfLoop=False, adj=None):
+        """
+        处于环路上的节点, 即非平凡强连通分量中的节点
+        Params:
+            nodes: 搜索起点, 须为若干完整的子图的节点
+            selfLoop: 是否将带自环的单个节点计入
+            adj: adjacency()得到的后继列表
+        Returns:
+            cyclic: 环路节点编号列表
+        """
+        cyclic = list()
+        for scc in self.strongComponents(nodes, adj):
+            if len(scc) > 1 or (selfLoop and scc[0] in self.successors(scc[0])):
+                cyclic += scc
+        return cyclic
+
+    def adjacency(self):
+        """
+        以Python列表表示的后继表, 适合在小图上做逐节点的搜索
+        Returns:
+            adj: 长度为n的列表, adj[u]为u的后继编号列表, 顺序与successors(u)一致
+        """
+        succ = self.dst[self.outEdges].tolist()
+        ptr = self.outPtr.tolist()
+        return [succ[ptr[u]:ptr[u + 1]] for u in range(self.n)]
+
+    def induced(self, nodes):
+        """
+        将若干节点的导出子图物化为独立的CompactGraph, 节点按给定顺序重新编号为0..k-1
+        节点属性和边属性复制为局部的连续数组, 对局部图的修改不会影响原图
+        局部图的index.ids为原图中的节点编号, 整张局部图视为一个子图
+        Params:
+            nodes: 节点编号数组
+        Returns:
+            H: 局部图
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if len(nodes) * 8 >= self.n:
+            # 节点占全图的比例较大时, 直接按编号查表比二分查找快
+            local = np.full(self.n, -1, dtype=np.int64)
+            local[nodes] = np.arange(len(nodes))
+            toLocal = local.__getitem__
+        else:
+            order = np.argsort(nodes)
+            sortedNodes = nodes[order]
+
+            def toLocal(u):
+                pos = np.minimum(np.searchsorted(sortedNodes, u), len(nodes) - 1)
+                return np.where(sortedNodes[pos] == u, order[pos], -1)
+
+        # 只保留两端都在nodes中的边, 边保持原图中的顺序
+        edges = np.sort(gatherRanges(self.outPtr, self.outEdges, nodes)[1])
+        dst = toLocal(self.dst[edges])
+        edges, dst = edges[dst >= 0], dst[dst >= 0]
+        index = NodeIndex()
+        index.ids = nodes.tolist()
+        index.codes = {x: i for i, x in enumerate(index.ids)}
+        H = CompactGraph(
+            index,
+            toLocal(self.src[edges]),
+            dst,
+            nodeAttr={k: v[nodes] for k, v in self.nodeAttr.items()},
+            edgeAttr={k: v[edges] for k, v in self.edgeAttr.items()},
+            comp=np.zeros(len(nodes), dtype=np.int32),
+            nComp=1,
+        )
+        H.globalNodes, H.globalEdges = nodes, edges
+        return H
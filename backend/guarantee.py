@@ -1,312 +1,584 @@
-import os
 import json
+import enum
 import numpy as np
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
-from collections import defaultdict
 
+import componentCache
+import graphCore
+import incremental
+import layout
+import metrics
+import shardPacker
+import snapshot
+import streamJson
+import subgraphIndex
 
-def getInitGuaranteeG(path):
+class GuarType(enum.IntFlag):
+    """
+    担保关系的风险类型, 每个节点的guarType为若干类型按位或的结果, 以uint8数组存储
+    """
+    Chain = 1
+    Mutual = 2
+    Focus = 4
+    Cross = 8
+    Circle = 16
+    Normal = 32
+
+
+# 还原为字符串时的顺序: Normal、Mutual、Circle、Chain与原实现的识别顺序一致;
+# 原实现中同时为Cross和Focus的节点, 两者的先后取决于子图节点集合的遍历顺序, 每次运行可能不同, 这里固定为Focus在前
+guarTypeOrder = [
+    GuarType.Normal, GuarType.Focus, GuarType.Cross, GuarType.Mutual, GuarType.Circle, GuarType.Chain
+]
+# 按位标记查表: 风险类型列表、导出用的ctx字符串和多重风险数(类型数减1)
+guarTypeNames = [[t.name for t in guarTypeOrder if flags & t] for flags in range(64)]
+guarTypeCtx = [', '.join(names) for names in guarTypeNames]
+riskCountTable = np.array([max(len(names) - 1, 0) for names in guarTypeNames], dtype=np.int64)
+# 非Chain/Normal的风险类型
+unusualType = GuarType.Mutual | GuarType.Focus | GuarType.Cross | GuarType.Circle
+
+# 前端json的导出路径
+jsonPath = "./frontend/public/res/json/guarantee/"
+listPaths = {
+    "circle": jsonPath + "circle.json",
+    "mutual": jsonPath + "mutual.json",
+    "cross": jsonPath + "cross.json",
+    "focus": jsonPath + "focus.json",
+    "multiNormal": jsonPath + "multiNormal.json",
+}
+
+
+def decodeGuarType(flags):
+    """
+    将风险类型的位标记还原为字符串列表
+    Params:
+        flags: 位标记
+    Returns:
+        guarType: 风险类型列表
+    """
+    return guarTypeNames[flags]
+
+
+def countMultiRisk(G):
+    """
+    统计多重风险节点的数量
+    Params:
+        G: 担保关系图
+    Returns:
+        counts: 依次为doubleRisk, tripleRisk, quadraRisk的节点数
+    """
+    riskCount = riskCountTable[G.nodeAttr["guarType"]]
+    return np.bincount(riskCount, minlength=4)[1:4]
+
+
+@metrics.stage
+def getInitGuaranteeG(path, snapshotDir=None):
     """
     读取担保关系的excel表格到DataFrame, 并切分子图
     Params:
         path: 含有担保关系数据的excel表格
+        snapshotDir: 二进制快照目录, 快照由同一份表格和同一版代码构建时直接内存映射快照, 否则解析表格后写出快照
     Returns: 
-        subG: 根据表格数据切分得到的子图集合, 每个元素都是一副子图
+        G: 根据表格数据构建的CompactGraph, 已按连通性切分子图
     """
+    if snapshot.isFresh(snapshotDir, path, __file__):
+        return snapshot.load(snapshotDir)
     guarantee = pd.read_csv(path, encoding="gb2312")
     guarantee.columns = ["src", "destn", "time", "guarType", "amount"]
     # 担保金额为0的样本视为无效的担保, 直接删去, 可减少870条边
     guarantee = guarantee[~guarantee["amount"].isin([0])]
 
-    # 构建初始图G
-    G = nx.DiGraph()
-    for _, row in guarantee.iterrows():
-        G.add_node(row["src"], guarType=[], m=0.0, std=0.0)
-        G.add_node(row["destn"], guarType=[], m=0.0, std=0.0)
-        G.add_edge(
-            row["src"],
-            row["destn"],
-            guarType=[],
-            amount=row["amount"],
-            mij=0,
-        )
-    # 切分子图
-    tmp = nx.to_undirected(G)
-    subG = list()
-    doubleCount = 0
-    for c in nx.connected_components(tmp):
-        subG.append(G.subgraph(c))
-        if nx.number_of_nodes(subG[-1]) == 2:
-            doubleCount += 1
+    # 构建初始图G, 节点Id按在表中首次出现的顺序编号
+    index = graphCore.NodeIndex()
+    codes = index.encode(guarantee[["src", "destn"]].to_numpy().ravel()).reshape(-1, 2)
+    # 重复的边以表中最后一条记录为准
+    first, last = graphCore.uniqueEdges(codes[:, 0], codes[:, 1], len(index))
+    G = graphCore.CompactGraph(
+        index,
+        codes[first, 0],
+        codes[first, 1],
+        nodeAttr={
+            "guarType": np.zeros(len(index), dtype=np.uint8),
+            "m": np.zeros(len(index)),
+            "std": np.zeros(len(index)),
+        },
+        edgeAttr={"amount": guarantee["amount"].to_numpy()[last]},
+    )
+    doubleCount = int(np.sum(G.componentSize() == 2))
     print("----------初始化子图信息完成----------")
-    print("有效担保关系节点总数：", nx.number_of_nodes(G))
-    print("有效担保关系边总数：", nx.number_of_edges(G))
-    print("切分子图数量：", len(subG))
+    print("有效担保关系节点总数：", G.n)
+    print("有效担保关系边总数：", G.numberOfEdges())
+    print("切分子图数量：", G.nComp)
     print("双节点子图数量：", doubleCount)
-    return subG
+    if snapshotDir is not None:
+        snapshot.save(G, snapshotDir, path, __file__)
+    return G
 
 
-def markRiskOfGuaranteeG(GList):
+def findCircleNodes(G, nodes):
+    """
+    找到处于担保圈上的节点, 即至少处于一个长度不小于3的有向简单环上的节点, 双节点的互保不作为担保圈进行标记
+    将每个强连通分量内的边视为无向边并去掉自环和重边, 担保圈节点恰为至少有一条非桥邻边的节点:
+    长度不小于3的有向环在无向图中也是环, 环上的边都不是桥; 反之, 强连通图的每个块仍是强连通的,
+    节点数不少于3的块中每个节点都处于长度不小于3的有向环上
+    因此只需一次非递归DFS按low值找出桥, 耗时与节点数和边数成线性, 结果与搜索顺序无关
+    Params:
+        G: CompactGraph
+        nodes: 待搜索的节点, 搜索只沿这些节点之间的边进行
+    Returns:
+        circle: 担保圈节点集合
+    """
+    H = G.induced(nodes)
+    adj = H.adjacency()
+    sccOf = [-1] * H.n
+    for i, scc in enumerate(H.strongComponents(range(H.n), adj)):
+        for v in scc:
+            sccOf[v] = i
+    # 同一强连通分量内的无向邻居
+    nbrs = [set() for _ in range(H.n)]
+    for v in range(H.n):
+        for w in adj[v]:
+            if w != v and sccOf[w] == sccOf[v]:
+                nbrs[v].add(w)
+                nbrs[w].add(v)
+    index, low = [-1] * H.n, [-1] * H.n
+    count = 0
+    circle = set()
+    for root in range(H.n):
+        if index[root] >= 0 or not nbrs[root]:
+            continue
+        index[root] = low[root] = count
+        count += 1
+        work = [(root, -1, iter(nbrs[root]))]
+        while work:
+            v, parent, it = work[-1]
+            for w in it:
+                if index[w] < 0:
+                    index[w] = low[w] = count
+                    count += 1
+                    work.append((w, v, iter(nbrs[w])))
+                    break
+                if w != parent:
+                    # 非树边必不是桥
+                    low[v] = min(low[v], index[w])
+                    circle.update((v, w))
+            else:
+                work.pop()
+                if parent >= 0:
+                    low[parent] = min(low[parent], low[v])
+                    # v的子树可以不经过树边回到parent或其祖先时, 该树边不是桥
+                    if low[v] <= index[parent]:
+                        circle.update((v, parent))
+    return set(H.globalNodes[sorted(circle)].tolist())
+
+
+def circleOfSubG(G, c):
+    """
+    找到单个子图中处于环路上的节点和担保圈节点
+    担保圈和互保关系中的节点必处于同一个非平凡强连通分量中, 一次划分即可找到
+    Params:
+        G: CompactGraph
+        c: 子图编号
+    Returns:
+        cyclic: 环路节点列表
+        circle: 担保圈节点集合
+    """
+    # 子图物化为局部图, 局部编号与子图的节点顺序一致
+    H = G.induced(G.componentNodes(c))
+    # 按子图的节点顺序选取搜索起点, 使结果不依赖集合的遍历顺序
+    cyclic = sorted(H.cyclicNodes(range(H.n), adj=H.adjacency()))
+    return H.globalNodes[cyclic].tolist(), set(H.globalNodes[sorted(findCircleNodes(H, cyclic))].tolist())
+
+
+def encodeCircle(G, c, result):
+    """
+    将circleOfSubG的结果转为子图内序号, 用于缓存
+    """
+    cyclic, circle = result
+    return componentCache.nodesToLocal(G, c, cyclic), componentCache.nodesToLocal(G, c, sorted(circle))
+
+
+def decodeCircle(G, c, value):
+    """
+    将缓存的子图内序号还原为circleOfSubG的结果
+    """
+    cyclic, circle = value
+    return componentCache.nodesToGlobal(G, c, cyclic).tolist(), set(componentCache.nodesToGlobal(G, c, circle).tolist())
+
+
+@metrics.stage
+def markRiskOfGuaranteeG(G, workers=1, comps=None, cache=None):
     """
     标记担保关系图的风险
     Params:
-        GList: 担保关系子图列表
+        G: 担保关系图
+        workers: 并行找环的进程数
+        comps: 只重新标记这些子图, 为None时标记全部子图, 用于增量更新
+        cache: componentCache.ComponentCache, 结构未变的子图直接复用找环结果
     Output:
-        GList: 更新担保关系的列表
-    """
-    normalCount, mutualCount = 0, 0
-    chainCount, crossCount, focusCount = 0, 0, 0
-    for subG in GList:
-        # 双节点的子图, 仅可能为普通担保或互保
-        if subG.number_of_nodes() == 2:
-            # 普通担保判定
-            if nx.is_tree(subG):
-                for n in subG.nodes():
-                    subG.nodes[n]["guarType"].append("Normal")
-                    normalCount += 1
-            # 互保判定
-            else:
-                for n in subG.nodes():
-                    subG.nodes[n]["guarType"].append("Mutual")
-                    mutualCount += 1
-        # 多于2个节点的情形, 标记节点所属的担保关系类型
-        for u, v in subG.edges:
-            # 贪心策略: u为源点，则认为u更有可能为Cross; v为终点，则认为v更有可能成为Focus
-            # 原图中标记为Cross的边, 形如u为交通枢纽, 即u的度较大
-            # 一保多(星型担保 or 担保公司)
-            if subG.out_degree(u) >= 3 and "Cross" not in subG.nodes[u]["guarType"]:
-                subG.nodes[u]["guarType"].append("Cross")
-                crossCount += 1
-            # 原图中标记为Focus的边, 形如多个节点指向一个节点
-            # 多保一(联合担保)
-            if subG.in_degree(v) >= 3 and "Focus" not in subG.nodes[v]["guarType"]:
-                subG.nodes[v]["guarType"].append("Focus")
-                focusCount += 1
-        # 担保圈, 直接通过边属性检查, 经检验只有两个子图含有Circle标记, 但元数据的标记不准确
-        # 分别进行正向和逆向的拓扑排序检查, 可以找到遗漏的担保圈和互保关系
-        tmpG = nx.DiGraph(subG)
-        flag = True
-        while flag:
-            flag = False
-            l = list()
-            for n in tmpG.nodes():
-                if tmpG.in_degree(n) == 0:
-                    l.append(n)
-                    flag = True
-            tmpG.remove_nodes_from(l)
-        # 将边逆向, 再次拓扑排序
-        tmpG = nx.reverse(tmpG)
-        flag = True
-        while flag:
-            flag = False
-            l = list()
-            for n in tmpG.nodes():
-                if tmpG.in_degree(n) == 0:
-                    l.append(n)
-                    flag = True
-            tmpG.remove_nodes_from(l)
-        # 拓扑排序后图非空说明含有担保圈或互保关系
-        if nx.number_of_nodes(tmpG):
-            # 互保判定
-            for u, v in tmpG.edges():
-                if tmpG.has_edge(v, u):
-                    if "Mutual" not in subG.nodes[u]["guarType"]:
-                        subG.nodes[u]["guarType"].append("Mutual")
-                        mutualCount += 1
-                    if "Mutual" not in subG.nodes[v]["guarType"]:
-                        subG.nodes[v]["guarType"].append("Mutual")
-                        mutualCount += 1
-            # 担保圈判定
-            visited = list()
-            trace = list()
-
-            def dfs2FindCircle(node):
-                """
-                用回溯法找环
-                Params:
-                    node: 子图的起始搜索节点
-                """
-                global circleCount
-                if node in visited:
-                    if node in trace:
-                        trace_index = trace.index(node)
-                        # 双节点的互保不作为担保圈进行标记
-                        if len(trace) - trace_index > 2:
-                            for i in range(trace_index, len(trace)):
-                                if "Circle" not in subG.nodes[trace[i]]["guarType"]:
-                                    subG.nodes[trace[i]]["guarType"].append("Circle")
-                    return
-                visited.append(node)
-                trace.append(node)
-                for child in list(tmpG.neighbors(node)):
-                    dfs2FindCircle(child)
-                trace.pop()
-
-            dfs2FindCircle(list(tmpG.nodes())[0])
-        # 担保链: 若节点均不属于上述情况则该节点为担保链上的点
-        for u, v in subG.edges():
-            if not subG.nodes[u]["guarType"] and "Chain" not in subG.nodes[u]["guarType"]:
-                subG.nodes[u]["guarType"].append("Chain")
-                chainCount += 1
-            if not subG.nodes[v]["guarType"] and "Chain" not in subG.nodes[v]["guarType"]:
-                    subG.nodes[v]["guarType"].append("Chain")
-                    chainCount += 1
+        G: 在guarType中标记风险类型后的图
+    """
+    # GuarType须先转为np.uint8, 才能与uint8数组原地按位或
+    guarType = G.nodeAttr["guarType"]
+    inComps = G.componentMask(comps)
+    inScope = inComps[G.comp]
+    guarType[inScope] = 0
+    size = G.componentSize()[G.comp]
+    edgeCount = np.diff(G.compEdgePtr)[G.comp]
+    # 双节点的子图, 仅可能为普通担保或互保, 只有一条边时为普通担保
+    guarType[inScope & (size == 2) & (edgeCount == 1)] |= np.uint8(GuarType.Normal)
+    guarType[inScope & (size == 2) & (edgeCount > 1)] |= np.uint8(GuarType.Mutual)
+    # 多于2个节点的情形, 标记节点所属的担保关系类型
+    # 原图中标记为Cross的边, 形如u为交通枢纽, 即u的度较大
+    # 一保多(星型担保 or 担保公司)
+    guarType[inScope & (G.outDegree() >= 3)] |= np.uint8(GuarType.Cross)
+    # 原图中标记为Focus的边, 形如多个节点指向一个节点
+    # 多保一(联合担保)
+    guarType[inScope & (G.inDegree() >= 3)] |= np.uint8(GuarType.Focus)
+    # 担保圈, 直接通过边属性检查, 经检验只有两个子图含有Circle标记, 但元数据的标记不准确
+    # 边数不少于节点数的子图才可能含有环
+    candidate = inComps & (G.componentSize() > 2) & (np.diff(G.compEdgePtr) >= G.componentSize())
+    cyclic = np.zeros(G.n, dtype=bool)
+    for cyc, circle in componentCache.mapComponents(
+        cache, circleOfSubG, G, np.nonzero(candidate)[0], workers, encode=encodeCircle, decode=decodeCircle
+    ):
+        cyclic[cyc] = True
+        guarType[list(circle)] |= np.uint8(GuarType.Circle)
+    # 互保判定: 存在反向边的边, 自环的反向边即其自身, 与原实现一致标记为互保
+    recip = isReciprocal(G)
+    mutual = recip & inScope[G.src]
+    guarType[G.src[mutual]] |= np.uint8(GuarType.Mutual)
+    # 担保链: 若节点均不属于上述情况则该节点为担保链上的点
+    guarType[inScope & (guarType == 0)] = np.uint8(GuarType.Chain)
+    multiRisk = dict(zip(["doubleRisk", "tripleRisk", "quadraRisk"], countMultiRisk(G).tolist()))
+    for name, count in multiRisk.items():
+        print("标记为多重风险-" + name + "的节点有：", count, "个")
+    if metrics.enabled():
+        metrics.count(searched=candidate.sum(), cyclic=cyclic.sum(), **multiRisk)
     print("----------担保关系识别完成----------")
-    return GList
+    return G
 
 
-def riskQuantification(subG):
+def isReciprocal(G):
     """
-    标记节点的风险值m
+    判断每条边是否存在反向边
     Params:
-        G: 子图列表
+        G: CompactGraph
+    Returns:
+        recip: 布尔数组
+    """
+    keys = G.src.astype(np.int64) * G.n + G.dst
+    return np.isin(G.dst.astype(np.int64) * G.n + G.src, keys)
+
+
+@metrics.stage
+def riskQuantification(G, comps=None):
+    """
+    标记节点的风险值m及其可视化用的标准化值std
+    将各子图视为无向图, m为节点所有邻边的担保金额之和占所在子图担保总额的比例
+    用一次带权bincount求出全部节点的m, 再按子图分段归一化
+    Params:
+        G: 担保关系图
+        comps: 只重新计算这些子图, 为None时计算全部子图, 用于增量更新
     Outputs:
-        G: 标记各个节点风险值m后的子图列表
-    """
-    for G in subG:
-        de = dict()
-        tmpG = nx.Graph(G)
-        txnAllSum = sum(nx.get_edge_attributes(tmpG, "amount").values())
-        for n in tmpG.nodes():
-            neighbors = tmpG.adj[n].keys()
-            de[n] = sum(tmpG[n][neighbor]["amount"] / txnAllSum for neighbor in neighbors)
-            G.nodes[n]["m"] = de[n]
-        maxM, minM = max(de.values()), min(de.values())
-        if maxM == minM:
-            for n in G.nodes():
-                G.nodes[n]["std"] = 15
-        else:
-            k = 20/(maxM - minM)
-            for n in G.nodes():
-                G.nodes[n]["std"] = 5 + k * (G.nodes[n]["m"] - minM)
+        G: 标记各个节点风险值m后的图
+    """
+    inComps = G.componentMask(comps)
+    # 按边编号排序, 使去重结果与子图内边的排列顺序无关, 增量更新后重新编号的图与全量重建的结果一致
+    edges = np.sort(G.compEdges[inComps[G.comp[G.src[G.compEdges]]]])
+    u, v = G.src[edges], G.dst[edges]
+    a, b = np.minimum(u, v), np.maximum(u, v)
+    # 无向图中互为反向的两条边只计一次, 金额取边编号较大的一条, 即在表格中首次出现较晚的一条
+    keys = a.astype(np.int64) * G.n + b
+    _, idx = np.unique(keys[::-1], return_index=True)
+    keep = np.sort(len(keys) - 1 - idx)
+    a, b = a[keep], b[keep]
+    amount = G.edgeAttr["amount"][edges][keep]
+    # 每条边的金额除以所在子图的担保总额
+    txnAllSum = np.bincount(G.comp[a], weights=amount, minlength=G.nComp)
+    w = amount / txnAllSum[G.comp[a]]
+    # 每条边的权重计入两端, 自环只计一次; 按边编号的顺序逐条累加, 浮点求和的结果也与节点编号无关
+    loop = a == b
+    ends = np.stack([a, np.where(loop, G.n, b)], axis=1).ravel()
+    m = np.bincount(ends, weights=np.repeat(w, 2), minlength=G.n + 1)[:G.n]
+    # 按子图分段求最值, 标准化到[5, 25], 子图内m全部相等时取15
+    maxM = graphCore.segmentReduce(np.maximum, m[G.compNodes], G.compPtr)[G.comp]
+    minM = graphCore.segmentReduce(np.minimum, m[G.compNodes], G.compPtr)[G.comp]
+    same = maxM == minM
+    std = np.full(G.n, 15.0)
+    std[~same] = 5 + 20/(maxM[~same] - minM[~same]) * (m[~same] - minM[~same])
+    inScope = inComps[G.comp]
+    G.nodeAttr["m"][inScope] = m[inScope]
+    G.nodeAttr["std"][inScope] = std[inScope]
     print("----------m值计算完成----------")
 
 
 
-def graphs2json(GList):
+def listsOfSubG(flags, size):
     """
-    将图数据输出为前端可视化用的json文件
+    子图应存入的json列表
     Params:
-        GList: 图数据
-    Outputs:
-        输出转化后的json文件到filePath1和filepath2下
+        flags: 子图内各节点风险类型的按位或
+        size: 子图节点数
+    Returns:
+        names: 列表名, 空子图不存入任何列表
     """
-    circleList = {"links": [], "nodes": []}
-    mutualList = {"links": [], "nodes": []}
-    crossList = {"links": [], "nodes": []}
-    focusList = {"links": [], "nodes": []}
-    doubleNormalList = {"links": [], "nodes": []}
-    multiNormalList = {"links": [], "nodes": []}
-    Gid = 0  # 子图编号
-    doubleCount = 0
-    i = 0
-    c = ["doubleRisk", "tripleRisk", "quadraRisk"]
-    offsetDict = {"Chain": 0, "Mutual": 1, "Focus": 2, "Cross": 3,"Circle": 4, "Normal": 5}
-    for item in GList:
-        # 初始化子图数据, 先后加点和边
-        isMutual, isCircle, isCross, isFocus, isUnusual = False, False, False, False, False
+    if size == 0:
+        return []
+    if flags & unusualType:
+        return [name for name, t in [
+            ("circle", GuarType.Circle), ("mutual", GuarType.Mutual),
+            ("cross", GuarType.Cross), ("focus", GuarType.Focus),
+        ] if flags & t]
+    # "Chain"
+    return ["doubleNormal"] if size == 2 else ["multiNormal"]
+
+
+# 导出记录中多重风险的类名和单一风险的分组号
+riskClasses = ["doubleRisk", "tripleRisk", "quadraRisk"]
+offsetDict = {"Chain": 0, "Mutual": 1, "Focus": 2, "Cross": 3,"Circle": 4, "Normal": 5}
+riskCounts = riskCountTable.tolist()
+
+
+def nodeRecord(Gid, id, flags, std, m):
+    """
+    单个节点导出到前端的记录
+    """
+    riskCount = riskCounts[flags]
+    if riskCount > 0:
+        return {
+            "group": riskCount + 5, 
+            "class": riskClasses[riskCount-1], 
+            "size": std, 
+            "ctx": guarTypeCtx[flags], 
+            "Gid": Gid, 
+            "id": id, 
+            "m": m
+        }
+    name = guarTypeNames[flags][0]
+    return {
+        "group": offsetDict[name], 
+        "class": name, 
+        "size": std, 
+        "ctx": guarTypeCtx[flags], 
+        "Gid": Gid, 
+        "id": id, 
+        "m": m
+    }
+
+
+def recordsOfSubG(G, Gid):
+    """
+    单个子图导出到前端的节点和边记录
+    Params:
+        G: 担保关系图
+        Gid: 子图编号
+    Returns:
+        tmp: 子图的{"links": [...], "nodes": [...]}
+    """
+    ids = G.index.ids
+    amount = G.edgeAttr["amount"]
+    guarType = G.nodeAttr["guarType"]
+    # 初始化子图数据, 先后加点和边
+    tmp = {"links": [], "nodes": []}
+    nodes = G.componentNodes(Gid)
+    for n, flags, std, m in zip(
+        nodes.tolist(),
+        guarType[nodes].tolist(),
+        G.nodeAttr["std"][nodes].tolist(),
+        G.nodeAttr["m"][nodes].tolist(),
+    ):
+        tmp["nodes"].append(nodeRecord(Gid, ids[n], flags, std, m))
+    layout.attachPositions(G, nodes, tmp["nodes"])
+    # 加边
+    edges = G.componentEdges(Gid)
+    for u, v, a in zip(G.src[edges].tolist(), G.dst[edges].tolist(), amount[edges].tolist()):
+        tmp["links"].append({
+            "source": ids[u], 
+            "target": ids[v], 
+            "amount": a
+        })
+    return tmp
+
+
+def recordsOfPairs(G):
+    """
+    双节点子图的批量快速路径, 一次取出全部双节点子图的节点和边属性, 生成与recordsOfSubG相同的记录
+    避免对大量双节点子图逐个切片
+    Params:
+        G: 担保关系图
+    Yields:
+        Gid, tmp: 子图编号及其{"links": [...], "nodes": [...]}, 按子图编号升序
+    """
+    comps, pairs = G.pairComponents()
+    ptr, edges = G.componentsEdges(comps)
+    nodes = pairs.ravel()
+    ids = G.index.decode(nodes)
+    flags = G.nodeAttr["guarType"][nodes].tolist()
+    std = G.nodeAttr["std"][nodes].tolist()
+    m = G.nodeAttr["m"][nodes].tolist()
+    hasPos = "x" in G.nodeAttr
+    if hasPos:
+        x = [round(v, 2) for v in G.nodeAttr["x"][nodes].tolist()]
+        y = [round(v, 2) for v in G.nodeAttr["y"][nodes].tolist()]
+    src = G.index.decode(G.src[edges])
+    dst = G.index.decode(G.dst[edges])
+    amount = G.edgeAttr["amount"][edges].tolist()
+    ptr = ptr.tolist()
+    for i, Gid in enumerate(comps.tolist()):
         tmp = {"links": [], "nodes": []}
-        for n in item.nodes:
-            riskCount = len(item.nodes[n]["guarType"]) - 1
-            if "Mutual" in item.nodes[n]["guarType"]:
-                isMutual, isUnusual = True, True
-            if "Focus" in item.nodes[n]["guarType"]:
-                isFocus, isUnusual = True, True
-            if "Cross" in item.nodes[n]["guarType"]:
-                isCross, isUnusual = True, True
-            if "Circle" in item.nodes[n]["guarType"]:
-                isCircle, isUnusual = True, True
-            if riskCount > 0:
-                tmp["nodes"].append({
-                    "group": riskCount + 5, 
-                    "class": c[riskCount-1], 
-                    "size": item.nodes[n]["std"], 
-                    "ctx": ', '.join(item.nodes[n]["guarType"]), 
-                    "Gid": Gid, 
-                    "id": n, 
-                    "m": item.nodes[n]["m"]
-                })
-            else:
-                tmp["nodes"].append({
-                    "group": offsetDict[item.nodes[n]["guarType"][0]], 
-                    "class": item.nodes[n]["guarType"][0], 
-                    "size": item.nodes[n]["std"], 
-                    "ctx": ', '.join(item.nodes[n]["guarType"]), 
-                    "Gid": Gid, 
-                    "id": n, 
-                    "m": item.nodes[n]["m"]
-                })
-        # 加边
-        for u, v in item.edges:
+        for j in (2 * i, 2 * i + 1):
+            rec = nodeRecord(Gid, ids[j], flags[j], std[j], m[j])
+            if hasPos:
+                rec["x"], rec["y"] = x[j], y[j]
+            tmp["nodes"].append(rec)
+        for e in range(ptr[i], ptr[i + 1]):
             tmp["links"].append({
-                "source": u, 
-                "target": v, 
-                "amount": item[u][v]["amount"]
+                "source": src[e], 
+                "target": dst[e], 
+                "amount": amount[e]
             })
+        yield Gid, tmp
+
+
+def compTypeOf(G):
+    """
+    子图内各节点的风险类型按位或, 决定子图存入哪些json
+    """
+    return graphCore.segmentReduce(np.bitwise_or, G.nodeAttr["guarType"][G.compNodes], G.compPtr).tolist()
+
+
+@metrics.stage
+def graphs2json(G):
+    """
+    将图数据输出为前端可视化用的json文件
+    Params:
+        G: 担保关系图
+    Outputs:
+        输出转化后的json文件到jsonPath和listPaths下
+    """
+    # 各个json以流的方式写出, 内存中只保留当前子图tmp
+    keys = ("links", "nodes")
+    writers = {name: streamJson.JsonStreamWriter(p, keys) for name, p in listPaths.items()}
+    doubleNormalList = shardPacker.ShardPacker(jsonPath, "doubleNormal", 2950, keys=keys)
+    # 每张子图单独打包并建立索引, 供前端按Gid或公司Id按需读取
+    subgraphs = subgraphIndex.SubgraphIndexWriter(jsonPath)
+    compType = compTypeOf(G)
+    size = G.componentSize().tolist()
+    # 双节点子图走批量快速路径, 其余子图逐个生成记录
+    pairs = recordsOfPairs(G)
+    nextPair = next(pairs, (None, None))
+    for Gid in range(G.nComp):  # 子图编号
+        if Gid == nextPair[0]:
+            tmp = nextPair[1]
+            nextPair = next(pairs, (None, None))
+        else:
+            tmp = recordsOfSubG(G, Gid)
+        subgraphs.add(Gid, tmp)
         # 存到对应类型的json中
-        if isUnusual:
-            if isCircle:
-                circleList["nodes"] += (tmp["nodes"])
-                circleList["links"] += (tmp["links"])
-            if isMutual:
-                mutualList["nodes"] += (tmp["nodes"])
-                mutualList["links"] += (tmp["links"])
-            if isCross:
-                crossList["nodes"] += (tmp["nodes"])
-                crossList["links"] += (tmp["links"])
-            if isFocus:
-                focusList["nodes"] += (tmp["nodes"])
-                focusList["links"] += (tmp["links"])
-        else:  # "Chain"
-            if nx.number_of_nodes(item) == 2:
-                doubleCount += 2
-                if doubleCount < 2950:
-                    doubleNormalList["nodes"] += (tmp["nodes"])
-                    doubleNormalList["links"] += (tmp["links"])
-                else:
-                    print("doubleNormalList", len(doubleNormalList["nodes"]))
-                    with open("./frontend/public/res/json/guarantee/doubleNormal_" + str(i) + ".json", "w") as f:
-                        json.dump(doubleNormalList, f)
-                    i += 1
-                    doubleCount = 2
-                    doubleNormalList = {"links": [], "nodes": []}
-                    doubleNormalList["nodes"] += (tmp["nodes"])
-                    doubleNormalList["links"] += (tmp["links"])
+        for name in listsOfSubG(compType[Gid], size[Gid]):
+            if name == "doubleNormal":
+                doubleNormalList.add(Gid, tmp)
             else:
-                multiNormalList["nodes"] += (tmp["nodes"])
-                multiNormalList["links"] += (tmp["links"])
-        Gid += 1
-    # 将剩余的双节点子图存到下一个json中
-    if doubleNormalList["nodes"]:
-        print("doubleNormalList", len(doubleNormalList["nodes"]))
-        with open("./frontend/public/res/json/guarantee/doubleNormal_" + str(i) + ".json", "w") as f:
-            json.dump(doubleNormalList, f)
-    print("circleList", len(circleList["nodes"]))
-    print("mutualList", len(mutualList["nodes"]))
-    print("crossList", len(crossList["nodes"]))
-    print("focusList", len(focusList["nodes"]))
-    print("multiNormalList", len(multiNormalList["nodes"]))
+                writers[name].write(tmp)
+    for shard in doubleNormalList.close()["shards"]:
+        print("doubleNormalList", shard["nodes"])
     # 将上述数据写入文件
-    with open(r"./frontend/public/res/json/guarantee/circle.json", "w") as f:
-        json.dump(circleList, f)
-    with open(r"./frontend/public/res/json/guarantee/mutual.json", "w") as f:
-        json.dump(mutualList, f)
-    with open(r"./frontend/republic/res/jsons/guarantee/cross.json", "w") as f:
-        json.dump(crossList, f)
-    with open(r"./frontend/public/res/json/guarantee/focus.json", "w") as f:
-        json.dump(focusList, f)
-    with open(r"./frontend/public/res/json/guarantee/multiNormal.json", "w") as f:
-        json.dump(multiNormalList, f)
+    for name, writer in writers.items():
+        print(name + "List", writer.count["nodes"])
+        writer.close()
+    subgraphs.close(G.index.ids, G.comp)
     print("----------担保关系的json导出完成完成----------")
 
 
-def ansJson(GList):
+def readDelta(path):
+    """
+    读取担保关系的增量表格
+    表格在担保关系表的列之前多一列操作, 取值为add(新增或修改担保)或del(解除担保)
+    Params:
+        path: 增量表格
+    Returns:
+        delta: 增量记录的DataFrame
+    """
+    delta = pd.read_csv(path, encoding="gb2312")
+    delta.columns = ["op", "src", "destn", "time", "guarType", "amount"]
+    # 与初始化时一致, 担保金额为0的新增视为无效的担保
+    return delta[~((delta["op"] == "add") & (delta["amount"] == 0))]
+
+
+@metrics.stage
+def updateGuaranteeG(statePath, deltaPath, workers=1):
+    """
+    将当日的增量应用到持久化的担保关系图上, 只重新识别和量化受影响的子图
+    Params:
+        statePath: 上一次运行保存的图状态, 见incremental.saveState
+        deltaPath: 增量表格
+        workers: 并行找环的进程数
+    Returns:
+        G: 更新前的图
+        H: 更新后已标记风险和m值的图
+        changed: 受影响的子图编号数组
+    """
+    G = incremental.loadState(statePath)
+    delta = readDelta(deltaPath)
+    H, changed = incremental.applyDelta(
+        G,
+        delta["src"].to_numpy(),
+        delta["destn"].to_numpy(),
+        (delta["op"] == "del").to_numpy(),
+        {"amount": delta["amount"].to_numpy()},
+    )
+    metrics.count(changed=len(changed))
+    markRiskOfGuaranteeG(H, workers, changed)
+    riskQuantification(H, changed)
+    return G, H, changed
+
+
+@metrics.stage
+def updateJson(G, H, changed):
+    """
+    增量导出: 只重写含有受影响子图的json
+    单文件的列表整体重写, doubleNormal只重写受影响的分片, 子图打包文件只追加受影响的子图
+    Params:
+        G: 更新前的图
+        H: 更新后的图
+        changed: 受影响的子图编号数组
+    Outputs:
+        更新jsonPath和listPaths下的json文件
+    """
+    keys = ("links", "nodes")
+    changed = np.asarray(changed).tolist()
+    oldType, oldSize = compTypeOf(G), G.componentSize().tolist()
+    newType, newSize = compTypeOf(H), H.componentSize().tolist()
+    records = {Gid: recordsOfSubG(H, Gid) for Gid in changed}
+
+    def recordsOf(Gid):
+        return records[Gid] if Gid in records else recordsOfSubG(H, Gid)
+
+    names = set()
+    for Gid in changed:
+        if Gid < G.nComp:
+            names.update(listsOfSubG(oldType[Gid], oldSize[Gid]))
+        names.update(listsOfSubG(newType[Gid], newSize[Gid]))
+    for name in sorted(names - {"doubleNormal"}):
+        with streamJson.JsonStreamWriter(listPaths[name], keys) as writer:
+            for Gid in range(H.nComp):
+                if name in listsOfSubG(newType[Gid], newSize[Gid]):
+                    writer.write(recordsOf(Gid))
+        print("重写" + name + "List", writer.count["nodes"])
+    members = [Gid for Gid in changed if "doubleNormal" in listsOfSubG(newType[Gid], newSize[Gid])]
+    for shard in shardPacker.updateShards(jsonPath, "doubleNormal", changed, members, recordsOf, keys):
+        print("重写doubleNormal分片", shard["file"], shard["nodes"])
+    subgraphIndex.updateIndex(jsonPath, changed, recordsOf, H.index.ids, H.comp, H.nComp)
+    print("----------担保关系的json增量导出完成----------")
+
+
+@metrics.stage
+def ansJson(G):
     """
     将图数据输出为答案的json文件
     Params:
-        GList: 图数据
+        G: 担保关系图
     Outputs:
         输出转化后的json文件到filePath1和filepath2下
     """
@@ -325,48 +597,54 @@ def ansJson(GList):
     # circleCount, normalCount, mutualCount = 0, 0, 0
     # chainCount, crossCount, focusCount = 0, 0, 0
     # figureCount = [0, 0, 0, 0, 0, 0]
-    for item in GList:
+    ids = G.index.ids
+    guarType = G.nodeAttr["guarType"]
+    isCircle = (guarType & GuarType.Circle) > 0
+    isMutual = (guarType & GuarType.Mutual) > 0
+    reciprocal = isReciprocal(G)
+    for Gid in range(G.nComp):
         # 初始化子图数据, 先后加点和边
         # isMutual, isCircle, isCross, isFocus, isUnusual = False, False, False, False, False
         # tmp = {"links": [], "nodes": []}
         circleTmp = list()
         chainTmp = list()
-        for n in item.nodes:
-            if "Circle" in item.nodes[n]["guarType"]:
-                for c in item.neighbors(n):
-                    if "Circle" in item.nodes[c]["guarType"]:
+        nodes = G.componentNodes(Gid)
+        for n in nodes.tolist():
+            if isCircle[n]:
+                for c in G.successors(n).tolist():
+                    if isCircle[c]:
                         circleTmp.append({
-                            "from": n,
-                            "to": c
+                            "from": ids[n],
+                            "to": ids[c]
                         })
-            if "Mutual" in item.nodes[n]["guarType"]:
-                for c in item.neighbors(n):
-                    if item.has_edge(c, n) and item.has_edge(n, c):
+            if isMutual[n]:
+                for e in G.outEdgesOf(n).tolist():
+                    if reciprocal[e]:
+                        c = int(G.dst[e])
                         mutualList["links"].append([
                             {
-                                "from": c,
-                                "to": n
+                                "from": ids[c],
+                                "to": ids[n]
                             },
                             {
-                                "from": n,
-                                "to": c
+                                "from": ids[n],
+                                "to": ids[c]
                             }
                         ])
-        if nx.number_of_nodes(item) > 2:
-            for u, v in item.edges():
+        if len(nodes) > 2:
+            edges = G.componentEdges(Gid)
+            for u, v in zip(G.src[edges].tolist(), G.dst[edges].tolist()):
                 chainTmp.append({
-                    "from": u,
-                    "to": v
+                    "from": ids[u],
+                    "to": ids[v]
                 })
         if chainTmp:
             chainlList["links"].append(chainTmp)
         if circleTmp:
             circleList["links"].append(circleTmp)
-    # for i in range(len(mutualList["links"])):
-    print(len(mutualList["links"]))
-    print(len(circleList["links"][0]))
-    print(len(circleList["links"][1]))
-    print(len(circleList["links"][2]))
+    print("互保关系数量：", len(mutualList["links"]))
+    print("存在担保圈的子图数量：", len(circleList["links"]))
+    print("多节点担保链子图数量：", len(chainlList["links"]))
     with open(r"./answers/guarantee/circle.json", "w") as f:
         json.dump(circleList, f)
     with open(r"./answers/guarantee/mutual.json", "w") as f:
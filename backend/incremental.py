@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import pickle
+import numpy as np
+
+import graphCore
+
+
+def saveState(G, path):
+    """
+    持久化图状态, 供下一次增量更新读取
+    Params:
+        G: CompactGraph
+        path: 状态文件路径
+    """
+    with open(path, "wb") as f:
+        pickle.dump(G, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loadState(path):
+    """
+    读取持久化的图状态
+    Params:
+        path: 状态文件路径
+    Returns:
+        G: CompactGraph
+    """
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def copyIndex(index):
+    """
+    复制节点驻留表, 使增量中新出现的Id不会写入旧图的驻留表
+    """
+    new = graphCore.NodeIndex()
+    new.ids = list(index.ids)
+    new.codes = dict(index.codes)
+    return new
+
+
+def applyDelta(G, srcIds, dstIds, remove, edgeAttr, codeAttrs=()):
+    """
+    将一批增删的边应用到图上, 只重新切分受影响的子图
+    同一条边在增量中多次出现时以最后一条记录为准, 新增已存在的边时只更新其属性, 边的顺序不变
+    受影响的子图为增量中各条边的端点原本所在的子图, 将其节点连同新出现的节点放入并查集,
+    按更新后的边重新合并, 其余子图原样保留
+    重新切分得到的子图优先沿用其中节点原本所在子图的最小编号, 编号已被占用时分配新编号,
+    不再有节点的编号保留为空子图, 使未受影响的子图在导出文件中的位置保持不变
+    删边后不再有邻边的节点从图中移除
+    Params:
+        G: CompactGraph
+        srcIds, dstIds: 增量中各条记录两端的节点Id
+        remove: 布尔数组, 为True的记录表示删除该边
+        edgeAttr: 各条记录的边属性数组字典, 删除记录对应的值不会被使用
+        codeAttrs: 取值为节点编号的节点属性名, 按重新编号后的节点映射, 指向已移除节点时以及新节点的值为-1
+    Returns:
+        H: 更新后的CompactGraph, 节点属性沿用G中的值, 新节点的属性为0
+        changed: 受影响的子图编号数组, 包括已变为空子图的编号
+    """
+    index = copyIndex(G.index)
+    codes = index.encode(np.concatenate([np.asarray(srcIds, dtype=object), np.asarray(dstIds, dtype=object)]))
+    n = len(index)
+    du, dv = np.split(codes, 2)
+    remove = np.asarray(remove, dtype=bool)
+    # 每条边只保留增量中的最后一条记录
+    deltaKeys = du.astype(np.int64) * n + dv
+    _, idx = np.unique(deltaKeys[::-1], return_index=True)
+    last = len(deltaKeys) - 1 - idx
+    deltaKeys, du, dv, remove = deltaKeys[last], du[last], dv[last], remove[last]
+    # 删除的边从边表中去掉, 已存在的边更新属性, 其余新增的边追加到末尾
+    keys = G.src.astype(np.int64) * n + G.dst
+    keep = ~np.isin(keys, deltaKeys[remove])
+    src, dst = G.src[keep], G.dst[keep]
+    attr = {k: v[keep] for k, v in G.edgeAttr.items()}
+    keys = keys[keep]
+    add = last[~remove]
+    addKeys = deltaKeys[~remove]
+    order = np.argsort(keys)
+    pos = np.searchsorted(keys, addKeys, sorter=order)
+    found = pos < len(keys)
+    found[found] = keys[order[pos[found]]] == addKeys[found]
+    for k in attr:
+        # 增量中的值可能不能用原列的类型表示, 如整数金额列遇到小数, 取两者的公共类型
+        values = np.asarray(edgeAttr[k])
+        attr[k] = attr[k].astype(np.result_type(attr[k], values), copy=False)
+        attr[k][order[pos[found]]] = values[add[found]]
+        attr[k] = np.concatenate([attr[k], values[add[~found]]])
+    src = np.concatenate([src, du[~remove][~found]]).astype(np.int32)
+    dst = np.concatenate([dst, dv[~remove][~found]]).astype(np.int32)
+
+    # 受影响的区域: 增量端点原本所在子图的全部节点, 加上新出现的节点
+    oldComp = np.full(n, -1, dtype=np.int64)
+    oldComp[:G.n] = G.comp
+    touched = np.unique(np.concatenate([du, dv]))
+    changedOld = np.unique(oldComp[touched[touched < G.n]])
+    region = np.isin(oldComp, changedOld) | (oldComp < 0)
+    alive = np.zeros(n, dtype=bool)
+    alive[src] = alive[dst] = True
+    inRegion = region[src]
+    uf = graphCore.UnionFind(n)
+    uf.union(src[inRegion], dst[inRegion])
+    nodes = np.nonzero(region & alive)[0]
+    roots = uf.find(nodes)
+    # 按根分组, 每组沿用组内最小的旧编号, 已被占用或没有旧编号时分配新编号
+    comp = oldComp.copy()
+    nComp = G.nComp
+    used = set()
+    # 组内节点按旧编号升序排列, 新节点的旧编号视为无穷大排在最后
+    rank = np.where(oldComp[nodes] < 0, np.iinfo(np.int64).max, oldComp[nodes])
+    groupOrder = np.lexsort((rank, roots))
+    _, starts = np.unique(roots[groupOrder], return_index=True)
+    groups = np.split(nodes[groupOrder], starts[1:])
+    candidates = rank[groupOrder][starts]
+    for i in np.argsort(candidates, kind="stable").tolist():
+        label = int(oldComp[groups[i][0]])
+        if label < 0 or label in used:
+            label = nComp
+            nComp += 1
+        used.add(label)
+        comp[groups[i]] = label
+    changed = np.union1d(changedOld, np.asarray(sorted(used), dtype=np.int64)).astype(np.int64)
+
+    # 移除孤立节点, 其余节点按原顺序重新编号
+    newCode = np.cumsum(alive) - 1
+    compact = graphCore.NodeIndex()
+    compact.ids = [i for i, a in zip(index.ids, alive.tolist()) if a]
+    compact.codes = {i: c for c, i in enumerate(compact.ids)}
+    nodeAttr = dict()
+    for k, v in G.nodeAttr.items():
+        full = np.full(n, -1 if k in codeAttrs else 0, dtype=v.dtype)
+        full[:G.n] = v
+        nodeAttr[k] = full[alive]
+    for k in codeAttrs:
+        if k not in nodeAttr:
+            continue
+        target = nodeAttr[k]
+        valid = np.nonzero(target >= 0)[0]
+        t = target[valid]
+        target[valid] = np.where(alive[t], newCode[t], -1)
+    H = graphCore.CompactGraph(
+        compact,
+        newCode[src],
+        newCode[dst],
+        nodeAttr=nodeAttr,
+        edgeAttr=attr,
+        comp=comp[alive],
+        nComp=nComp,
+    )
+    print("增量记录数：", len(last), "受影响的子图数：", len(changed))
+    print("----------增量更新完成----------")
+    return H, changed
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+import os
+import numpy as np
+
+import componentCache
+import parallel
+
+# 力导向迭代次数
+ITERATIONS = 50
+# 节点数超过该值的子图, 斥力只对随机抽取的这么多个节点计算, 再按比例放大, 迭代次数按节点数成比例减少
+SAMPLE_NODES = 1000
+# 迭代次数的下限
+MIN_ITERATIONS = 10
+# 节点数超过该值的子图不做力导向布局, 按随机顺序排在向日葵螺旋上, 耗时与节点数成正比
+MAX_LAYOUT_NODES = 5000
+# 布局代码的摘要, 作为结构哈希的前缀, 每个进程首次使用时计算
+codeSalt = None
+# 计算斥力时每次处理的行数, 限制成对距离矩阵的内存
+BLOCK_ROWS = 512
+# 理想边长对应的像素数
+LAYOUT_SCALE = 30.0
+# 节点数不超过该值的子图不做迭代, 直接按闭式给出布局
+CLOSED_FORM_NODES = 3
+# 节点数不超过该值的子图补齐到同一节点数后成批迭代, 更大的子图逐个计算
+BATCH_MAX_NODES = 200
+# 一批子图补齐后的节点对数上限, 限制成对距离数组的内存
+BATCH_PAIRS = 1000000
+
+
+def structureHash(G, c):
+    """
+    子图结构的哈希值, 由节点数和按子图内序号表示的边列表决定, 与节点Id和属性无关
+    以本模块的源码为前缀, 布局算法或参数修改后缓存中的旧坐标不再命中
+    Params:
+        G: CompactGraph
+        c: 子图编号
+    Returns:
+        key: 十六进制哈希字符串
+    """
+    global codeSalt
+    if codeSalt is None:
+        codeSalt = componentCache.funcSalt(layoutOfSubG)
+    return componentCache.componentHash(G, c, salt=codeSalt)
+
+
+def iterationsOf(k):
+    """
+    节点数为k的子图的力导向迭代次数, 抽样计算斥力后每步耗时与k成正比, 总耗时不超过SAMPLE_NODES个节点时的水平
+    """
+    if k <= SAMPLE_NODES:
+        return ITERATIONS
+    return max(ITERATIONS * SAMPLE_NODES // k, MIN_ITERATIONS)
+
+
+def spiralLayout(k, seed=0):
+    """
+    大子图的粗略布局: 节点按随机顺序依次排在向日葵螺旋上, 相邻节点间距约为理想边长
+    Params:
+        k: 节点数
+        seed: 排列顺序的随机种子
+    Returns:
+        pos: k×2的坐标数组, 以理想边长为单位, 中心在原点
+    """
+    order = np.random.default_rng(seed).permutation(k)
+    r = np.sqrt(order + 0.5)
+    theta = order * np.pi * (3 - np.sqrt(5))
+    return np.stack([r * np.cos(theta), r * np.sin(theta)], axis=1)
+
+
+def closedFormLayout(k, u, v):
+    """
+    节点数不超过CLOSED_FORM_NODES的子图的布局: 双节点沿水平方向相距一个理想边长;
+    三个节点两两相连时排成边长为1的正三角形, 否则排成一条直线, 度数为2的节点居中
+    Params:
+        k: 节点数
+        u, v: 按子图内序号表示的边的两端
+    Returns:
+        pos: k×2的坐标数组, 以理想边长为单位, 中心在原点
+    """
+    if k <= 1:
+        return np.zeros((k, 2))
+    if k == 2:
+        return np.array([[-0.5, 0.0], [0.5, 0.0]])
+    pairs = {(min(a, b), max(a, b)) for a, b in zip(u.tolist(), v.tolist()) if a != b}
+    if len(pairs) == 3:
+        h = np.sqrt(3) / 2
+        return np.array([[-0.5, -h / 3], [0.5, -h / 3], [0.0, 2 * h / 3]])
+    center = int(np.argmax(np.bincount(np.array(sorted(pairs)).ravel(), minlength=3)))
+    pos = np.zeros((3, 2))
+    pos[[i for i in range(3) if i != center], 0] = [-1.0, 1.0]
+    return pos
+
+
+def batchForceLayout(comps, iterations=ITERATIONS):
+    """
+    多个子图同时做Fruchterman-Reingold迭代: 各子图补齐到相同的节点数后堆叠为三维数组,
+    斥力只在同一子图的节点之间计算, 每个子图的温度按自身节点数冷却, 结果与单独计算时一致
+    Params:
+        comps: 子图列表, 元素为(k, u, v, seed), 含义同forceLayout
+        iterations: 迭代次数
+    Returns:
+        layouts: 与comps一一对应的k×2坐标数组, 以理想边长为单位, 中心在原点
+    """
+    sizes = np.array([k for k, _, _, _ in comps], dtype=np.int64)
+    B, K = len(comps), int(sizes.max())
+    pos = np.zeros((B, K, 2))
+    for b, (k, _, _, seed) in enumerate(comps):
+        pos[b, :k] = np.random.default_rng(seed).uniform(-1, 1, (k, 2)) * np.sqrt(k)
+    valid = np.arange(K)[None, :] < sizes[:, None]
+    mask = valid[:, :, None] & valid[:, None, :]
+    # 各子图的边换算为展平后的节点序号
+    u = np.concatenate([b * K + np.asarray(u, dtype=np.int64) for b, (_, u, _, _) in enumerate(comps)])
+    v = np.concatenate([b * K + np.asarray(v, dtype=np.int64) for b, (_, _, v, _) in enumerate(comps)])
+    flat = pos.reshape(-1, 2)
+    t0 = np.sqrt(sizes) / 10
+    t = t0.copy()
+    for _ in range(iterations):
+        # 斥力: 同一子图内每对节点之间为1/d, 两个坐标分量分开计算, 避免四维的临时数组
+        dx = pos[:, :, None, 0] - pos[:, None, :, 0]
+        dy = pos[:, :, None, 1] - pos[:, None, :, 1]
+        inv = dx * dx
+        inv += dy * dy
+        np.maximum(inv, 1e-4, out=inv)
+        np.divide(mask, inv, out=inv)
+        disp = np.stack([np.einsum("bij,bij->bi", dx, inv), np.einsum("bij,bij->bi", dy, inv)], axis=2)
+        # 引力: 沿边为d^2
+        delta = flat[u] - flat[v]
+        f = delta * np.sqrt(np.einsum("ij,ij->i", delta, delta))[:, None]
+        dispFlat = disp.reshape(-1, 2)
+        np.add.at(dispFlat, u, -f)
+        np.add.at(dispFlat, v, f)
+        # 每步位移不超过当前温度, 温度线性冷却
+        length = np.maximum(np.sqrt(np.einsum("bij,bij->bi", disp, disp)), 1e-9)
+        pos += disp * (np.minimum(length, t[:, None]) / length)[:, :, None]
+        t -= t0 / iterations
+    return [pos[b, :k] - pos[b, :k].mean(axis=0) for b, k in enumerate(sizes.tolist())]
+
+
+def forceLayout(k, u, v, seed=0, iterations=ITERATIONS):
+    """
+    Fruchterman-Reingold力导向布局, 斥力和引力均以NumPy数组整体计算
+    节点数不超过SAMPLE_NODES时与batchForceLayout单独计算一个子图相同
+    Params:
+        k: 节点数
+        u, v: 按子图内序号表示的边的两端
+        seed: 初始位置的随机种子
+        iterations: 迭代次数
+    Returns:
+        pos: k×2的坐标数组, 以理想边长为单位, 中心在原点
+    """
+    if k <= 1:
+        return np.zeros((k, 2))
+    if k <= SAMPLE_NODES:
+        return batchForceLayout([(k, u, v, seed)], iterations)[0]
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-1, 1, (k, 2)) * np.sqrt(k)
+    t = np.sqrt(k) / 10
+    for _ in range(iterations):
+        # 斥力: 对随机抽取的SAMPLE_NODES个节点计算1/d, 再按比例放大
+        other = pos[rng.choice(k, SAMPLE_NODES, replace=False)]
+        scale = k / SAMPLE_NODES
+        disp = np.empty_like(pos)
+        for start in range(0, k, BLOCK_ROWS):
+            rows = slice(start, start + BLOCK_ROWS)
+            dx = pos[rows, None, 0] - other[None, :, 0]
+            dy = pos[rows, None, 1] - other[None, :, 1]
+            inv = dx * dx
+            inv += dy * dy
+            np.maximum(inv, 1e-4, out=inv)
+            np.divide(scale, inv, out=inv)
+            disp[rows, 0] = np.einsum("ij,ij->i", dx, inv)
+            disp[rows, 1] = np.einsum("ij,ij->i", dy, inv)
+        # 引力: 沿边为d^2
+        delta = pos[u] - pos[v]
+        f = delta * np.sqrt(np.einsum("ij,ij->i", delta, delta))[:, None]
+        np.add.at(disp, u, -f)
+        np.add.at(disp, v, f)
+        # 每步位移不超过当前温度, 温度线性冷却
+        length = np.maximum(np.sqrt(np.einsum("ij,ij->i", disp, disp)), 1e-9)
+        pos += disp * (np.minimum(length, t) / length)[:, None]
+        t -= np.sqrt(k) / 10 / iterations
+    return pos - pos.mean(axis=0)
+
+
+def subGOf(G, c):
+    """
+    布局所需的子图结构
+    Returns:
+        (k, u, v, seed): 节点数、按子图内序号表示的边的两端, 以及由结构哈希得到的随机种子
+    """
+    nodes = G.componentNodes(c)
+    edges = G.componentEdges(c)
+    u = np.searchsorted(nodes, G.src[edges])
+    v = np.searchsorted(nodes, G.dst[edges])
+    # 以结构哈希为种子, 相同结构的子图得到相同的布局
+    return len(nodes), u, v, int(structureHash(G, c)[:8], 16)
+
+
+def layoutOfSubG(G, c):
+    """
+    计算单个子图的布局, 节点数不超过CLOSED_FORM_NODES时为closedFormLayout, 超过MAX_LAYOUT_NODES时退化为spiralLayout
+    Params:
+        G: CompactGraph
+        c: 子图编号
+    Returns:
+        pos: 与子图节点顺序一致的k×2坐标数组, 单位为像素
+    """
+    k, u, v, seed = subGOf(G, c)
+    if k <= CLOSED_FORM_NODES:
+        pos = closedFormLayout(k, u, v)
+    elif k > MAX_LAYOUT_NODES:
+        pos = spiralLayout(k, seed)
+    else:
+        pos = forceLayout(k, u, v, seed, iterationsOf(k))
+    return (pos * LAYOUT_SCALE).astype(np.float32)
+
+
+def batchLayouts(G, comps):
+    """
+    成批计算节点数在(CLOSED_FORM_NODES, BATCH_MAX_NODES]之间的子图的布局, 结果与layoutOfSubG一致
+    子图按节点数升序装批, 一批内的最大节点数不超过最小节点数的2倍, 且补齐后的节点对数不超过BATCH_PAIRS
+    Params:
+        G: CompactGraph
+        comps: 子图编号列表
+    Returns:
+        layouts: 与comps一一对应的坐标数组, 单位为像素
+    """
+    sizes = G.componentSize()
+    order = sorted(range(len(comps)), key=lambda i: sizes[comps[i]])
+    layouts = [None] * len(comps)
+    batch = list()
+
+    def flush():
+        for i, pos in zip(batch, batchForceLayout([subGOf(G, comps[i]) for i in batch])):
+            layouts[i] = (pos * LAYOUT_SCALE).astype(np.float32)
+        batch.clear()
+
+    for i in order:
+        k = int(sizes[comps[i]])
+        if batch and (k > 2 * sizes[comps[batch[0]]] or (len(batch) + 1) * k * k > BATCH_PAIRS):
+            flush()
+        batch.append(i)
+    if batch:
+        flush()
+    return layouts
+
+
+def loadCache(path):
+    """
+    读取布局缓存, 文件不存在时返回空缓存
+    """
+    if path is None or not os.path.exists(path):
+        return dict()
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def computeLayout(G, workers=1, cachePath=None, comps=None):
+    """
+    为各个子图预计算节点坐标, 写入G.nodeAttr的x和y
+    子图按结构哈希缓存, 结构未变的子图直接复用缓存中的坐标;
+    其余子图中, 小子图按闭式布局, 中等子图成批迭代, 节点数超过BATCH_MAX_NODES的子图并行逐个计算
+    Params:
+        G: CompactGraph
+        workers: 并行计算的进程数
+        cachePath: 布局缓存文件(.npz), 为None时不缓存
+        comps: 只重新计算这些子图的坐标, 其余子图沿用G中已有的坐标, 如增量更新后受影响的子图;
+            为None或G中尚无坐标时计算全部子图
+    Outputs:
+        G: 加入节点坐标后的图
+    """
+    if comps is None or "x" not in G.nodeAttr:
+        comps = range(G.nComp)
+        x, y = np.zeros(G.n, dtype=np.float32), np.zeros(G.n, dtype=np.float32)
+    else:
+        x, y = G.nodeAttr["x"].astype(np.float32), G.nodeAttr["y"].astype(np.float32)
+    cache = loadCache(cachePath)
+    keys = {c: structureHash(G, c) for c in np.asarray(comps, dtype=np.int64).tolist()}
+    # 同一结构只计算一次, 分别统计命中缓存的子图和与本次已计算的结构相同的子图
+    missing = dict()
+    hits, deduped = 0, 0
+    for c, key in keys.items():
+        if key in cache:
+            hits += 1
+        elif key in missing:
+            deduped += 1
+        else:
+            missing[key] = c
+    sizes = G.componentSize()
+    closed = [c for c in missing.values() if sizes[c] <= CLOSED_FORM_NODES]
+    batched = [c for c in missing.values() if CLOSED_FORM_NODES < sizes[c] <= BATCH_MAX_NODES]
+    large = [c for c in missing.values() if sizes[c] > BATCH_MAX_NODES]
+    for c in closed:
+        cache[keys[c]] = layoutOfSubG(G, c)
+    for c, pos in zip(batched, batchLayouts(G, batched)):
+        cache[keys[c]] = pos
+    for c, pos in zip(large, parallel.mapComponents(layoutOfSubG, G, large, workers)):
+        cache[keys[c]] = pos
+    for c, key in keys.items():
+        nodes = G.componentNodes(c)
+        x[nodes], y[nodes] = cache[key][:, 0], cache[key][:, 1]
+    G.nodeAttr["x"], G.nodeAttr["y"] = x, y
+    if cachePath is not None and missing:
+        np.savez(cachePath, **cache)
+    print("布局缓存命中子图数：", hits, "复用本次计算结果的子图数：", deduped, "新计算的子图结构数：", len(missing))
+    print("----------子图布局计算完成----------")
+    return G
+
+
+def attachPositions(G, nodes, records):
+    """
+    将坐标写入导出的节点记录, 未计算布局时不做任何事
+    Params:
+        G: CompactGraph
+        nodes: 节点编号数组, 与records一一对应
+        records: 导出的节点记录列表
+    """
+    if "x" not in G.nodeAttr:
+        return
+    for rec, x, y in zip(records, G.nodeAttr["x"][nodes].tolist(), G.nodeAttr["y"][nodes].tolist()):
+        rec["x"], rec["y"] = round(x, 2), round(y, 2)
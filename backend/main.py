@@ -1,25 +1,123 @@
-import control
-import guarantee
-import moneyCollection
+"""
+按配置执行三张表的处理流水线
+用法(在项目根目录下执行):
+    python backend/main.py
+    python backend/main.py --tables guarantee --stages graphs answers
+    python backend/main.py --stages graphs --skip layout
+    python backend/main.py --config pipeline.json --force
+    python backend/main.py --tables guarantee --update ./backend/res/guarantee_delta.csv
+配置文件为JSON, 键与defaultConfig一致, tables中只需写出要覆盖的项
+各阶段见pipeline.PIPELINES: load, analyze, layout, graphs, answers, 控制人表另有ownership,
+选中某个阶段时其上游阶段一并执行; layout为可选阶段, 跳过时导出的节点记录不含坐标
+--update以上次运行保存的analyze检查点为状态应用当日的增量表格, 只重新分析和布局受影响的子图并增量导出,
+见pipeline.runUpdate, 控制人表和担保关系表可用
+"""
+import os
+import json
+import argparse
 
-if __name__ == "__main__":
-    # 控制人表
-    controlG = control.getInitControlG("./backend/res/control.csv")
-    controlRootG = control.getRootOfControlG(controlG)
-    # control.graphs2json(controlRootG)
-    control.ansJson(controlRootG)
-
-    # 担保关系表
-    # guaranteeG = guarantee.getInitGuaranteeG("./backend/res/guarantee.csv")
-    # guaranteeRiskG = guarantee.markRiskOfGuaranteeG(guaranteeG)
-    # guarantee.riskQuantification(guaranteeRiskG)
-    # guarantee.graphs2json(guaranteeRiskG)
-    # guarantee.ansJson(guaranteeRiskG)
-
-    # 资金归集表
-    # moneyCollectionCut = moneyCollection.getInitmoneyCollectionG("./backend/res/moneyCollection.csv")
-    # se, seNodes = moneyCollection.findShellEnterprise(moneyCollectionCut)
-    # moneyCollection.getNetIncome(moneyCollectionCut)
-    # moneyCollection.graphs2json(moneyCollectionCut, se, seNodes)
-    # moneyCollection.ansJson(seNodes)
+import pipeline
+
+# 默认配置, 路径均相对于项目根目录
+defaultConfig = {
+    # 各阶段并行处理子图的进程数
+    "workers": 1,
+    # 跳过的可选阶段
+    "skip": [],
+    # 阶段指纹、检查点和运行报告的目录
+    "state": "./backend/res/pipeline",
+    # 各阶段的耗时、内存和计数指标, 以.prom结尾时写出Prometheus文本格式, 为null时不记录
+    "metrics": "./backend/res/metrics.jsonl",
+    "tables": {
+        "control": {
+            "input": "./backend/res/control.csv",
+            "output": ".",
+            "stages": ["answers", "ownership"],
+            # 综合持股比例不低于该值的股东视为控股股东
+            "threshold": 0.5,
+            "snapshot": "./backend/res/snapshot/control",
+            "cachePath": "./backend/res/component_cache_control.pkl",
+            "layoutCache": "./backend/res/layout_control.npz",
+        },
+        "guarantee": {
+            "input": "./backend/res/guarantee.csv",
+            "output": ".",
+            "stages": ["answers"],
+            "snapshot": "./backend/res/snapshot/guarantee",
+            "cachePath": "./backend/res/component_cache_guarantee.pkl",
+            "layoutCache": "./backend/res/layout_guarantee.npz",
+        },
+        "moneyCollection": {
+            "input": "./backend/res/moneyCollection.csv",
+            "output": ".",
+            "stages": ["answers"],
+            "snapshot": "./backend/res/snapshot/moneyCollection",
+            "cachePath": "./backend/res/component_cache_moneyCollection.pkl",
+            "layoutCache": "./backend/res/layout_moneyCollection.npz",
+        },
+    },
+}
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="执行控制人、担保关系和资金归集表的处理流水线")
+    parser.add_argument("--config", help="JSON配置文件, 覆盖默认配置")
+    parser.add_argument("--tables", nargs="+", choices=sorted(pipeline.PIPELINES), help="只执行这些表")
+    parser.add_argument("--stages", nargs="+", help="要产出的阶段, 如graphs answers")
+    parser.add_argument("--input", help="输入表格, 仅在只执行一张表时可用")
+    parser.add_argument("--output", help="导出文件的根目录")
+    parser.add_argument("--workers", type=int, help="各阶段并行处理子图的进程数")
+    parser.add_argument("--skip", nargs="+", help="跳过这些可选阶段, 如layout, 下游阶段直接使用其上游阶段的结果")
+    parser.add_argument("--update", help="增量表格, 应用到上次运行的检查点并增量导出, 仅在只执行一张表时可用")
+    parser.add_argument("--force", action="store_true", help="忽略指纹, 重新执行全部选中的阶段")
+    parser.add_argument("--serial", action="store_true", help="依次执行各条流水线")
+    return parser.parse_args()
 
+
+def loadConfig(args):
+    """
+    合并默认配置、配置文件和命令行参数, 得到每张表的完整配置, 路径均转为绝对路径
+    Returns:
+        confs: 表名到该表配置的字典, 输入表格不存在的表不包含在内
+        statePath: 状态目录
+    """
+    config = json.loads(json.dumps(defaultConfig))
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            override = json.load(f)
+        for table, conf in override.pop("tables", dict()).items():
+            config["tables"].setdefault(table, dict()).update(conf)
+        config.update(override)
+    tables = args.tables or list(config["tables"])
+    if args.input and len(tables) != 1:
+        raise SystemExit("--input只能与单张表一起使用")
+    if args.update and len(tables) != 1:
+        raise SystemExit("--update只能与单张表一起使用")
+    confs = dict()
+    for table in tables:
+        conf = dict(config["tables"][table])
+        conf["input"] = args.input or conf["input"]
+        conf["output"] = args.output or conf["output"]
+        conf["stages"] = args.stages or conf["stages"]
+        conf["workers"] = args.workers or conf.get("workers", config["workers"])
+        conf["skip"] = args.skip or conf.get("skip", config["skip"])
+        conf["update"] = args.update
+        conf["force"] = args.force
+        conf["state"] = config["state"]
+        conf["metrics"] = config["metrics"]
+        for k in ("input", "output", "state", "snapshot", "cachePath", "layoutCache", "metrics", "update"):
+            conf[k] = os.path.abspath(conf[k]) if conf.get(k) else None
+        if not os.path.exists(conf["input"]):
+            print("输入表格不存在, 跳过", table, "：", conf["input"])
+            continue
+        confs[table] = conf
+    return confs, os.path.abspath(config["state"])
+
+
+if __name__ == "__main__":
+    args = parseArgs()
+    confs, statePath = loadConfig(args)
+    summary = pipeline.run(confs, parallel=not args.serial)
+    os.makedirs(statePath, exist_ok=True)
+    with open(os.path.join(statePath, "report.json"), "w") as f:
+        json.dump(summary, f, indent=2)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+流水线各阶段的耗时、内存和计数指标
+用stage装饰各阶段的函数, 开启后每个阶段结束时输出一条记录, 未开启时装饰器只多一次判断
+"""
+import os
+import json
+import time
+import tracemalloc
+import functools
+
+import graphCore
+
+try:
+    import resource
+except ImportError:
+    # Windows下没有resource模块, 不统计进程的RSS峰值
+    resource = None
+
+# 输出目标, 为None时不记录任何指标
+sink = None
+# 是否用tracemalloc统计Python分配的峰值内存
+useTracemalloc = False
+# 正在执行的阶段栈, 嵌套的阶段各自输出一条记录
+frames = list()
+# Prometheus格式下各阶段最近一次的记录, 每次整体重写文件
+latest = dict()
+
+
+def enable(path, fmt=None, memory=False):
+    """
+    开启指标记录
+    Params:
+        path: 输出文件
+        fmt: "jsonl"为每个阶段追加一行JSON, "prom"为Prometheus文本格式, 默认按扩展名.prom判断
+        memory: 是否用tracemalloc统计峰值内存, 开启后Python层的计算会明显变慢
+    """
+    global sink, useTracemalloc
+    sink = {"path": path, "fmt": fmt or ("prom" if path.endswith(".prom") else "jsonl")}
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not memory and useTracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    useTracemalloc = memory
+
+
+def disable():
+    """
+    关闭指标记录
+    """
+    global sink, useTracemalloc
+    if useTracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    sink, useTracemalloc = None, False
+    latest.clear()
+
+
+def enabled():
+    """
+    是否正在记录指标, 计数本身需要额外计算时先用它判断
+    """
+    return sink is not None
+
+
+def count(**counts):
+    """
+    为当前阶段补充计数, 如匹配数、受影响的子图数, 未开启时直接返回
+    """
+    if sink is None or not frames:
+        return
+    frames[-1]["counts"].update({k: int(v) for k, v in counts.items()})
+
+
+def graphOf(args, ret):
+    """
+    阶段处理的图: 优先取返回值, 返回元组时从后往前取, 否则取第一个图参数
+    """
+    candidates = list(reversed(ret)) if isinstance(ret, tuple) else [ret]
+    for x in candidates + list(args):
+        if isinstance(x, graphCore.CompactGraph):
+            return x
+    return None
+
+
+def stage(func):
+    """
+    记录阶段的墙钟时间、CPU时间、峰值内存以及图的节点数、边数和子图数
+    """
+    name = func.__module__ + "." + func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if sink is None:
+            return func(*args, **kwargs)
+        frame = {"name": name, "counts": dict(), "peak": 0}
+        if useTracemalloc:
+            # 外层阶段的峰值先记下, 再为本阶段重新统计
+            if frames:
+                frames[-1]["peak"] = max(frames[-1]["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        frames.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            ret = func(*args, **kwargs)
+        finally:
+            frames.pop()
+        record = {
+            "stage": name,
+            "parent": frames[-1]["name"] if frames else None,
+            "timestamp": time.time(),
+            "wallSeconds": time.perf_counter() - wall,
+            "cpuSeconds": time.process_time() - cpu,
+        }
+        if useTracemalloc:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            record["peakBytes"] = peak
+            if frames:
+                frames[-1]["peak"] = max(frames[-1]["peak"], peak)
+        if resource is not None:
+            # Linux下ru_maxrss以KB为单位, 为进程启动以来的峰值
+            record["maxRssBytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        counts = dict()
+        G = graphOf(args, ret)
+        if G is not None:
+            counts = {"nodes": G.n, "edges": G.numberOfEdges(), "components": G.nComp}
+        counts.update(frame["counts"])
+        record["counts"] = counts
+        emit(record)
+        return ret
+
+    return wrapper
+
+
+def emit(record):
+    """
+    写出一条阶段记录
+    """
+    if sink["fmt"] == "jsonl":
+        with open(sink["path"], "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        latest[record["stage"]] = record
+        writeProm(sink["path"])
+
+
+def writeProm(path):
+    """
+    以Prometheus文本格式写出各阶段最近一次的指标, 先写临时文件再替换, 供node_exporter的textfile采集
+    """
+    gauges = [
+        ("pipeline_stage_wall_seconds", "wallSeconds", "阶段的墙钟时间"),
+        ("pipeline_stage_cpu_seconds", "cpuSeconds", "阶段的CPU时间"),
+        ("pipeline_stage_peak_bytes", "peakBytes", "阶段内tracemalloc统计的峰值内存"),
+        ("pipeline_stage_max_rss_bytes", "maxRssBytes", "阶段结束时进程的RSS峰值"),
+        ("pipeline_stage_last_run_timestamp_seconds", "timestamp", "阶段最近一次结束的时间"),
+    ]
+    lines = list()
+    for metric, key, help in gauges:
+        lines.append("# HELP %s %s" % (metric, help))
+        lines.append("# TYPE %s gauge" % metric)
+        for name, record in latest.items():
+            if key in record:
+                lines.append('%s{stage="%s"} %r' % (metric, name, record[key]))
+    lines.append("# HELP pipeline_stage_items 阶段处理的节点、边、子图等的数量")
+    lines.append("# TYPE pipeline_stage_items gauge")
+    for name, record in latest.items():
+        for kind, value in record["counts"].items():
+            lines.append('pipeline_stage_items{stage="%s",kind="%s"} %d' % (name, kind, value))
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmpPath, path)
@@ -1,8 +1,15 @@
 import re
 import json
-import csv
-import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import componentCache
+import graphCore
+import layout
+import metrics
+import shardPacker
+import snapshot
+import subgraphIndex
 
 # 资金归集识别条件
 # txn: transaction, recip: reciprocal
@@ -22,223 +29,279 @@ loan = {
 }
 
 
-def getInitmoneyCollectionG(path):
+@metrics.stage
+def getInitmoneyCollectionG(path, chunksize=500000, snapshotDir=None):
     """
-    读取资金归集的excel表格到DataFrame, 并切分子图
+    分块读取资金归集的csv表格到DataFrame, 并切分子图
+    每块内按列筛选出符合贷款或转账条件的交易, 直接流式加入图中, 内存占用只与块大小有关
     Params:
         path: 含有资金归集数据的csv表格
+        chunksize: 每次读取的行数
+        snapshotDir: 二进制快照目录, 快照由同一份表格和同一版代码构建时直接内存映射快照, 否则解析表格后写出快照
     Returns: 
-        GList: 根据表格数据切分得到的子图集合, 每个元素都是一副子图
+        G: 根据表格数据构建的CompactGraph, 已按连通性切分子图
     """
-    # 由于可能存在两个节点间重复建立交易关系, 故使用MultiDiGraph
-    G = nx.MultiDiGraph()
-    codes = [[], []]
+    if snapshot.isFresh(snapshotDir, path, __file__):
+        return snapshot.load(snapshotDir)
+    # 由于可能存在两个节点间重复建立交易关系, 边不去重
+    index = graphCore.NodeIndex()
+    edgeCols = {k: list() for k in ["src", "dst", "txnAmount", "txnDateTime", "isLoan", "txnCode"]}
+    codes = [set(), set()]
+    # 仅读取用到的列, 列号与原csv一致
+    tag = {
+        "myId": 0,  # 本人账户
+        "txnDateTime": 1,  # 交易日期
+        "txnCode": 4,  # 交易码
+        "isLoan": 6,  # 借贷标志
+        "txnAmount": 7,  # 交易金额
+        "abstract": 21,  # 摘要
+        "recipId": 29,  # 对方账户
+        "status": 33,  # 状态码
+    }
+    # 贷款摘要黑名单预编译为一个正则
+    abstractPattern = re.compile("|".join(re.escape(x) for x in loan["abstract"]))
     # 由于原csv中存在非utf-8字符, 需过滤掉非uft-8字符
-    with open("./backend/res/moneyCollection.csv", encoding='utf-8', errors='ignore') as f:
-        # 给定的识别贷款和转账的条件
-        originData = csv.reader(f)
-        tag = {
-            "myId": 0,  # 本人账户
-            "recipId": 29,  # 对方账户
-            "txnDateTime": 1,  # 交易日期
-            "txnCode": 4,  # 交易码
-            "txnAmount": 7,  # 交易金额
-            "isLoan": 6,  # 借贷标志
-            "status": 33,  # 状态码
-            "abstract": 21  # 摘要
-        }
-        i = 0
-        for line in originData:
-            # 是否读入数据的标志
-            canIn = False
-            # 忽略标题行和Id为空的行
-            if line[tag["myId"]] == '' or line[tag["recipId"]] == '' or i == 0:
-                i += 1
-                continue
-            # 贷款和转账条件筛选            
-            # 转账条件筛选
-            if (
-                int(line[tag["isLoan"]]) == txn["isLoan"] 
-                and line[tag["txnCode"]] in txn["code"]
-                and float(line[tag["txnAmount"]]) >= txn["txnAmountLimit"]
-            ):
-                codes[1].append(line[tag["txnCode"]])
-                canIn = True
-            # 贷款条件筛选
-            elif (
-                not line[tag["status"]] == "R" 
-                and float(line[tag["txnAmount"]]) >= loan["txnAmountLimit"] 
-                and line[tag["txnCode"]] in loan["code"] 
-                and int(line[tag["isLoan"]]) == loan["isLoan"] 
-                and int(line[tag["status"]]) == loan["status"]
-            ):
-                flag = False
-                for item in loan["abstract"]:
-                    if re.search(item, line[tag["abstract"]]):
-                        flag = True
-                        break
-                if flag:
-                    continue
-                codes[0].append(line[tag["txnCode"]])
-                canIn = True
-            if canIn:
-                # 构建初始图G, 将符合条件的节点和边加入G
-                if not G.has_node(line[tag["myId"]]):
-                    if len(line[tag["myId"]]) >= 15:
-                        line[tag["myId"]] = line[tag["myId"]][:-2] + '00'
-                    G.add_node(line[tag["myId"]], netIncome=0, std=0)
-                if not G.has_node(line[tag["recipId"]]):
-                    if len(line[tag["recipId"]]) >= 15:
-                        line[tag["recipId"]] = line[tag["recipId"]][:-2] + '00'
-                    G.add_node(line[tag["recipId"]], netIncome=0, std=0)
-                G.add_edge(
-                    line[tag["myId"]],
-                    line[tag["recipId"]],
-                    txnAmount=float(line[tag["txnAmount"]]),
-                    txnDateTime=int(line[tag["txnDateTime"]]),
-                    isLoan=int(line[tag["isLoan"]]),
-                    txnCode=line[tag["txnCode"]],
-                    width=float(line[tag["txnAmount"]])**0.5 / 1800
-                )                         
-            i += 1
+    # 账户、交易码等按字符串读入, 数值列交给解析器推断类型, 避免逐个字符串转换
+    chunks = pd.read_csv(
+        path,
+        encoding="utf-8",
+        encoding_errors="ignore",
+        usecols=list(tag.values()),
+        dtype={tag[k]: str for k in ["myId", "txnCode", "abstract", "recipId", "status"]},
+        keep_default_na=False,
+        on_bad_lines="skip",
+        chunksize=chunksize,
+    )
+    for chunk in chunks:
+        chunk.columns = list(tag.keys())
+        # 忽略Id为空的行
+        chunk = chunk[(chunk["myId"] != "") & (chunk["recipId"] != "")]
+        isLoan = pd.to_numeric(chunk["isLoan"], errors="coerce")
+        amount = pd.to_numeric(chunk["txnAmount"], errors="coerce")
+        # 转账条件筛选
+        txnMask = (
+            (isLoan == txn["isLoan"])
+            & chunk["txnCode"].isin(txn["code"])
+            & (amount >= txn["txnAmountLimit"])
+        )
+        # 贷款条件筛选, 不满足转账条件时才判断
+        # 先用廉价的列比较缩小候选行, 状态码转换和摘要匹配只作用在候选行上
+        loanMask = (
+            ~txnMask
+            & (chunk["status"] != "R")
+            & (amount >= loan["txnAmountLimit"])
+            & chunk["txnCode"].isin(loan["code"])
+            & (isLoan == loan["isLoan"])
+        )
+        candidate = chunk[loanMask]
+        loanMask[loanMask] = (
+            (pd.to_numeric(candidate["status"], errors="coerce") == loan["status"])
+            & ~candidate["abstract"].str.contains(abstractPattern)
+        )
+        codes[1].update(chunk.loc[txnMask, "txnCode"])
+        codes[0].update(chunk.loc[loanMask, "txnCode"])
+        keep = txnMask | loanMask
+        if not keep.any():
+            continue
+        chunk = chunk[keep]
+        amount = amount[keep]
+        # 账户号长度不小于15位的, 末两位统一置为00
+        for col in ["myId", "recipId"]:
+            longId = chunk[col].str.len() >= 15
+            chunk.loc[longId, col] = chunk.loc[longId, col].str[:-2] + "00"
+        # 将符合条件的边按列暂存, 节点Id按首次出现的顺序编号
+        pair = index.encode(chunk[["myId", "recipId"]].to_numpy().ravel()).reshape(-1, 2)
+        edgeCols["src"].append(pair[:, 0])
+        edgeCols["dst"].append(pair[:, 1])
+        edgeCols["txnAmount"].append(amount.to_numpy(dtype=np.float64))
+        edgeCols["txnDateTime"].append(chunk["txnDateTime"].to_numpy(dtype=np.int64))
+        edgeCols["isLoan"].append(isLoan[keep].to_numpy(dtype=np.int8))
+        edgeCols["txnCode"].append(chunk["txnCode"].to_numpy(dtype=object))
+    edgeCols = {
+        k: np.concatenate(v) if v else np.zeros(0, dtype=object if k == "txnCode" else np.int32)
+        for k, v in edgeCols.items()
+    }
+    # 构建初始图G
+    G = graphCore.CompactGraph(
+        index,
+        edgeCols.pop("src"),
+        edgeCols.pop("dst"),
+        nodeAttr={"netIncome": np.zeros(len(index)), "std": np.zeros(len(index))},
+        edgeAttr=edgeCols,
+    )
     print("----------资金归集表数据读取完成----------")
-    print("符合条件的贷款和转账关系总数：", G.size())
-    print("含有贷款和转账的公司数量：", nx.number_of_nodes(G))
-    codes = [list(set(codes[i])) for i in range(2)]
+    print("符合条件的贷款和转账关系总数：", G.numberOfEdges())
+    print("含有贷款和转账的公司数量：", G.n)
+    codes = [list(codes[i]) for i in range(2)]
     print("符合条件的贷款交易码类型：", codes[0])
     print("符合条件的转账交易码类型：", codes[1])
-    # 切分子图
-    tmp = nx.to_undirected(G)
-    GList = list()
-    for c in nx.connected_components(tmp):
-        GList.append(G.subgraph(c))
     print("----------资金归集子图切分完成----------")
-    return GList
+    if snapshotDir is not None:
+        snapshot.save(G, snapshotDir, path, __file__)
+    return G
 
 
-def getNetIncome(Glist):
+@metrics.stage
+def getNetIncome(G):
     '''
-    计算各个企业的净资金流入
+    计算各个企业的净资金流入, 即贷款流入减去转账流出
+    在边表的起点和终点列上各做一次带权bincount, 再按子图分段求最值完成标准化
     Params:
-        GList: 资金归集子图列表
+        G: 资金归集图
     Outputs:
-        GList: 在原图中加入点的权重
+        G: 在原图中加入点的权重
     '''
-    for subG in Glist:
-        for n in subG.nodes():
-            children = list(subG.neighbors(n))
-            father = list(subG.predecessors(n))
-            netIncome = 0
-            # 贷款流入
-            for f in father:
-                for k1 in subG[f][n]:
-                    netIncome += subG[f][n][k1]["txnAmount"]
-            # 转账流出
-            for c in children:
-                for k2 in subG[n][c]:
-                    netIncome -= subG[n][c][k2]["txnAmount"]
-            subG.nodes[n]["netIncome"] = netIncome
-        # 标准化净资金流入, 用于可视化时的size, 范围为[5, 14]
-        d = [abs(x) 
-            for x in nx.get_node_attributes(subG, "netIncome").values()
-        ]
-        maxNetIncome, minNetIncome = max(d), min(d)
-        if maxNetIncome == minNetIncome:
-            for n in subG.nodes():
-                subG.nodes[n]["std"] = 9
-        else:
-            k = 9/(maxNetIncome - minNetIncome)
-            for n in subG.nodes():
-                subG.nodes[n]["std"] = 5 + k * (
-                        abs(subG.nodes[n]["netIncome"]) - minNetIncome
-                    )
+    amount = G.edgeAttr["txnAmount"]
+    netIncome = (
+        np.bincount(G.dst, weights=amount, minlength=G.n)
+        - np.bincount(G.src, weights=amount, minlength=G.n)
+    )
+    # 标准化净资金流入, 用于可视化时的size, 范围为[5, 14], 子图内全部相等时取9
+    d = np.abs(netIncome)
+    maxNetIncome = graphCore.segmentReduce(np.maximum, d[G.compNodes], G.compPtr)[G.comp]
+    minNetIncome = graphCore.segmentReduce(np.minimum, d[G.compNodes], G.compPtr)[G.comp]
+    same = maxNetIncome == minNetIncome
+    std = np.full(G.n, 9.0)
+    std[~same] = 5 + 9/(maxNetIncome[~same] - minNetIncome[~same]) * (d[~same] - minNetIncome[~same])
+    G.nodeAttr["netIncome"] = netIncome
+    G.nodeAttr["std"] = std
     print("----------净资金流入计算完成----------")
 
 
-def findShellEnterprise(GList):
+def findShellOfSubG(G, c):
+    '''
+    在单个资金归集子图中寻找贷款后5天内转出且金额比例在0.9-1.0之间的三元组
+    中间企业的转账出边按日期排序, 每条贷款入边只需二分查找出[t, t+5]时间窗口内的转账进行比较
+    Params:
+        G: CompactGraph
+        c: 子图编号
+    Returns:
+        matches: 每条贷款入边的最佳匹配, 元素为(贷款边编号, 转账边编号)
+    '''
+    amount = G.edgeAttr["txnAmount"]
+    date = G.edgeAttr["txnDateTime"]
+    isLoan = G.edgeAttr["isLoan"]
+    matches = list()
+    for n in G.componentNodes(c).tolist():
+        # 下游企业, 若出边非转账, 直接跳过
+        outs = G.outEdgesOf(n)
+        outs = outs[isLoan[outs] != loan["isLoan"]]
+        if not len(outs):
+            continue
+        outs = outs[np.argsort(date[outs], kind="stable")]
+        dates = date[outs]
+        # 上游企业, 若入边非贷款, 直接跳过
+        ins = G.inEdgesOf(n)
+        ins = ins[isLoan[ins] != txn["isLoan"]]
+        lo = np.searchsorted(dates, date[ins], side="left")
+        hi = np.searchsorted(dates, date[ins] + 5, side="right")
+        for e, i, j in zip(ins.tolist(), lo.tolist(), hi.tolist()):
+            # 日期相差五天以内, 且金额变化在0.9-1.0范围内, 取比例最大的转账
+            # 比例相同时取加入顺序靠后的一条
+            window = outs[i:j]
+            rate = amount[window] / amount[e]
+            ok = (rate >= 0.9) & (rate <= 1)
+            # 如果找到了匹配到的贷款和转账, 则记录下来
+            if ok.any():
+                window, rate = window[ok], rate[ok]
+                matches.append((e, int(window[rate == rate.max()].max())))
+    return matches
+
+
+def encodeShell(G, c, matches):
+    """
+    将findShellOfSubG的结果转为子图边列表中的序号, 用于缓存
+    """
+    return componentCache.edgesToLocal(G, c, np.asarray(matches, dtype=np.int64).reshape(-1))
+
+
+def decodeShell(G, c, value):
+    """
+    将缓存的边序号还原为findShellOfSubG的结果
+    """
+    edges = componentCache.edgesToGlobal(G, c, value).tolist()
+    return list(zip(edges[0::2], edges[1::2]))
+
+
+def addEdge(se, u, v, **attr):
+    '''
+    向资金归集图加入一条边, 两端不存在时依次加入, 同一对节点间的多条边按加入顺序保存
+    Params:
+        se: 资金归集图, 见findShellEnterprise
+        u, v: 边的两端
+        attr: 边属性
+    '''
+    se.setdefault(u, dict()).setdefault(v, list()).append(attr)
+    se.setdefault(v, dict())
+
+
+@metrics.stage
+def findShellEnterprise(G, workers=1, cache=None):
     '''
     根据资金归集关系找到空壳企业
     Params:
-        GList: 资金归集子图列表
+        G: 资金归集图
+        workers: 并行处理子图的进程数
+        cache: componentCache.ComponentCache, 结构和交易未变的子图直接复用匹配结果
     Returns:
-        se: 企业资金归集图
+        se: 企业资金归集图, 以{u: {v: [边属性, ...]}}表示, 节点和边均按加入的先后顺序排列
         seNodes: 资金归集企业列表
     '''
-    se = nx.MultiDiGraph()
+    se = dict()
     seNodes = [[] for i in range(3)]
     codes = [[], []]
-    for subG in GList:
-        for n in subG.nodes():
-            children = list(subG.neighbors(n))
-            father = list(subG.predecessors(n))
-            if not father or not children:
-                continue
-            # 上游企业
-            for f in father:
-                for k1 in subG[f][n]:
-                    # 若入边非贷款, 直接跳过
-                    if subG[f][n][k1]["isLoan"] == txn["isLoan"]:
-                        continue
-                    # 寻找最匹配的贷款和转账
-                    bestMatchF, bestMatchRate, bestMatchC, bestMatchLoan, bestMatchTxn, bestMatchDate = "", 0.9, "", -1, -1, 0
-                    # 下游企业
-                    for c in children:
-                        for k2 in subG[n][c]:
-                            # 若出边非转账或三元组上任意两个节点相同, 直接跳过
-                            if subG[n][c][k2]["isLoan"] == loan["isLoan"]:
-                                continue
-                            # 日期相差五天, 且金额变化在0.9-1.0范围内
-                            rate = subG[n][c][k2]["txnAmount"] / subG[f][n][k1]["txnAmount"]
-                            if (
-                                subG[n][c][k2]["txnDateTime"] - subG[f][n][k1]["txnDateTime"] <= 5 
-                                and subG[n][c][k2]["txnDateTime"] >= subG[f][n][k1]["txnDateTime"]
-                                and rate >= bestMatchRate
-                                and rate <= 1
-                            ):
-                                bestMatchC, bestMatchRate, bestMatchF = c, rate, f
-                                bestMatchLoan, bestMatchTxn = subG[f][n][k1]["txnAmount"], subG[n][c][k2]["txnAmount"]
-                                bestMatchDate = (subG[f][n][k1]["txnDateTime"], subG[n][c][k2]["txnDateTime"])
-                        # 如果找到了匹配到的贷款和转账, 则修改节点属性, 将其记录到se中
-                    if bestMatchC:
-                        print(
-                            "father: ", bestMatchF, 
-                            "node: ", n, 
-                            "child: ", bestMatchC, "\n"
-                            "贷款交易码：", subG[bestMatchF][n][k1]["txnCode"], 
-                            "转账交易码：", subG[n][bestMatchC][k2]["txnCode"]
-                        )
-                        print(
-                            "rate: ", bestMatchRate, 
-                            "贷款金额: ", bestMatchLoan, 
-                            "转账金额: ", bestMatchTxn, 
-                            "贷款和转账日期: ", bestMatchDate
-                        )
-                        codes[0].append(subG[bestMatchF][n][k1]["txnCode"])
-                        codes[1].append(subG[n][bestMatchC][k2]["txnCode"])
-                        se.add_edge(
-                            bestMatchF, 
-                            n, 
-                            txnAmount=bestMatchLoan, 
-                            isLoan=0, 
-                            txnDateTime=bestMatchDate[0], 
-                            txnCode=subG[bestMatchF][n][k1]["txnCode"], 
-                            width=subG[bestMatchF][n][k1]["width"]
-                        )
-                        se.add_edge(
-                            n, 
-                            bestMatchC, 
-                            txnAmount=bestMatchTxn, 
-                            isLoan=1, 
-                            txnDateTime=bestMatchDate[1], 
-                            txnCode=subG[n][bestMatchC][k2]["txnCode"], 
-                            width=subG[n][bestMatchC][k2]["width"]
-                        )
-                        seNodes[0].append(bestMatchF)
-                        seNodes[1].append(n)
-                        seNodes[2].append(bestMatchC)
-    if (nx.number_of_nodes(se)):
-        print("资金归集三元组关系数量：", se.size() / 2)
-        print("所有处于资金归集三元组中的企业总数", nx.number_of_nodes(se))
+    ids = G.index.ids
+    for matches in componentCache.mapComponents(
+        cache, findShellOfSubG, G, workers=workers,
+        edgeKeys=("txnAmount", "txnDateTime", "isLoan"), encode=encodeShell, decode=decodeShell,
+    ):
+        for e1, e2 in matches:
+            f, n, c = ids[G.src[e1]], ids[G.dst[e1]], ids[G.dst[e2]]
+            loanEdge = {k: v[e1:e1 + 1].tolist()[0] for k, v in G.edgeAttr.items()}
+            txnEdge = {k: v[e2:e2 + 1].tolist()[0] for k, v in G.edgeAttr.items()}
+            print(
+                "father: ", f, 
+                "node: ", n, 
+                "child: ", c, "\n"
+                "贷款交易码：", loanEdge["txnCode"], 
+                "转账交易码：", txnEdge["txnCode"]
+            )
+            print(
+                "rate: ", txnEdge["txnAmount"] / loanEdge["txnAmount"], 
+                "贷款金额: ", loanEdge["txnAmount"], 
+                "转账金额: ", txnEdge["txnAmount"], 
+                "贷款和转账日期: ", (loanEdge["txnDateTime"], txnEdge["txnDateTime"])
+            )
+            codes[0].append(loanEdge["txnCode"])
+            codes[1].append(txnEdge["txnCode"])
+            addEdge(
+                se,
+                f, 
+                n, 
+                txnAmount=loanEdge["txnAmount"], 
+                isLoan=0, 
+                txnDateTime=loanEdge["txnDateTime"], 
+                txnCode=loanEdge["txnCode"], 
+                width=loanEdge["txnAmount"]**0.5 / 1800
+            )
+            addEdge(
+                se,
+                n, 
+                c, 
+                txnAmount=txnEdge["txnAmount"], 
+                isLoan=1, 
+                txnDateTime=txnEdge["txnDateTime"], 
+                txnCode=txnEdge["txnCode"], 
+                width=txnEdge["txnAmount"]**0.5 / 1800
+            )
+            seNodes[0].append(f)
+            seNodes[1].append(n)
+            seNodes[2].append(c)
+    size = sum(len(attrs) for nbrs in se.values() for attrs in nbrs.values())
+    metrics.count(matches=size // 2, shellNodes=len(se))
+    if (len(se)):
+        print("资金归集三元组关系数量：", size / 2)
+        print("所有处于资金归集三元组中的企业总数", len(se))
         seNodes = [list(set(seNodes[i])) for i in range(3)]
         codes = [list(set(codes[i])) for i in range(2)]
         print("筛选后贷款的交易码含有：", codes[0])
@@ -251,61 +314,56 @@ def findShellEnterprise(GList):
     return se, seNodes
 
 
-def graphs2json(GList, se, seNodes):
+@metrics.stage
+def graphs2json(G, se, seNodes):
     '''
     将资金归集的识别结果导出为json
     Params:
+        G: 资金归集图
         se: 按中心企业切分的资金归集识别列表
         seNodes: 中心企业列表
     '''
-    collectionList = {"nodes": [], "links": []}
-    allList = {"nodes": [], "links": []}
+    # 各个json以流的方式写出, 内存中只保留当前子图tmp
+    path = "./frontend/public/res/json/moneyCollection/"
+    # 每个json存储的点不超过1500个
+    allList = shardPacker.ShardPacker(path, "all", 1500)
+    # 每张子图单独打包并建立索引, 供前端按Gid或公司Id按需读取
+    subgraphs = subgraphIndex.SubgraphIndexWriter(path)
     tmp = {"nodes": [], "links": []}
-    i = 0
-    Gid = 0  # 子图编号
-    allCount = 0
-    for item in GList:
+    ids = G.index.ids
+    for Gid in range(G.nComp):  # 子图编号
         tmp["nodes"], tmp["links"] = [], []
         # 初始化子图数据, 先后加点和边
-        for n in item.nodes():
-            if item.nodes[n]["netIncome"] >= 0:
+        nodes = G.componentNodes(Gid)
+        for n, netIncome, std in zip(
+            nodes.tolist(), G.nodeAttr["netIncome"][nodes].tolist(), G.nodeAttr["std"][nodes].tolist()
+        ):
+            if netIncome >= 0:
                 group, c = 3, "pos"
             else:
                 group, c = 4, "neg"
             tmp["nodes"].append(
-                {"group": group, "class": c, "size": item.nodes[n]["std"], "Gid": Gid, "id": n}
+                {"group": group, "class": c, "size": std, "Gid": Gid, "id": ids[n]}
             )
-        for u in item.nodes():
-            for v in list(item.neighbors(u)):
-                for k in item[u][v]:
-                    dateTmp = '2020-09-' + str(item[u][v][k]["txnDateTime"])[-2:] 
-                    tmp["links"].append(
-                        {"source": u, "target": v, "date": dateTmp, "width": item[u][v][k]["width"]}
-                    )
-        allCount += len(tmp["nodes"])
-        # 每个json存储的点不超过1500个
-        if allCount >= 1500:
-            print("第", i, "个json的节点数量：", len(allList["nodes"]))
-            path = "./frontend/public/res/json/moneyCollection/" + "all_" + str(i) + ".json"
-            with open(path, "w") as f:
-                json.dump(allList, f)
-            i += 1
-            allCount = 0
-            allList["nodes"], allList["links"] = [], []
-            allList["nodes"] += tmp["nodes"]
-            allList["links"] += tmp["links"]
-        else:
-            allList["nodes"] += tmp["nodes"]
-            allList["links"] += tmp["links"]
-        Gid += 1
-    # 清空还未存储的点
-    if allList["nodes"]:
-        print("第", i, "个json的节点数量：", len(allList["nodes"]))
-        path = "./frontend/public/res/json/moneyCollection/" + "all_" + str(i) + ".json"
-        with open(path, "w") as f:
-            json.dump(allList, f)
+        layout.attachPositions(G, nodes, tmp["nodes"])
+        edges = G.componentEdges(Gid)
+        for u, v, d, a in zip(
+            G.src[edges].tolist(), G.dst[edges].tolist(),
+            G.edgeAttr["txnDateTime"][edges].tolist(), G.edgeAttr["txnAmount"][edges].tolist(),
+        ):
+            dateTmp = '2020-09-' + str(d)[-2:] 
+            tmp["links"].append(
+                {"source": ids[u], "target": ids[v], "date": dateTmp, "width": a**0.5 / 1800}
+            )
+        allList.add(Gid, tmp)
+        subgraphs.add(Gid, tmp)
+    Gid = G.nComp
+    for i, shard in enumerate(allList.close()["shards"]):
+        print("第", i, "个json的节点数量：", shard["nodes"])
+    subgraphs.close(ids, G.comp)
     # 存储具有资金归集行为的点
-    for n in se.nodes():
+    collectionList = {"nodes": [], "links": []}
+    for n in se:
         group, c = 2, "end"
         if n in seNodes[1]:
             group, c = 1, "mid"
@@ -313,11 +371,11 @@ def graphs2json(GList, se, seNodes):
             group, c = 0, "start"
         collectionList["nodes"].append({"group": group, "class": c, "size": 9, "Gid": Gid, "id": n})
         Gid += 1
-    for u in se.nodes():
-        for v in list(se.neighbors(u)):
-            for k in se[u][v]:
+    for u, nbrs in se.items():
+        for v, attrs in nbrs.items():
+            for attr in attrs:
                 collectionList["links"].append(
-                    {"source": u, "target": v, "width": se[u][v][k]["width"]}
+                    {"source": u, "target": v, "width": attr["width"]}
                 )
     print("存储具有资金归集行为企业信息的json的节点数量：", len(collectionList["nodes"]))
     with open(r"./frontend/public/res/json/moneyCollection/moneyCollection.json", "w") as f:
@@ -325,6 +383,7 @@ def graphs2json(GList, se, seNodes):
     print("----------资金归集json数据导出完成----------")
 
 
+@metrics.stage
 def ansJson(seNodes):
     '''
     将资金归集的识别结果导出为json
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# 每批任务的节点数下限, 大量双节点子图会被打包到同一批中, 减少进程间通信次数
+BATCH_NODES = 5000
+# 子进程中共享的图, 由进程池的initializer设置, 每个子进程只接收一次
+sharedGraph = None
+
+
+def packBatches(sizes, batchNodes=BATCH_NODES):
+    """
+    按子图规模将子图顺序打包成批, 每批的节点数累计达到batchNodes后另起一批
+    规模不小于batchNodes的子图单独成批
+    Params:
+        sizes: 各个子图的节点数
+        batchNodes: 每批的节点数下限
+    Returns:
+        batches: 每批包含的子图下标列表
+    """
+    batches = list()
+    cur, count = list(), 0
+    for i, size in enumerate(sizes):
+        cur.append(i)
+        count += size
+        if count >= batchNodes:
+            batches.append(cur)
+            cur, count = list(), 0
+    if cur:
+        batches.append(cur)
+    return batches
+
+
+def setSharedGraph(G):
+    """
+    进程池的initializer, 在子进程中保存共享的图
+    """
+    global sharedGraph
+    sharedGraph = G
+
+
+def runBatch(func, batch):
+    """
+    在子进程中依次处理一批子图
+    """
+    return [func(sharedGraph, c) for c in batch]
+
+
+def runTask(func, task):
+    """
+    在子进程中执行单个任务
+    """
+    return func(sharedGraph, task)
+
+
+def mapTasks(func, G, tasks, workers=1):
+    """
+    对每个任务执行func(G, task), 返回结果的顺序与tasks一致, 适合一个大子图还需再拆分的处理
+    Params:
+        func: 须为模块级函数且不修改G
+        G: CompactGraph
+        tasks: 任务列表, 每个任务须可序列化
+        workers: 进程数, 为None时使用全部CPU核心
+    Returns:
+        results: 各个任务的处理结果
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    if workers <= 1 or len(tasks) <= 1:
+        return [func(G, task) for task in tasks]
+    with ProcessPoolExecutor(workers, initializer=setSharedGraph, initargs=(G,)) as executor:
+        futures = [executor.submit(runTask, func, task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def mapComponents(func, G, comps=None, workers=1, batchNodes=BATCH_NODES):
+    """
+    对G中的每个子图执行func(G, c), 返回结果的顺序与comps一致
+    workers大于1时在进程池中并行执行, 图在每个子进程启动时传入一次, 任务只传递子图编号
+    Params:
+        func: 处理单个子图的函数, 须为模块级函数且不修改G
+        G: CompactGraph
+        comps: 待处理的子图编号, 默认为全部子图
+        workers: 进程数, 为None时使用全部CPU核心
+        batchNodes: 每批的节点数下限
+    Returns:
+        results: 各个子图的处理结果
+    """
+    comps = list(range(G.nComp)) if comps is None else list(comps)
+    if workers is None:
+        workers = os.cpu_count()
+    if workers <= 1 or len(comps) <= 1:
+        return [func(G, c) for c in comps]
+    sizes = G.componentSize()[comps]
+    batches = packBatches(sizes.tolist(), batchNodes)
+    results = list()
+    with ProcessPoolExecutor(workers, initializer=setSharedGraph, initargs=(G,)) as executor:
+        futures = [
+            executor.submit(runBatch, func, [comps[i] for i in batch])
+            for batch in batches
+        ]
+        for future in futures:
+            results += future.result()
+    return results
@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+"""
+三张表的处理流水线, 每条流水线是由若干阶段组成的有向无环图
+各条流水线在独立的进程中并发执行; 流水线内, 没有后继的导出阶段在依赖就绪后立即fork子进程执行,
+与后续的计算阶段重叠
+每个阶段的指纹由输入表格、所用模块及其传递导入的本项目模块的源码、输出目录和上游阶段的指纹决定,
+指纹未变且声明的输出文件都存在的阶段直接跳过, 其下游阶段需要它的结果时从检查点读取
+可选阶段(如layout)可按配置的skip整个去掉, 其下游阶段直接使用它的上游阶段的结果
+配置了增量表格时不执行流水线, 而是以analyze阶段的检查点为状态做增量更新, 见runUpdate
+"""
+import os
+import sys
+import json
+import time
+import types
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import componentCache
+import control
+import graphCore
+import guarantee
+import incremental
+import layout
+import metrics
+import moneyCollection
+import parallel
+import shardPacker
+import snapshot
+import streamJson
+import subgraphIndex
+
+
+class Stage:
+    """
+    流水线中的一个阶段
+    Params:
+        name: 阶段名
+        func: func(conf, *依赖阶段的结果), 须为模块级函数
+        deps: 依赖的阶段名
+        modules: 影响结果的模块, 其源码以及它们传递导入的本项目模块的源码计入指纹
+        checkpoint: 是否将结果保存为检查点, 供下次运行跳过本阶段时读取
+        params: 影响结果的配置项, 其取值计入指纹
+        outputs: 阶段写出的文件, 相对于输出目录, 任一文件缺失时重新执行本阶段
+        optional: 是否可按配置跳过, 可选阶段只有一个上游阶段, 且结果与上游阶段的结果形式相同
+    """
+
+    def __init__(self, name, func, deps=(), modules=(), checkpoint=False, params=(), outputs=(), optional=False):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.modules = tuple(modules)
+        self.checkpoint = checkpoint
+        self.params = tuple(params)
+        self.outputs = tuple(outputs)
+        self.optional = optional
+
+
+def loadControl(conf):
+    return control.getInitControlG(conf["input"], snapshotDir=conf["snapshot"])
+
+
+def analyzeControl(conf, G):
+    return control.getRootOfControlG(G, conf["workers"], cache=conf["cache"])
+
+
+def loadGuarantee(conf):
+    return guarantee.getInitGuaranteeG(conf["input"], snapshotDir=conf["snapshot"])
+
+
+def analyzeGuarantee(conf, G):
+    guarantee.markRiskOfGuaranteeG(G, conf["workers"], cache=conf["cache"])
+    guarantee.riskQuantification(G)
+    return G
+
+
+def loadMoneyCollection(conf):
+    return moneyCollection.getInitmoneyCollectionG(conf["input"], snapshotDir=conf["snapshot"])
+
+
+def analyzeMoneyCollection(conf, G):
+    se, seNodes = moneyCollection.findShellEnterprise(G, conf["workers"], cache=conf["cache"])
+    moneyCollection.getNetIncome(G)
+    return G, se, seNodes
+
+
+def layoutOf(conf, G):
+    return layout.computeLayout(G, conf["workers"], cachePath=conf["layoutCache"])
+
+
+def layoutMoneyCollection(conf, result):
+    G, se, seNodes = result
+    return layoutOf(conf, G), se, seNodes
+
+
+def graphsControl(conf, G):
+    control.graphs2json(G)
+
+
+def answersControl(conf, G):
+    control.ansJson(G)
+
+
+def ownershipControl(conf, G):
+    control.integratedOwnership(G, conf["threshold"], conf["workers"])
+    control.ownershipJson(G)
+
+
+def graphsGuarantee(conf, G):
+    guarantee.graphs2json(G)
+
+
+def answersGuarantee(conf, G):
+    guarantee.ansJson(G)
+
+
+def graphsMoneyCollection(conf, result):
+    moneyCollection.graphs2json(*result)
+
+
+def answersMoneyCollection(conf, result):
+    moneyCollection.ansJson(result[2])
+
+
+def relayout(conf, H, changed):
+    """
+    增量更新后只重新计算受影响子图的布局; 跳过layout时去掉坐标, 不导出过期的坐标
+    """
+    if "layout" in conf["skip"]:
+        H.nodeAttr.pop("x", None)
+        H.nodeAttr.pop("y", None)
+    else:
+        layout.computeLayout(H, conf["workers"], cachePath=conf["layoutCache"], comps=changed)
+
+
+def updateControl(conf, statePath):
+    G, H, changed = control.updateControlG(statePath, conf["update"], conf["workers"], conf["threshold"])
+    relayout(conf, H, changed)
+    control.updateAnsJson(G, H, changed)
+    return H
+
+
+def updateGuarantee(conf, statePath):
+    G, H, changed = guarantee.updateGuaranteeG(statePath, conf["update"], conf["workers"])
+    relayout(conf, H, changed)
+    guarantee.updateJson(G, H, changed)
+    return H
+
+
+# 前端子图索引的三个文件, 见subgraphIndex.SubgraphIndexWriter
+SUBGRAPH_FILES = ("subgraphs.pack", "subgraphs.gid", "subgraphs.ids")
+CONTROL_JSON = "./frontend/public/res/json/control/"
+MONEY_COLLECTION_JSON = "./frontend/public/res/json/moneyCollection/"
+
+# 各张表的流水线, 阶段按拓扑序排列
+PIPELINES = {
+    "control": [
+        Stage("load", loadControl, modules=(control, graphCore, snapshot)),
+        Stage(
+            "analyze", analyzeControl, ["load"], (control, graphCore, componentCache, parallel), checkpoint=True
+        ),
+        Stage("layout", layoutOf, ["analyze"], (layout, componentCache, parallel), checkpoint=True, optional=True),
+        Stage(
+            "graphs", graphsControl, ["layout"], (control, streamJson, shardPacker, subgraphIndex),
+            outputs=[CONTROL_JSON + f for f in (
+                "control.json", "cross.json", "double_manifest.json", "multi_manifest.json"
+            ) + SUBGRAPH_FILES],
+        ),
+        Stage(
+            "answers", answersControl, ["analyze"], (control,),
+            outputs=["./answers/control/%s.json" % k for k in ("control", "cross", "normal")],
+        ),
+        Stage(
+            "ownership", ownershipControl, ["load"], (control, graphCore, parallel), params=("threshold",),
+            outputs=["./answers/control/ownership.json"],
+        ),
+    ],
+    "guarantee": [
+        Stage("load", loadGuarantee, modules=(guarantee, graphCore, snapshot)),
+        Stage(
+            "analyze", analyzeGuarantee, ["load"], (guarantee, graphCore, componentCache, parallel), checkpoint=True
+        ),
+        Stage("layout", layoutOf, ["analyze"], (layout, componentCache, parallel), checkpoint=True, optional=True),
+        Stage(
+            "graphs", graphsGuarantee, ["layout"], (guarantee, streamJson, shardPacker, subgraphIndex),
+            outputs=sorted(guarantee.listPaths.values()) + [guarantee.jsonPath + "doubleNormal_manifest.json"]
+            + [guarantee.jsonPath + f for f in SUBGRAPH_FILES],
+        ),
+        Stage(
+            "answers", answersGuarantee, ["analyze"], (guarantee,),
+            outputs=["./answers/guarantee/%s.json" % k for k in ("circle", "mutual", "chain")],
+        ),
+    ],
+    "moneyCollection": [
+        Stage("load", loadMoneyCollection, modules=(moneyCollection, graphCore, snapshot)),
+        Stage(
+            "analyze", analyzeMoneyCollection, ["load"], (moneyCollection, graphCore, componentCache, parallel),
+            checkpoint=True,
+        ),
+        Stage(
+            "layout", layoutMoneyCollection, ["analyze"], (layout, componentCache, parallel), checkpoint=True,
+            optional=True,
+        ),
+        Stage(
+            "graphs", graphsMoneyCollection, ["layout"], (moneyCollection, streamJson, shardPacker, subgraphIndex),
+            outputs=[MONEY_COLLECTION_JSON + f for f in ("moneyCollection.json", "all_manifest.json") + SUBGRAPH_FILES],
+        ),
+        Stage(
+            "answers", answersMoneyCollection, ["analyze"], (moneyCollection,),
+            outputs=["./answers/moneyCollection/moneyCollection.json"],
+        ),
+    ],
+}
+
+# 各张表导出文件所在的目录, 相对于输出目录
+OUTPUT_DIRS = {
+    "control": [CONTROL_JSON, "./answers/control/"],
+    "guarantee": [guarantee.jsonPath, "./answers/guarantee/"],
+    "moneyCollection": [MONEY_COLLECTION_JSON, "./answers/moneyCollection/"],
+}
+
+# 支持增量更新的表, 以analyze阶段的检查点为状态, 返回更新后的图
+UPDATES = {
+    "control": updateControl,
+    "guarantee": updateGuarantee,
+}
+
+
+def stagesOf(table, skip=()):
+    """
+    一条流水线实际执行的阶段: 去掉skip中的可选阶段, 其下游阶段改为依赖被跳过阶段的上游阶段
+    Params:
+        table: 表名, 为PIPELINES的键
+        skip: 要跳过的阶段名, 不属于该流水线的名字忽略
+    Returns:
+        stages: 阶段列表, 按拓扑序排列
+    """
+    stages, upstream = list(), dict()
+    for st in PIPELINES[table]:
+        deps = [upstream.get(d, d) for d in st.deps]
+        if st.name in skip:
+            if not st.optional:
+                raise ValueError("%s流水线的%s阶段不能跳过" % (table, st.name))
+            upstream[st.name] = deps[0]
+            continue
+        stages.append(Stage(st.name, st.func, deps, st.modules, st.checkpoint, st.params, st.outputs, st.optional))
+    return stages
+
+
+def fileDigest(path):
+    """
+    文件内容的sha1
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def moduleClosure(modules):
+    """
+    模块及其传递导入的本项目模块, 即与本文件位于同一目录的模块, 按文件路径排序
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    seen, stack = dict(), list(modules)
+    while stack:
+        m = stack.pop()
+        path = os.path.abspath(getattr(m, "__file__", None) or "")
+        if path in seen or os.path.dirname(path) != root:
+            continue
+        seen[path] = m
+        stack += [v for v in vars(m).values() if isinstance(v, types.ModuleType)]
+    return [seen[p] for p in sorted(seen)]
+
+
+def fingerprints(stages, conf):
+    """
+    各个阶段的指纹, 由阶段名、所用模块及其传递导入的本项目模块的源码、输入表格的大小和修改时间、输出目录、
+    配置项以及上游阶段的指纹决定
+    """
+    stat = os.stat(conf["input"])
+    fps = dict()
+    for st in stages:
+        key = {
+            "stage": st.name,
+            "sources": [fileDigest(m.__file__) for m in moduleClosure(st.modules)],
+            "deps": [fps[d] for d in st.deps],
+            "output": conf["output"],
+            "params": [conf[k] for k in st.params],
+        }
+        if not st.deps:
+            key["input"] = [conf["input"], stat.st_size, stat.st_mtime_ns]
+        fps[st.name] = hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+    return fps
+
+
+def runLeaf(stage, conf, args, conn):
+    """
+    在fork出的子进程中执行导出阶段, 通过管道返回耗时
+    """
+    start = time.perf_counter()
+    stage.func(conf, *args)
+    conn.send(time.perf_counter() - start)
+    conn.close()
+
+
+def runPipeline(table, conf):
+    """
+    执行一条流水线, 跳过指纹未变的阶段
+    Params:
+        table: 表名, 为PIPELINES的键
+        conf: 该表的配置, 见main.py中的defaultConfig
+    Returns:
+        report: 各阶段的状态(run, loaded, skipped)、开始和结束时间, 以及依赖关系
+    """
+    stages = stagesOf(table, conf["skip"])
+    byName = {st.name: st for st in stages}
+    cwd = os.getcwd()
+    os.makedirs(conf["state"], exist_ok=True)
+    manifestPath = os.path.join(conf["state"], table + ".manifest.json")
+    manifest = dict()
+    if os.path.exists(manifestPath):
+        with open(manifestPath) as f:
+            manifest = json.load(f)
+    fps = fingerprints(stages, conf)
+
+    def checkpointPath(name):
+        return os.path.join(conf["state"], "%s.%s.state" % (table, name))
+
+    # 选中的阶段及其全部上游阶段
+    wanted = set()
+    for name in reversed([st.name for st in stages]):
+        if name in conf["stages"] or any(name in byName[w].deps for w in wanted):
+            wanted.add(name)
+    fresh = {
+        name for name in wanted
+        if not conf["force"] and manifest.get(name) == fps[name]
+        and (not byName[name].checkpoint or os.path.exists(checkpointPath(name)))
+        and all(os.path.exists(os.path.join(conf["output"], p)) for p in byName[name].outputs)
+    }
+    # 需要执行的阶段, 以及为其提供结果的上游阶段: 指纹未变且有检查点的读取检查点, 否则重新执行
+    execute, loaded = set(), set()
+    for st in reversed(stages):
+        if st.name in wanted and st.name not in fresh or any(st.name in byName[e].deps for e in execute - loaded):
+            execute.add(st.name)
+            if st.name in fresh and st.checkpoint:
+                loaded.add(st.name)
+    hasChild = {d for st in stages if st.name in execute for d in st.deps}
+    canFork = "fork" in multiprocessing.get_all_start_methods()
+
+    conf = dict(conf)
+    conf["cache"] = componentCache.ComponentCache(conf["cachePath"]) if conf["cachePath"] else None
+    if conf["metrics"]:
+        metrics.enable(conf["metrics"])
+    report = {st.name: {"deps": list(st.deps), "status": "skipped"} for st in stages if st.name in wanted}
+    values, children = dict(), dict()
+    origin = time.perf_counter()
+    os.makedirs(conf["output"], exist_ok=True)
+    os.chdir(conf["output"])
+    try:
+        for d in OUTPUT_DIRS[table]:
+            os.makedirs(d, exist_ok=True)
+        for st in stages:
+            if st.name not in execute:
+                continue
+            rec = report[st.name]
+            rec["start"] = time.perf_counter() - origin
+            if st.name in loaded:
+                values[st.name] = incremental.loadState(checkpointPath(st.name))
+                rec["status"] = "loaded"
+                rec["end"] = time.perf_counter() - origin
+                continue
+            args = [values[d] for d in st.deps]
+            if st.name not in hasChild and canFork:
+                # 没有后继的导出阶段在子进程中执行, 子进程继承当前的图, 不需要序列化
+                recv, send = multiprocessing.Pipe(duplex=False)
+                p = multiprocessing.get_context("fork").Process(target=runLeaf, args=(st, conf, args, send))
+                p.start()
+                children[st.name] = (p, recv)
+                rec["status"] = "run"
+                continue
+            values[st.name] = st.func(conf, *args)
+            if st.checkpoint:
+                incremental.saveState(values[st.name], checkpointPath(st.name))
+            rec["status"] = "run"
+            rec["end"] = time.perf_counter() - origin
+            manifest[st.name] = fps[st.name]
+        for name, (p, recv) in children.items():
+            p.join()
+            if p.exitcode != 0:
+                raise RuntimeError("%s流水线的%s阶段执行失败" % (table, name))
+            report[name]["end"] = report[name]["start"] + recv.recv()
+            manifest[name] = fps[name]
+    finally:
+        os.chdir(cwd)
+        with open(manifestPath, "w") as f:
+            json.dump(manifest, f, indent=2)
+        if conf["cache"] is not None:
+            conf["cache"].save()
+    return report
+
+
+def runUpdate(table, conf):
+    """
+    增量更新一张表: 以analyze阶段的检查点为状态, 应用conf["update"]指定的增量表格,
+    只重新分析和布局受影响的子图并增量导出, 再将更新后的图写回analyze和layout的检查点
+    写回后下游导出阶段的指纹作废, 下次运行这些阶段时按更新后的检查点完整导出
+    Params:
+        table: 表名, 为UPDATES的键
+        conf: 该表的配置, 见main.py中的defaultConfig
+    Returns:
+        report: 与runPipeline的格式相同, 只有update一个阶段
+    """
+    if table not in UPDATES:
+        raise ValueError("%s表不支持增量更新" % table)
+    statePath = os.path.join(conf["state"], "%s.analyze.state" % table)
+    if not os.path.exists(statePath):
+        raise FileNotFoundError("%s表尚无analyze阶段的检查点, 需先完整运行一次: %s" % (table, statePath))
+    manifestPath = os.path.join(conf["state"], table + ".manifest.json")
+    manifest = dict()
+    if os.path.exists(manifestPath):
+        with open(manifestPath) as f:
+            manifest = json.load(f)
+    cwd = os.getcwd()
+    if conf["metrics"]:
+        metrics.enable(conf["metrics"])
+    start = time.perf_counter()
+    os.makedirs(conf["output"], exist_ok=True)
+    os.chdir(conf["output"])
+    try:
+        for d in OUTPUT_DIRS[table]:
+            os.makedirs(d, exist_ok=True)
+        H = UPDATES[table](conf, statePath)
+    finally:
+        os.chdir(cwd)
+    kept = ["load", "analyze"]
+    incremental.saveState(H, statePath)
+    if "layout" not in conf["skip"]:
+        incremental.saveState(H, os.path.join(conf["state"], "%s.layout.state" % table))
+        kept.append("layout")
+    with open(manifestPath, "w") as f:
+        json.dump({k: v for k, v in manifest.items() if k in kept}, f, indent=2)
+    return {"update": {"deps": [], "status": "run", "start": 0.0, "end": time.perf_counter() - start}}
+
+
+def criticalPath(report):
+    """
+    按依赖关系求一条流水线的关键路径, 跳过的阶段耗时记为0
+    Returns:
+        seconds: 关键路径的总耗时
+        path: 关键路径上的阶段名
+    """
+    finish, prev = dict(), dict()
+    for name, rec in report.items():
+        cost = rec.get("end", 0) - rec.get("start", 0)
+        deps = [d for d in rec["deps"] if d in finish]
+        best = max(deps, key=finish.get, default=None)
+        finish[name] = cost + (finish[best] if best else 0)
+        prev[name] = best
+    if not finish:
+        return 0.0, []
+    name = max(finish, key=finish.get)
+    seconds, path = finish[name], list()
+    while name:
+        path.append(name)
+        name = prev[name]
+    return seconds, path[::-1]
+
+
+def runTable(table, conf):
+    """
+    配置了增量表格时增量更新该表, 否则执行其流水线
+    """
+    if conf.get("update"):
+        return runUpdate(table, conf)
+    return runPipeline(table, conf)
+
+
+def run(confs, parallel=True):
+    """
+    执行多条流水线, 多于一条时各自在独立的进程中并发执行
+    Params:
+        confs: 表名到该表配置的字典
+        parallel: 是否并发执行各条流水线
+    Returns:
+        summary: 各条流水线的阶段报告、关键路径以及总耗时
+    """
+    start = time.perf_counter()
+    if parallel and len(confs) > 1:
+        with ProcessPoolExecutor(len(confs)) as executor:
+            futures = {table: executor.submit(runTable, table, conf) for table, conf in confs.items()}
+            reports = {table: future.result() for table, future in futures.items()}
+    else:
+        reports = {table: runTable(table, conf) for table, conf in confs.items()}
+    summary = {"wallSeconds": time.perf_counter() - start, "pipelines": dict()}
+    for table, report in reports.items():
+        seconds, path = criticalPath(report)
+        summary["pipelines"][table] = {"stages": report, "criticalSeconds": seconds, "criticalPath": path}
+        for name, rec in report.items():
+            cost = rec.get("end", 0) - rec.get("start", 0)
+            print("%s.%s" % (table, name), rec["status"], "%.2fs" % cost)
+    summary["criticalSeconds"] = max(
+        (p["criticalSeconds"] for p in summary["pipelines"].values()), default=0.0
+    )
+    critical = max(summary["pipelines"].items(), key=lambda x: x[1]["criticalSeconds"], default=None)
+    if critical is not None:
+        print("关键路径：", critical[0], " -> ".join(critical[1]["criticalPath"]), "%.2fs" % summary["criticalSeconds"])
+    print("总耗时：%.2fs" % summary["wallSeconds"])
+    sys.stdout.flush()
+    return summary
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+
+import streamJson
+
+# 每个分片的字节数上限, 节点数上限由各模块按前端的渲染能力给出
+SHARD_BYTES = 4 * 1024 * 1024
+
+
+class ShardPacker:
+    """
+    将子图按节点数和字节数预算装入若干json分片, 分片依次命名为prefix_0.json, prefix_1.json, ...
+    子图按加入顺序装箱, 当前分片放不下时先写出当前分片再另起一个, 子图不会被拆到两个分片中
+    单个子图超出预算时独占一个分片
+    关闭时写出清单prefix_manifest.json, 记录每个分片包含的子图编号、节点数、边数和字节数, 供前端按需加载
+    """
+
+    def __init__(self, dirPath, prefix, maxNodes, maxBytes=SHARD_BYTES, keys=("nodes", "links")):
+        self.dirPath = dirPath
+        self.prefix = prefix
+        self.maxNodes = maxNodes
+        self.maxBytes = maxBytes
+        self.keys = keys
+        self.shards = list()
+        self.writer = None
+
+    def add(self, Gid, records):
+        """
+        加入一张子图
+        Params:
+            Gid: 子图编号
+            records: 子图的{"nodes": [...], "links": [...]}
+        """
+        encoded = {k: streamJson.dumps(records[k])[1:-1] for k in self.keys}
+        nodes = len(records["nodes"])
+        # 加入后的字节数, 逗号分隔符忽略不计
+        nbytes = sum(len(data) for data in encoded.values())
+        if self.writer is not None and (
+            self.shards[-1]["nodes"] + nodes > self.maxNodes
+            or self.writer.nbytes + nbytes > self.maxBytes
+        ):
+            self.flush()
+        if self.writer is None:
+            name = self.prefix + "_" + str(len(self.shards)) + ".json"
+            self.writer = streamJson.JsonStreamWriter(self.dirPath + name, self.keys)
+            self.shards.append({"file": name, "gids": [], "nodes": 0, "links": 0, "bytes": 0})
+        for k, data in encoded.items():
+            if data:
+                self.writer.writeEncoded(k, data, len(records[k]))
+        shard = self.shards[-1]
+        shard["gids"].append(Gid)
+        shard["nodes"] += nodes
+        shard["links"] += len(records["links"])
+
+    def flush(self):
+        """
+        写出当前分片
+        """
+        self.writer.close()
+        self.shards[-1]["bytes"] = os.path.getsize(self.writer.path)
+        self.writer = None
+
+    def close(self):
+        """
+        写出最后一个分片和清单
+        Returns:
+            manifest: 分片清单
+        """
+        if self.writer is not None:
+            self.flush()
+        manifest = {"maxNodes": self.maxNodes, "maxBytes": self.maxBytes, "shards": self.shards}
+        with open(self.dirPath + self.prefix + "_manifest.json", "w") as f:
+            json.dump(manifest, f)
+        return manifest
+
+
+def writeShard(dirPath, shard, recordsOf, keys=("nodes", "links")):
+    """
+    按清单中的子图编号重写一个分片, 并更新其节点数、边数和字节数
+    Params:
+        dirPath: 分片所在目录
+        shard: 清单中的分片记录
+        recordsOf: 由子图编号得到子图记录的函数
+        keys: 记录的键
+    """
+    shard["nodes"] = shard["links"] = 0
+    with streamJson.JsonStreamWriter(dirPath + shard["file"], keys) as writer:
+        for Gid in shard["gids"]:
+            records = recordsOf(Gid)
+            writer.write(records)
+            shard["nodes"] += len(records["nodes"])
+            shard["links"] += len(records["links"])
+    shard["bytes"] = os.path.getsize(dirPath + shard["file"])
+
+
+def updateShards(dirPath, prefix, changed, members, recordsOf, keys=("nodes", "links")):
+    """
+    增量更新已导出的分片, 只重写含有受影响子图的分片
+    受影响的子图若仍属于这组分片则留在原分片中, 否则从原分片移除;
+    新加入的子图追加到最后一个分片, 超出预算时另起分片, 其余分片和子图的位置不变
+    Params:
+        dirPath: 分片所在目录
+        prefix: 分片名前缀
+        changed: 受影响的子图编号
+        members: 受影响的子图中仍属于这组分片的编号
+        recordsOf: 由子图编号得到子图记录的函数
+        keys: 记录的键
+    Returns:
+        shards: 重写过的分片记录列表
+    """
+    manifestPath = dirPath + prefix + "_manifest.json"
+    with open(manifestPath) as f:
+        manifest = json.load(f)
+    shards = manifest["shards"]
+    where = {Gid: i for i, shard in enumerate(shards) for Gid in shard["gids"]}
+    members = set(members)
+    dirty = set()
+    for Gid in changed:
+        if Gid in where:
+            dirty.add(where[Gid])
+            if Gid not in members:
+                shards[where[Gid]]["gids"].remove(Gid)
+    for Gid in sorted(members - where.keys()):
+        records = recordsOf(Gid)
+        nodes = len(records["nodes"])
+        nbytes = len(streamJson.dumps(records))
+        if not shards or (
+            shards[-1]["gids"] and (
+                shards[-1]["nodes"] + nodes > manifest["maxNodes"]
+                or shards[-1]["bytes"] + nbytes > manifest["maxBytes"]
+            )
+        ):
+            name = prefix + "_" + str(len(shards)) + ".json"
+            shards.append({"file": name, "gids": [], "nodes": 0, "links": 0, "bytes": 0})
+        # 先按估计值累计预算, 重写时再更新为实际值
+        shards[-1]["gids"].append(Gid)
+        shards[-1]["nodes"] += nodes
+        shards[-1]["bytes"] += nbytes
+        dirty.add(len(shards) - 1)
+    for i in sorted(dirty):
+        writeShard(dirPath, shards[i], recordsOf, keys)
+    with open(manifestPath, "w") as f:
+        json.dump(manifest, f)
+    return [shards[i] for i in sorted(dirty)]
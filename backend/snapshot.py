@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+import numpy as np
+
+import graphCore
+
+# 快照格式版本, CompactGraph的字段变化时递增, 使旧快照失效
+VERSION = 1
+
+
+def sourceOf(sourcePath, loaderPath):
+    """
+    快照的来源: 源表格的路径、大小和修改时间, 以及格式版本和构建图的代码的摘要
+    Params:
+        sourcePath: 源表格
+        loaderPath: 解析表格的模块文件, 与graphCore和本模块的源码一起计入摘要
+    Returns:
+        source: 可写入meta.json的字典
+    """
+    stat = os.stat(sourcePath)
+    digest = hashlib.sha1(str(VERSION).encode())
+    for path in (__file__, graphCore.__file__, loaderPath):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return {
+        "path": os.path.abspath(sourcePath),
+        "size": stat.st_size,
+        "mtimeNs": stat.st_mtime_ns,
+        "code": digest.hexdigest(),
+    }
+
+
+def isFresh(snapshotDir, sourcePath, loaderPath):
+    """
+    快照是否存在且由同一份源表格和同一版代码构建
+    Params:
+        snapshotDir: 快照目录, 为None时视为不使用快照
+        sourcePath: 源表格
+        loaderPath: 解析表格的模块文件
+    Returns:
+        fresh: 可以直接读取快照时为True
+    """
+    if snapshotDir is None:
+        return False
+    metaPath = os.path.join(snapshotDir, "meta.json")
+    if not os.path.exists(metaPath):
+        return False
+    with open(metaPath) as f:
+        return json.load(f).get("source") == sourceOf(sourcePath, loaderPath)
+
+
+def save(G, snapshotDir, sourcePath, loaderPath):
+    """
+    将图保存为二进制快照, 每个NumPy数组单独存为一个.npy文件
+    节点Id表和object类型的列转为定长字符串数组, 使全部文件均可内存映射
+    meta.json最后写出, 作为快照完整的标记, 其中记录快照的来源供isFresh比对
+    Params:
+        G: CompactGraph
+        snapshotDir: 快照目录
+        sourcePath: 源表格
+        loaderPath: 解析表格的模块文件
+    """
+    os.makedirs(snapshotDir, exist_ok=True)
+    metaPath = os.path.join(snapshotDir, "meta.json")
+    if os.path.exists(metaPath):
+        os.remove(metaPath)
+    arrays = {"ids": np.asarray(G.index.ids, dtype=str)}
+    for k, v in vars(G).items():
+        if isinstance(v, np.ndarray):
+            arrays[k] = v
+    for k, v in G.nodeAttr.items():
+        arrays["node." + k] = v
+    for k, v in G.edgeAttr.items():
+        arrays["edge." + k] = v
+    for name, v in arrays.items():
+        np.save(os.path.join(snapshotDir, name + ".npy"), v.astype(str) if v.dtype == object else v)
+    with open(metaPath, "w") as f:
+        json.dump({
+            "version": VERSION,
+            "source": sourceOf(sourcePath, loaderPath),
+            "n": G.n,
+            "nComp": G.nComp,
+            "arrays": sorted(arrays),
+        }, f)
+    print("----------快照写出完成----------")
+
+
+def load(snapshotDir):
+    """
+    以写时复制的方式内存映射快照, 多个进程读取同一快照时共享页面, 原地修改属性只影响本进程
+    Params:
+        snapshotDir: 快照目录
+    Returns:
+        G: CompactGraph
+    """
+    with open(os.path.join(snapshotDir, "meta.json")) as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(snapshotDir, name + ".npy"), mmap_mode="c") for name in meta["arrays"]}
+    index = graphCore.NodeIndex()
+    index.ids = arrays.pop("ids").tolist()
+    index.codes = {x: i for i, x in enumerate(index.ids)}
+    G = graphCore.CompactGraph.__new__(graphCore.CompactGraph)
+    G.index, G.n, G.nComp = index, meta["n"], meta["nComp"]
+    G.nodeAttr, G.edgeAttr = dict(), dict()
+    for name, v in arrays.items():
+        if name.startswith("node."):
+            G.nodeAttr[name[5:]] = v
+        elif name.startswith("edge."):
+            G.edgeAttr[name[5:]] = v
+        else:
+            setattr(G, name, v)
+    print("----------快照读取完成----------")
+    print("节点总数：", G.n, "边总数：", G.numberOfEdges(), "子图数量：", G.nComp)
+    return G
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import json
+import shutil
+import tempfile
+
+# 安装了orjson时用其编码, 否则退回标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """
+    将对象编码为json字节串
+    Params:
+        obj: 可序列化的对象
+    Returns:
+        data: utf-8编码的json字节串
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+class JsonStreamWriter:
+    """
+    以流的方式写出形如{"nodes": [...], "links": [...]}的json文件
+    每个键的数组先追加到各自的临时文件中, 关闭时按键的顺序拼接到目标文件
+    内存中只保留当前写入的一张子图的记录
+    """
+
+    def __init__(self, path, keys=("nodes", "links")):
+        self.path = path
+        self.keys = list(keys)
+        self.parts = {k: tempfile.TemporaryFile() for k in self.keys}
+        self.count = dict.fromkeys(self.keys, 0)
+        self.nbytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        if excType is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, records):
+        """
+        追加一批记录
+        Params:
+            records: 键到记录列表的映射, 如一张子图的{"nodes": [...], "links": [...]}
+        """
+        for k, items in records.items():
+            if items:
+                # 编码整个列表后去掉首尾的方括号
+                self.writeEncoded(k, dumps(items)[1:-1], len(items))
+
+    def writeEncoded(self, key, data, n):
+        """
+        追加已编码的记录, 与已写入的部分以逗号衔接
+        Params:
+            key: 数组的键
+            data: 去掉首尾方括号的json数组字节串
+            n: 记录数
+        """
+        f = self.parts[key]
+        if self.count[key]:
+            f.write(b",")
+            self.nbytes += 1
+        f.write(data)
+        self.nbytes += len(data)
+        self.count[key] += n
+
+    def close(self):
+        """
+        拼接各个键的数组, 写出目标文件
+        """
+        with open(self.path, "wb") as out:
+            out.write(b"{")
+            for i, k in enumerate(self.keys):
+                out.write(((',"' if i else '"') + k + '":[').encode("utf-8"))
+                f = self.parts[k]
+                f.seek(0)
+                shutil.copyfileobj(f, out)
+                out.write(b"]")
+            out.write(b"}")
+        self.discard()
+
+    def discard(self):
+        """
+        丢弃已写入的内容, 不生成目标文件
+        """
+        for f in self.parts.values():
+            f.close()
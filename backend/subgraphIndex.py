@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import streamJson
+
+
+class SubgraphIndexWriter:
+    """
+    将每张子图单独编码为json, 依次拼接写入打包文件name.pack, 并写出两份索引:
+        name.gid: 小端int64的[起始, 结束)偏移对, 每个子图一对, 子图Gid的字节区间为[ranges[Gid, 0], ranges[Gid, 1])
+        name.ids: 按公司Id排序的"Id\\tGid"文本, 用于由公司Id找到所在子图
+    前端服务按索引发起区间读取, 打开一张子图只需传输该子图的字节
+    """
+
+    def __init__(self, dirPath, name="subgraphs"):
+        self.prefix = dirPath + name
+        self.pack = open(self.prefix + ".pack", "wb")
+        self.offsets = [0]
+
+    def add(self, Gid, records):
+        """
+        追加一张子图, 须按Gid从0开始依次加入
+        Params:
+            Gid: 子图编号
+            records: 子图的{"nodes": [...], "links": [...]}
+        """
+        assert Gid == len(self.offsets) - 1, "子图须按Gid顺序加入"
+        data = streamJson.dumps(records)
+        self.pack.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self, ids, comp):
+        """
+        写出Gid索引和公司Id索引
+        Params:
+            ids: 各节点的公司Id
+            comp: 各节点所属的子图编号
+        """
+        self.pack.close()
+        offsets = np.asarray(self.offsets, dtype="<i8")
+        writeIndex(self.prefix, np.stack([offsets[:-1], offsets[1:]], axis=1), ids, comp)
+
+
+def writeIndex(prefix, ranges, ids, comp):
+    """
+    写出Gid索引和公司Id索引
+    Params:
+        prefix: 索引文件路径前缀
+        ranges: 各子图的[起始, 结束)偏移对
+        ids: 各节点的公司Id
+        comp: 各节点所属的子图编号
+    """
+    np.asarray(ranges, dtype="<i8").tofile(prefix + ".gid")
+    ids = np.asarray(ids, dtype=object)
+    order = np.argsort(ids, kind="stable")
+    with open(prefix + ".ids", "w", encoding="utf-8") as f:
+        f.writelines(
+            i + "\t" + str(g) + "\n"
+            for i, g in zip(ids[order].tolist(), np.asarray(comp)[order].tolist())
+        )
+
+
+def updateIndex(dirPath, changed, recordsOf, ids, comp, nComp, name="subgraphs"):
+    """
+    增量更新打包文件和索引: 受影响的子图追加到打包文件末尾并改写其偏移对, 其余子图的字节不动
+    旧的字节成为无用数据, 下一次全量导出时清除
+    Params:
+        dirPath: 打包文件所在目录
+        changed: 受影响的子图编号
+        recordsOf: 由子图编号得到子图记录的函数
+        ids: 各节点的公司Id
+        comp: 各节点所属的子图编号
+        nComp: 子图编号总数
+        name: 打包文件名
+    """
+    prefix = dirPath + name
+    old = np.fromfile(prefix + ".gid", dtype="<i8").reshape(-1, 2)
+    ranges = np.zeros((nComp, 2), dtype="<i8")
+    ranges[:len(old)] = old[:nComp]
+    with open(prefix + ".pack", "ab") as pack:
+        pos = pack.tell()
+        for Gid in changed:
+            data = streamJson.dumps(recordsOf(Gid))
+            pack.write(data)
+            ranges[Gid] = pos, pos + len(data)
+            pos += len(data)
+    writeIndex(prefix, ranges, ids, comp)
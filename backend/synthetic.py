@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+按固定随机种子生成与原始数据列格式一致的合成表格, 用于性能基准测试
+三张表共用同一个边生成器, 可控制规模、子图规模分布、环路密度和枢纽节点的度数
+"""
+import numpy as np
+import pandas as pd
+
+import moneyCollection
+
+# 分块写出csv的行数, 使千万行的表格也只占用一块的内存
+CHUNK_ROWS = 1000000
+# 环路边沿生成树向上回溯的最大步数, 即合成环路的最大长度减一
+MAX_CYCLE_STEPS = 5
+
+
+def randomIds(n, rng):
+    """
+    生成与原始数据格式一致的脱敏节点Id, 形如T00015c94...
+    Params:
+        n: Id数量
+        rng: numpy随机数生成器
+    Returns:
+        ids: 长度为n的Id数组
+    """
+    raw = rng.integers(0, 16, size=(n, 32), dtype=np.int8)
+    hexChars = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    # 逐行拼成定长字节串后整体解码, 避免逐个Id拼接字符串
+    chars = np.empty((n, 33), dtype=np.uint8)
+    chars[:, 0] = ord("T")
+    chars[:, 1:] = hexChars[raw]
+    return chars.view("S33").ravel().astype(str)
+
+
+def componentSizes(nTree, alpha, rng):
+    """
+    按幂律分布抽取各子图的节点数, 使各子图生成树的边数之和恰为nTree
+    Params:
+        nTree: 生成树边数
+        alpha: 幂律指数, 越大小子图越多, 须大于1
+        rng: numpy随机数生成器
+    Returns:
+        sizes: 各子图的节点数, 均不小于2
+    """
+    # 每个子图至少贡献一条边, 抽取nTree个必然足够
+    sizes = np.minimum(rng.zipf(alpha, nTree), nTree) + 1
+    total = np.cumsum(sizes - 1)
+    k = int(np.searchsorted(total, nTree))
+    sizes = sizes[:k + 1]
+    sizes[-1] -= total[k] - nTree
+    return sizes
+
+
+def makeEdges(nEdges, rng, compAlpha=None, cycleRatio=0.0, hubRatio=0.0, hubDegree=50, nIds=None):
+    """
+    生成有向边, 边的顺序随机打乱
+    给出compAlpha时, 先按幂律分布切出各子图, 每个子图生成一棵由父节点指向子节点的随机树,
+    再从随机节点向其第1至MAX_CYCLE_STEPS级祖先加边形成长度为2至MAX_CYCLE_STEPS+1的环路,
+    最后为少量枢纽节点向同一子图内的随机节点加边;
+    compAlpha为None时两端在全部节点中均匀抽取, 此时不单独生成环路边
+    Params:
+        nEdges: 边数
+        rng: numpy随机数生成器
+        compAlpha: 子图规模的幂律指数
+        cycleRatio: 环路边占总边数的比例
+        hubRatio: 枢纽边占总边数的比例
+        hubDegree: 每个枢纽节点的出边数
+        nIds: 均匀抽取时的节点数, 默认与边数相同
+    Returns:
+        src, dst: 两端的节点编号数组
+        nNodes: 节点数
+    """
+    nHub = int(nEdges * hubRatio)
+    nHubs = max(nHub // hubDegree, 1) if nHub else 0
+    if compAlpha is None:
+        nNodes = max(nIds or nEdges, 2)
+        src = rng.integers(0, nNodes, nEdges - nHub)
+        dst = rng.integers(0, nNodes, nEdges - nHub)
+        hubs = rng.integers(0, nNodes, nHubs)
+        hubSrc = hubs[rng.integers(0, nHubs, nHub)] if nHub else np.zeros(0, dtype=np.int64)
+        hubDst = rng.integers(0, nNodes, nHub)
+    else:
+        nCycle = int(nEdges * cycleRatio)
+        nTree = max(nEdges - nHub - nCycle, 1)
+        sizes = componentSizes(nTree, compAlpha, rng)
+        nNodes = int(sizes.sum())
+        start = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        pos = np.arange(nNodes) - start
+        # 子图内第i个节点的父节点在前i个节点中随机选取, 首个节点为根
+        parent = start + (rng.random(nNodes) * pos).astype(np.int64)
+        child = np.nonzero(pos > 0)[0]
+        # 环路边: 从随机的非根节点指向其祖先, 到达根后停止回溯
+        u = child[rng.integers(0, len(child), nCycle)]
+        steps = rng.integers(1, MAX_CYCLE_STEPS + 1, nCycle)
+        ancestor = u.copy()
+        for step in range(MAX_CYCLE_STEPS):
+            ancestor = np.where(steps > step, parent[ancestor], ancestor)
+        # 枢纽边: 枢纽节点指向同一子图内的随机节点
+        hubs = rng.integers(0, nNodes, nHubs)
+        hubSrc = hubs[rng.integers(0, nHubs, nHub)] if nHub else np.zeros(0, dtype=np.int64)
+        size = np.repeat(sizes, sizes)
+        hubDst = start[hubSrc] + (rng.random(nHub) * size[hubSrc]).astype(np.int64)
+        src = np.concatenate([parent[child], u])
+        dst = np.concatenate([child, ancestor])
+    src = np.concatenate([src, hubSrc])
+    dst = np.concatenate([dst, hubDst])
+    order = rng.permutation(len(src))
+    return src[order], dst[order], nNodes
+
+
+def writeChunks(path, frameOf, nRows, encoding):
+    """
+    分块生成并写出csv, 只在第一块写出表头
+    Params:
+        path: 输出路径
+        frameOf: frameOf(lo, hi), 返回第lo至hi-1行的DataFrame
+        nRows: 总行数
+        encoding: 文件编码
+    """
+    for lo in range(0, max(nRows, 1), CHUNK_ROWS):
+        hi = min(lo + CHUNK_ROWS, nRows)
+        frameOf(lo, hi).to_csv(path, index=False, encoding=encoding, mode="w" if lo == 0 else "a", header=lo == 0)
+
+
+def makeControlCsv(path, nEdges, seed=0, **shape):
+    """
+    生成控制人关系表, 列顺序与原始数据一致(relTag/src/destn/relType/rate), 编码为GB2312
+    Params:
+        path: 输出路径
+        nEdges: 边数
+        seed: 随机种子
+        shape: 传给makeEdges的子图形态参数
+    """
+    rng = np.random.default_rng(seed)
+    src, destn, nNodes = makeEdges(nEdges, rng, **shape)
+    ids = randomIds(nNodes, rng)
+    relType = np.where(rng.random(nEdges) < 0.05, "Control", "Holding")
+    rate = np.round(rng.random(nEdges) * 110, 2)
+    writeChunks(path, lambda lo, hi: pd.DataFrame({
+        "关系标签": ids[src[lo:hi]],
+        "源节点": ids[src[lo:hi]],
+        "目标节点": ids[destn[lo:hi]],
+        "关系类型": relType[lo:hi],
+        "持股比例": rate[lo:hi],
+    }), nEdges, "gb2312")
+
+
+def makeGuaranteeCsv(path, nEdges, seed=0, **shape):
+    """
+    生成担保关系表, 列顺序与原始数据一致, 编码为GB2312
+    Params:
+        path: 输出路径
+        nEdges: 边数
+        seed: 随机种子
+        shape: 传给makeEdges的子图形态参数
+    """
+    rng = np.random.default_rng(seed)
+    src, destn, nNodes = makeEdges(nEdges, rng, **shape)
+    ids = randomIds(nNodes, rng)
+    guarType = rng.choice(["Chain", "Cross", "Focus", "Circle"], nEdges)
+    amount = np.where(rng.random(nEdges) < 0.05, 0, rng.integers(1, 10000, nEdges))
+    writeChunks(path, lambda lo, hi: pd.DataFrame({
+        "源节点": ids[src[lo:hi]],
+        "目标节点": ids[destn[lo:hi]],
+        "担保时间": "1900-1-1",
+        "担保类型": guarType[lo:hi],
+        "担保金额": amount[lo:hi],
+    }), nEdges, "gb2312")
+
+
+def makeMoneyCollectionCsv(path, nRows, seed=0, loanRatio=0.3, noiseRatio=None, collectRatio=0.0, **shape):
+    """
+    生成资金归集交易流水表, 共34列, 编码为UTF-8
+    未给出子图形态参数时, 账户数为行数的1/4, 交易码在全部交易码中随机抽取, 绝大多数行不构成边;
+    给出时每条边对应一行满足贷款或转账条件的交易, 另按noiseRatio加入不满足条件的行
+    Params:
+        path: 输出路径
+        nRows: 边数与噪声行数之和
+        seed: 随机种子
+        loanRatio: 满足条件的行中贷款的比例
+        noiseRatio: 不满足条件的行所占比例, 默认在给出子图形态参数时为0.5
+        collectRatio: 给出子图形态参数时, 改写为资金归集转账的转账比例, 这些转账在转出企业收到某笔贷款后0至6天内转出,
+            金额为该笔贷款的0.85至1倍, 其中半数与贷款等额, 使同一笔贷款的多笔转账比例相同
+        shape: 传给makeEdges的子图形态参数
+    """
+    rng = np.random.default_rng(seed)
+    # 真实流水中绝大多数交易码不属于贷款或转账
+    codes = np.array(moneyCollection.txn["code"] + moneyCollection.loan["code"] + ["%04d" % i for i in range(80)])
+    abstracts = np.array(moneyCollection.loan["abstract"] + ["往来款", "货款", ""])
+    if shape:
+        noiseRatio = 0.5 if noiseRatio is None else noiseRatio
+        nEdges = nRows - int(nRows * noiseRatio)
+        src, dst, nNodes = makeEdges(nEdges, rng, **shape)
+        # 噪声行的两端在已有账户中随机抽取
+        noise = nRows - nEdges
+        src = np.concatenate([src, rng.integers(0, nNodes, noise)])
+        dst = np.concatenate([dst, rng.integers(0, nNodes, noise)])
+        isLoan = np.concatenate([(rng.random(nEdges) < loanRatio).astype(np.int64), rng.integers(0, 2, noise)])
+        code = np.where(
+            isLoan == 1,
+            rng.choice(moneyCollection.loan["code"], nRows),
+            rng.choice(moneyCollection.txn["code"], nRows),
+        )
+        code[nEdges:] = rng.choice(codes[len(moneyCollection.txn["code"]) + len(moneyCollection.loan["code"]):], noise)
+        amount = np.round(100000 + rng.random(nRows) * 200000, 2)
+        abstract = rng.choice(abstracts[len(moneyCollection.loan["abstract"]):], nRows)
+        status = np.where(isLoan == 1, "0", rng.choice(["0", "1"], nRows))
+        edgeRow = np.arange(nRows) < nEdges
+        order = rng.permutation(nRows)
+        src, dst, isLoan, code, amount, abstract, status, edgeRow = (
+            x[order] for x in (src, dst, isLoan, code, amount, abstract, status, edgeRow)
+        )
+    else:
+        nNodes = max(nRows // 4, 2)
+        src, dst = rng.integers(0, nNodes, nRows), rng.integers(0, nNodes, nRows)
+        isLoan = rng.integers(0, 2, nRows)
+        code = rng.choice(codes, nRows)
+        amount = np.round(rng.random(nRows) * 300000, 2)
+        abstract = rng.choice(abstracts, nRows)
+        status = rng.choice(["0", "0", "0", "1", "R"], nRows)
+        # 少量对方账户为空的行
+        dst = np.where(rng.random(nRows) < 0.01, -1, dst)
+    ids = np.array(["6%018d" % x for x in rng.integers(0, 10**18, nNodes)] + [""])
+    date = 20200901 + rng.integers(0, 30, nRows)
+    if shape and collectRatio:
+        # 为选中的转账在转入其转出企业的贷款中随机选取一笔, 日期和金额按该笔贷款改写
+        loans = np.nonzero(edgeRow & (isLoan == 1))[0]
+        loans = loans[np.argsort(dst[loans], kind="stable")]
+        outs = np.nonzero(edgeRow & (isLoan == 0) & (rng.random(nRows) < collectRatio))[0]
+        lo = np.searchsorted(dst[loans], src[outs], side="left")
+        hi = np.searchsorted(dst[loans], src[outs], side="right")
+        outs, lo, hi = outs[hi > lo], lo[hi > lo], hi[hi > lo]
+        paired = loans[lo + (rng.random(len(outs)) * (hi - lo)).astype(np.int64)]
+        # 第6天的转账落在5天的时间窗口之外, 日期不超过当月月底
+        date[outs] = np.minimum(date[paired] + rng.integers(0, 7, len(outs)), 20200930)
+        rate = np.where(rng.random(len(outs)) < 0.5, 1.0, 0.85 + rng.random(len(outs)) * 0.15)
+        amount[outs] = np.round(amount[paired] * rate, 2)
+    # 未读取的列填入与真实流水长度相近的占位内容
+    filler = rng.choice(["320100", "CNY", "0.00", "20200901123000", "江苏银行南京分行营业部"], 34)
+
+    def frameOf(lo, hi):
+        table = pd.DataFrame({"c%d" % i: filler[i] for i in range(34)}, index=range(lo, hi))
+        table["c0"] = ids[src[lo:hi]]
+        table["c1"] = date[lo:hi]
+        table["c4"] = code[lo:hi]
+        table["c6"] = isLoan[lo:hi]
+        table["c7"] = amount[lo:hi]
+        table["c21"] = abstract[lo:hi]
+        table["c29"] = ids[dst[lo:hi]]
+        table["c33"] = status[lo:hi]
+        return table
+
+    writeChunks(path, frameOf, nRows, "utf-8")
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import itertools
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+import graphCore
+import guarantee
+
+RES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "res")
+
+
+def writeGuaranteeCsv(path, edges):
+    pd.DataFrame(
+        [(u, v, "1900-1-1", "Chain", amount) for u, v, amount in edges],
+        columns=["源节点", "目标节点", "担保时间", "担保类型", "担保金额"],
+    ).to_csv(path, index=False, encoding="gb2312")
+
+
+def circleIds(G):
+    guarType = G.nodeAttr["guarType"]
+    return {G.index.ids[n] for n in range(G.n) if guarType[n] & guarantee.GuarType.Circle}
+
+
+def cycleNodesOf(G):
+    """
+    用networkx枚举全部简单环, 得到处于长度不小于3的环上的节点
+    """
+    N = nx.DiGraph()
+    N.add_edges_from(zip(G.index.decode(G.src), G.index.decode(G.dst)))
+    return set(itertools.chain.from_iterable(c for c in nx.simple_cycles(N) if len(c) >= 3))
+
+
+def test_circle_labels_every_node_on_a_cycle(tmp_path):
+    # 真实数据中的子图, Ta9d5235处于4元环T9e3710a->Ta9d5235->T5dde754->T9300843->T9e3710a上
+    path = tmp_path / "guarantee.csv"
+    writeGuaranteeCsv(path, [
+        ("T9e3710a", "T5dde754", 300),
+        ("Tc7abf21", "Ta9d5235", 400),
+        ("T9300843", "T9e3710a", 1000000),
+        ("T9e3710a", "T79234ec", 1000000),
+        ("Ta9d5235", "Tabd7bcc", 1600000),
+        ("T5dde754", "T9300843", 2000000),
+        ("T9e3710a", "Ta9d5235", 2000000),
+        ("Ta9d5235", "T5dde754", 2000000),
+    ])
+    G = guarantee.getInitGuaranteeG(str(path))
+    guarantee.markRiskOfGuaranteeG(G)
+    assert circleIds(G) == {"T9e3710a", "Ta9d5235", "T5dde754", "T9300843"}
+
+
+def test_mutual_pairs_are_not_circles(tmp_path):
+    # a<->b<->c只有互保, d与三元环之间也只有互保
+    path = tmp_path / "guarantee.csv"
+    writeGuaranteeCsv(path, [
+        ("a", "b", 1), ("b", "a", 1), ("b", "c", 1), ("c", "b", 1),
+        ("x", "y", 1), ("y", "z", 1), ("z", "x", 1), ("x", "d", 1), ("d", "x", 1),
+    ])
+    G = guarantee.getInitGuaranteeG(str(path))
+    guarantee.markRiskOfGuaranteeG(G)
+    assert circleIds(G) == {"x", "y", "z"}
+    mutual = {G.index.ids[n] for n in range(G.n) if G.nodeAttr["guarType"][n] & guarantee.GuarType.Mutual}
+    assert mutual == {"a", "b", "c", "x", "d"}
+
+
+def test_circle_matches_simple_cycles_on_real_data():
+    G = guarantee.getInitGuaranteeG(os.path.join(RES, "guarantee.csv"))
+    guarantee.markRiskOfGuaranteeG(G)
+    assert circleIds(G) == cycleNodesOf(G)
+
+
+def mutualChain(n, closed=False):
+    """
+    相邻节点互保的长链, closed时再加一条从链尾指向链头的单向边
+    """
+    u = np.arange(n - 1)
+    src, dst = np.concatenate([u, u + 1]), np.concatenate([u + 1, u])
+    if closed:
+        src, dst = np.append(src, n - 1), np.append(dst, 0)
+    index = graphCore.NodeIndex()
+    index.encode(np.arange(n))
+    return graphCore.CompactGraph(index, src, dst)
+
+
+def test_circle_search_is_linear_on_mutual_chains():
+    assert guarantee.findCircleNodes(mutualChain(1000), range(1000)) == set()
+    assert guarantee.findCircleNodes(mutualChain(1000, True), range(1000)) == set(range(1000))
+    seconds = dict()
+    for n in (20000, 80000):
+        G = mutualChain(n)
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            guarantee.findCircleNodes(G, range(n))
+            best = min(best, time.perf_counter() - start)
+        seconds[n] = best
+    # 节点数增至4倍, 线性实现的耗时约为4倍, 逐节点搜索的实现约为16倍
+    assert seconds[80000] < 8 * seconds[20000]
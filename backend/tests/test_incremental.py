@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+增量更新与全量重建的结果对比
+增量中包含删边(部分节点因此被移除)、修改已有边的属性以及引入新节点的新边
+"""
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+
+import control
+import guarantee
+import incremental
+import layout
+import synthetic
+
+SEED = 11
+SHAPE = {"compAlpha": 2.0, "cycleRatio": 0.05, "hubRatio": 0.02, "hubDegree": 5}
+
+
+def makeDelta(table, srcCol, dstCol, valueCol, value, newRows, seed=0):
+    """
+    从表格中随机选取删除和修改的边, 再加入新边
+    Returns:
+        delta: 增量表格, 首列为op
+        full: 应用增量后的完整表格, 修改的边原地更新, 新边追加到末尾, 与applyDelta的边顺序一致
+    """
+    rng = np.random.default_rng(seed)
+    keys = pd.Series(list(zip(table[srcCol], table[dstCol])), index=table.index)
+    unique = keys.drop_duplicates()
+    picked = rng.permutation(len(unique))
+    removed = set(unique.iloc[picked[:len(unique) // 6]])
+    modified = set(unique.iloc[picked[len(unique) // 6:len(unique) // 6 + 30]])
+    full = table[~keys.isin(removed)].copy()
+    full[valueCol] = full[valueCol].astype(type(value))
+    full.loc[keys.isin(modified), valueCol] = value
+    delta = pd.concat([
+        table.loc[unique.index[unique.isin(removed)]].assign(op="del"),
+        full.loc[unique.index[unique.isin(modified)]].assign(op="add"),
+        newRows.assign(op="add"),
+    ])
+    full = pd.concat([full, newRows])
+    return delta[["op"] + list(table.columns)], full
+
+
+def partition(G):
+    ids = G.index.ids
+    return {frozenset(ids[n] for n in G.componentNodes(c).tolist()) for c in range(G.nComp)} - {frozenset()}
+
+
+def byId(G, name, codes=False):
+    values = G.nodeAttr[name].tolist()
+    if codes:
+        values = [G.index.ids[v] if v >= 0 else None for v in values]
+    return dict(zip(G.index.ids, values))
+
+
+@pytest.mark.parametrize("nEdges, seed", [(1000, SEED), (3000, 5)])
+def test_guarantee_update_matches_rebuild(tmp_path, nEdges, seed):
+    synthetic.makeGuaranteeCsv(tmp_path / "guarantee.csv", nEdges, seed=seed, **SHAPE)
+    table = pd.read_csv(tmp_path / "guarantee.csv", encoding="gb2312")
+    table = table[table.iloc[:, 4] != 0]
+    src, dst, amount = table.columns[[0, 1, 4]]
+    newRows = pd.DataFrame(
+        [["Tnew0", table.iloc[0, 0], "1900-1-1", "Chain", 250], ["Tnew1", "Tnew0", "1900-1-1", "Chain", 7]],
+        columns=table.columns,
+    )
+    delta, full = makeDelta(table, src, dst, amount, 12.5, newRows)
+    # 互为反向的一对担保, 增量中再将其中一条改为与另一条不同的金额, m只计其中一条的金额
+    keys = set(zip(full[src], full[dst]))
+    u, v = next((u, v) for u, v in zip(full[src], full[dst]) if u != v and (v, u) in keys)
+    row = pd.DataFrame([[v, u, "1900-1-1", "Chain", 9999.5]], columns=table.columns)
+    delta = pd.concat([delta, row.assign(op="add")[delta.columns]])
+    full = pd.concat([full, row])
+    delta.to_csv(tmp_path / "delta.csv", index=False, encoding="gb2312")
+    full.to_csv(tmp_path / "full.csv", index=False, encoding="gb2312")
+
+    G = guarantee.getInitGuaranteeG(str(tmp_path / "guarantee.csv"))
+    guarantee.markRiskOfGuaranteeG(G)
+    guarantee.riskQuantification(G)
+    incremental.saveState(G, str(tmp_path / "state.pkl"))
+    _, H, _ = guarantee.updateGuaranteeG(str(tmp_path / "state.pkl"), str(tmp_path / "delta.csv"))
+    F = guarantee.getInitGuaranteeG(str(tmp_path / "full.csv"))
+    guarantee.markRiskOfGuaranteeG(F)
+    guarantee.riskQuantification(F)
+
+    assert H.n < G.n + 2
+    assert partition(H) == partition(F)
+    assert byId(H, "guarType") == byId(F, "guarType")
+    # 按边编号累加, 与全量重建的浮点结果完全相同
+    for name in ("m", "std"):
+        assert byId(H, name) == byId(F, name), name
+
+
+def test_update_relayouts_changed_components(tmp_path):
+    synthetic.makeGuaranteeCsv(tmp_path / "guarantee.csv", 1000, seed=SEED, **SHAPE)
+    table = pd.read_csv(tmp_path / "guarantee.csv", encoding="gb2312")
+    table = table[table.iloc[:, 4] != 0]
+    src, dst, amount = table.columns[[0, 1, 4]]
+    newRows = pd.DataFrame(
+        [["Tnew0", table.iloc[0, 0], "1900-1-1", "Chain", 250], ["Tnew1", "Tnew0", "1900-1-1", "Chain", 7]],
+        columns=table.columns,
+    )
+    delta, _ = makeDelta(table, src, dst, amount, 12.5, newRows)
+    delta.to_csv(tmp_path / "delta.csv", index=False, encoding="gb2312")
+
+    G = guarantee.getInitGuaranteeG(str(tmp_path / "guarantee.csv"))
+    guarantee.markRiskOfGuaranteeG(G)
+    guarantee.riskQuantification(G)
+    layout.computeLayout(G)
+    incremental.saveState(G, str(tmp_path / "state.pkl"))
+    _, H, changed = guarantee.updateGuaranteeG(str(tmp_path / "state.pkl"), str(tmp_path / "delta.csv"))
+    new = [H.index.codes["Tnew0"], H.index.codes["Tnew1"]]
+    # 沿用的坐标对新节点为0, 只重新布局受影响的子图后与对更新后的图整体布局的结果相同
+    assert not H.nodeAttr["x"][new].any()
+    layout.computeLayout(H, comps=changed)
+    F = pickle.loads(pickle.dumps(H))
+    del F.nodeAttr["x"], F.nodeAttr["y"]
+    layout.computeLayout(F)
+    assert H.nodeAttr["x"][new].any()
+    for name in ("x", "y"):
+        assert np.array_equal(H.nodeAttr[name], F.nodeAttr[name]), name
+
+
+def test_control_update_matches_rebuild(tmp_path):
+    synthetic.makeControlCsv(tmp_path / "control.csv", 1000, seed=SEED, **SHAPE)
+    table = pd.read_csv(tmp_path / "control.csv", encoding="gb2312")
+    src, dst, rate = table.columns[[1, 2, 4]]
+    newRows = pd.DataFrame(
+        [["Tnew0", "Tnew0", table.iloc[0, 2], "Holding", 60.0], ["Tnew1", "Tnew1", "Tnew0", "Control", 70.0]],
+        columns=table.columns,
+    )
+    delta, full = makeDelta(table, src, dst, rate, 55.5, newRows)
+    delta.to_csv(tmp_path / "delta.csv", index=False, encoding="gb2312")
+    full.to_csv(tmp_path / "full.csv", index=False, encoding="gb2312")
+
+    G = control.getInitControlG(str(tmp_path / "control.csv"))
+    control.getRootOfControlG(G)
+    control.integratedOwnership(G)
+    incremental.saveState(G, str(tmp_path / "state.pkl"))
+    _, H, _ = control.updateControlG(str(tmp_path / "state.pkl"), str(tmp_path / "delta.csv"))
+    F = control.getInitControlG(str(tmp_path / "full.csv"))
+    control.getRootOfControlG(F)
+    control.integratedOwnership(F)
+
+    assert H.n < G.n + 2
+    assert partition(H) == partition(F)
+    for name in ("isControl", "isCross"):
+        assert byId(H, name) == byId(F, name), name
+    for name in ("controller", "ultimate"):
+        assert byId(H, name, codes=True) == byId(F, name, codes=True), name
+    h, f = byId(H, "stake"), byId(F, "stake")
+    assert np.allclose([h[k] for k in f], list(f.values()))
+
+
+def test_applyDelta_keeps_fractional_values(tmp_path):
+    synthetic.makeGuaranteeCsv(tmp_path / "guarantee.csv", 200, seed=SEED, **SHAPE)
+    G = guarantee.getInitGuaranteeG(str(tmp_path / "guarantee.csv"))
+    assert G.edgeAttr["amount"].dtype.kind == "i"
+    u, v = G.index.decode(G.src[:1]) + ["Tnew0"], G.index.decode(G.dst[:1]) + ["Tnew1"]
+    H, _ = incremental.applyDelta(G, u, v, [False, False], {"amount": np.array([12.5, 0.25])})
+    ids = H.index.decode(H.src)
+    assert H.edgeAttr["amount"][0] == pytest.approx(12.5)
+    assert H.edgeAttr["amount"][ids.index("Tnew0")] == pytest.approx(0.25)
@@ -1,6 +1,81 @@
 const express = require("express")
+const fs = require("fs")
+const path = require("path")
 const app = express()
 app.use(express.static("public"))
+
+// 后端导出的单子图打包文件和索引, 见backend/subgraphIndex.py
+// subgraphs.gid为小端int64的[起始, 结束)偏移对, subgraphs.ids为按公司Id排序的"Id\tGid"文本
+// 打包文件本身也可经静态服务以Range请求直接读取
+// 单子图查看页html/subgraph.html通过以下两个接口读取子图, 首页的id搜索框跳转到该页
+const jsonDir = path.join(__dirname, "public/res/json")
+const tables = ["control", "guarantee", "moneyCollection"]
+const indexes = {}
+
+// 索引文件被增量更新改写后重新读取
+function loadIndex(table) {
+    const dir = path.join(jsonDir, table)
+    const mtime = fs.statSync(path.join(dir, "subgraphs.gid")).mtimeMs
+    if (!indexes[table] || indexes[table].mtime !== mtime) {
+        const buf = fs.readFileSync(path.join(dir, "subgraphs.gid"))
+        // 增量更新后子图的字节不一定连续, 每个子图单独记录起止偏移
+        const ranges = new Array(buf.length / 16)
+        for (let i = 0; i < ranges.length; i++) {
+            ranges[i] = [Number(buf.readBigInt64LE(i * 16)), Number(buf.readBigInt64LE(i * 16 + 8))]
+        }
+        const ids = new Map()
+        for (const line of fs.readFileSync(path.join(dir, "subgraphs.ids"), "utf-8").split("\n")) {
+            if (line) {
+                const [id, gid] = line.split("\t")
+                ids.set(id, Number(gid))
+            }
+        }
+        indexes[table] = { pack: path.join(dir, "subgraphs.pack"), ranges, ids, mtime }
+    }
+    return indexes[table]
+}
+
+// 按字节区间读取一张子图, 只传输该子图的数据
+function sendSubgraph(res, index, gid) {
+    if (!Number.isInteger(gid) || gid < 0 || gid >= index.ranges.length || index.ranges[gid][0] === index.ranges[gid][1]) {
+        return res.status(404).json({ error: "子图不存在" })
+    }
+    const [start, end] = index.ranges[gid]
+    res.set({
+        "Content-Type": "application/json",
+        "Content-Length": end - start,
+        "X-Subgraph-Range": "bytes " + start + "-" + (end - 1),
+    })
+    fs.createReadStream(index.pack, { start, end: end - 1 }).pipe(res)
+}
+
+// 读取索引, 表名不合法或索引尚未导出时返回404
+function withIndex(req, res, next) {
+    if (!tables.includes(req.params.table)) {
+        return res.status(404).json({ error: "未知的关系表" })
+    }
+    try {
+        req.index = loadIndex(req.params.table)
+    } catch (err) {
+        return res.status(404).json({ error: "子图索引尚未导出" })
+    }
+    next()
+}
+
+// 按子图编号读取, 如/subgraph/guarantee/gid/12
+app.get("/subgraph/:table/gid/:gid", withIndex, (req, res) => {
+    sendSubgraph(res, req.index, Number(req.params.gid))
+})
+
+// 按公司Id读取其所在的子图, 如/subgraph/guarantee/id/T00015c94...
+app.get("/subgraph/:table/id/:id", withIndex, (req, res) => {
+    const gid = req.index.ids.get(req.params.id)
+    if (gid === undefined) {
+        return res.status(404).json({ error: "公司不存在" })
+    }
+    sendSubgraph(res, req.index, gid)
+})
+
 app.listen(8080,()=>{
     console.log("服务开启在8080端口")
-})
\ No newline at end of file
+})